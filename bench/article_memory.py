@@ -0,0 +1,47 @@
+from argparse import ArgumentParser
+import tracemalloc
+
+from tabulate import tabulate
+
+from bench.data import documents
+from pg_prep.sliding_window import slice
+from run.e2e_pipe import ClearText, WrapText, PipelineManager
+
+
+def main():
+    parser = ArgumentParser(description="Memory per window of the stitched GenizaArticles (texts, spans and errors)")
+    parser.add_argument("--source", default="pgp", choices=["alkuzari", "pgp"])
+    parser.add_argument("--limit", type=int, default=None, help="number of documents (all of them by default)")
+    parser.add_argument("--target-window", type=int, default=300)
+    parser.add_argument("--ctxt-window", type=int, default=100)
+    args = parser.parse_args()
+
+    ids_texts = documents(args.source, args.limit)
+    pgpids, contents = [pgpid for pgpid, _ in ids_texts], [content for _, content in ids_texts]
+
+    # The words are built outside the measurement, as the NN stages do. The Arabic is as long as the Judaeo-Arabic.
+    windows = slice(pgpids=pgpids, contents=contents, target_window=args.target_window, ctxt_window=args.ctxt_window)
+    processed_words = WrapText(ClearText([article._original_text for article in windows]).output()).output()
+    for line in processed_words:
+        for word in line:
+            word.processed_word = word.original_word
+    del windows
+
+    tracemalloc.start()
+    windows = slice(pgpids=pgpids, contents=contents, target_window=args.target_window, ctxt_window=args.ctxt_window)
+    sliced, _ = tracemalloc.get_traced_memory()
+    articles = [article for document in PipelineManager._stitch(zip(windows, processed_words), False) for article in document]
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rows = [
+        ["sliced", round(sliced / 2 ** 20, 2), round(sliced / len(articles))],
+        ["stitched", round(retained / 2 ** 20, 2), round(retained / len(articles))],
+        ["peak", round(peak / 2 ** 20, 2), round(peak / len(articles))]
+    ]
+    print(f"{len(ids_texts)} documents, {len(articles)} windows")
+    print(tabulate(rows, headers=["", "MB", "bytes per window"], tablefmt="pretty"))
+
+
+if __name__ == "__main__":
+    main()
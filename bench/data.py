@@ -0,0 +1,67 @@
+import os
+from ast import literal_eval
+from typing import Iterator, List, Optional, Tuple
+
+cwd = os.path.dirname(os.path.realpath(__file__))
+ALKUZARI_ALIGN_PATH = cwd + "/../resources/align/alkuzari/"
+PGP_DATA_PATH = cwd + "/../resources/pgp_data/"
+
+
+def alkuzari_documents(limit: Optional[int] = None) -> List[Tuple[int, str]]:
+    # Every aligned sign of Alkuzari as a (pseudo pgpid, Judaeo-Arabic text) document
+    documents = []
+    chapters = sorted(int(chapter) for chapter in os.listdir(ALKUZARI_ALIGN_PATH) if chapter.isdigit())
+    for chapter in chapters:
+        signs = sorted(int(sign.split(".")[0]) for sign in os.listdir(f"{ALKUZARI_ALIGN_PATH}/{chapter}"))
+        for sign in signs:
+            with open(f"{ALKUZARI_ALIGN_PATH}/{chapter}/{sign}.txt", "r") as f:
+                couples = [literal_eval(line) for line in f.read().splitlines() if line.strip()]
+            words = [''.join(ja for ar, ja in couple) for couple in couples]
+            documents.append((chapter * 1000 + sign, ' '.join(words)))
+            if limit is not None and len(documents) >= limit:
+                return documents
+
+    return documents
+
+
+def pgp_documents(limit: Optional[int] = None) -> List[Tuple[int, str]]:
+    import pandas as pd
+
+    ids_texts_df = pd.read_csv(f"{PGP_DATA_PATH}/idd_ja_articles.csv", nrows=limit)
+    return [(int(pgpid), content) for pgpid, content in ids_texts_df.values.tolist()]
+
+
+def documents(source: str, limit: Optional[int] = None) -> List[Tuple[int, str]]:
+    if source == "alkuzari":
+        return alkuzari_documents(limit)
+    if source == "pgp":
+        return pgp_documents(limit)
+    raise KeyError(f"source {source} is unknown, options: ['alkuzari', 'pgp']")
+
+
+def iter_pgp_documents(limit: Optional[int] = None, chunksize: int = 1000) -> Iterator[Tuple[int, str]]:
+    # Reads idd_ja_articles.csv chunk by chunk, only one chunk of documents is in memory at a time
+    import pandas as pd
+
+    for chunk in pd.read_csv(f"{PGP_DATA_PATH}/idd_ja_articles.csv", nrows=limit, chunksize=chunksize):
+        for pgpid, content in chunk.values.tolist():
+            yield int(pgpid), content
+
+
+def iter_documents(source: str, limit: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    if source == "alkuzari":
+        return iter(alkuzari_documents(limit))
+    if source == "pgp":
+        return iter_pgp_documents(limit)
+    raise KeyError(f"source {source} is unknown, options: ['alkuzari', 'pgp']")
+
+
+def wrapped_windows(source: str, limit: Optional[int] = None, target_window: int = 300, ctxt_window: int = 100):
+    # The sliced documents after the pre-pipeline (ClearText, WrapText), as the NN stages receive them
+    from pg_prep.sliding_window import slice
+    from run.e2e_pipe import ClearText, WrapText
+
+    ids_texts = documents(source, limit)
+    sliced = slice(pgpids=[pgpid for pgpid, _ in ids_texts], contents=[content for _, content in ids_texts],
+                   target_window=target_window, ctxt_window=ctxt_window)
+    return WrapText(ClearText([article._original_text for article in sliced]).output()).output()
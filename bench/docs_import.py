@@ -0,0 +1,76 @@
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import random
+import sys
+
+import requests
+from tabulate import tabulate
+
+from bench.data import documents
+from bench.docs_server import LocalDocsServer
+from run.docs_import import DocsFetcher
+from run.e2e_pipe import Import
+
+DOCUMENT_URL = "https://docs.google.com/document/d/{document_id}/edit?usp=sharing"
+
+
+def as_lines(text, words_per_line=12):
+    words = text.split()
+    return "\r\n".join(" ".join(words[i: i + words_per_line]) for i in range(0, len(words), words_per_line))
+
+
+def main():
+    parser = ArgumentParser(description="Bulk import of Google Docs from a local stand-in: one bare request per document "
+                                        "against the pooled concurrent fetcher, cold and with the conditional requests cache")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the server waits before every response")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--fail-every", type=int, default=None, help="the server answers every n-th request with a 503")
+    parser.add_argument("--changed-ratio", type=float, default=0.1, help="documents edited before the last import")
+    args = parser.parse_args()
+
+    texts = {f"doc{pgpid}": as_lines(content) for pgpid, content in documents(args.source, args.documents)}
+    document_urls = [DOCUMENT_URL.format(document_id=document_id) for document_id in texts]
+    expected = {url: ("\ufeff" + texts[url.split('/')[-2]]).splitlines() for url in document_urls}
+
+    rows, identical = [], True
+    with LocalDocsServer(texts, latency=args.latency, fail_every=args.fail_every) as server, TemporaryDirectory() as cache_dir:
+        # The former by_docx_path: a bare requests.get per document, one after the other
+        # (without retries, the failed requests are counted)
+        start_time, failed = perf_counter(), 0
+        for url in document_urls:
+            response = requests.get(server.export_url.format(document_id=url.split('/')[-2]))
+            if response.status_code != 200:
+                failed += 1
+                continue
+            identical = identical and response.content.decode("utf-8").splitlines() == expected[url]
+        rows.append(["requests.get, sequential", len(document_urls), failed, "-", round(perf_counter() - start_time, 2)])
+
+        Import.DOCS_FETCHER = DocsFetcher(server.export_url, cache_dir=cache_dir, workers=args.workers, backoff_seconds=0.01)
+        rng = random.Random(0)
+        for name in ["pooled, cold cache", "pooled, warm cache", "pooled, some edited"]:
+            if name == "pooled, some edited":
+                for url in rng.sample(document_urls, max(1, int(len(document_urls) * args.changed_ratio))):
+                    document_id = url.split('/')[-2]
+                    texts[document_id] = texts[document_id] + "\r\nנוסח מתוקן"
+                    server.update(document_id, texts[document_id])
+                    expected[url] = ("\ufeff" + texts[document_id]).splitlines()
+
+            not_modified = server.not_modified
+            start_time = perf_counter()
+            for url, lines in Import.iter_docx_paths(document_urls):
+                identical = identical and lines == expected[url]
+            rows.append([name, len(document_urls), 0, server.not_modified - not_modified, round(perf_counter() - start_time, 2)])
+        Import.DOCS_FETCHER.close()
+        print(Import.DOCS_FETCHER.stats)
+
+    print(tabulate(rows, headers=["import", "documents", "failed", "304 Not Modified", "seconds"], tablefmt="pretty"))
+    if identical is False:
+        print("The imported lines differ from the documents!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import sleep
+from typing import Dict, Optional, Tuple
+import codecs
+import hashlib
+import re
+
+
+class LocalDocsServer:
+    # Google Docs export stand-in serving documents over HTTP on localhost, for running the import without network.
+    # It sends an ETag and a Last-Modified, answers the conditional requests with 304, waits latency seconds before
+    # every response and answers every fail_every-th request with a 503, to exercise the retries.
+    _documents: Dict[str, Tuple[bytes, str]]
+    _latency: float
+    _fail_every: Optional[int]
+    _server: Optional[ThreadingHTTPServer]
+    _thread: Optional[Thread]
+    _lock: Lock
+    requests: int
+    not_modified: int
+
+    def __init__(self, documents: Dict[str, str], latency: float = 0.0, fail_every: Optional[int] = None):
+        if fail_every is not None and fail_every < 2:
+            raise ValueError(f"fail_every must be at least 2, got {fail_every}")
+
+        self._documents = {}
+        self._latency = latency
+        self._fail_every = fail_every
+        self._server = None
+        self._thread = None
+        self._lock = Lock()
+        self.requests = 0
+        self.not_modified = 0
+        for document_id, text in documents.items():
+            self.update(document_id, text)
+
+    def __enter__(self) -> LocalDocsServer:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def export_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/document/d/{{document_id}}/export?format=txt"
+
+    def update(self, document_id: str, text: str) -> None:
+        # As Google exports them, with a byte order mark
+        with self._lock:
+            self._documents[document_id] = (codecs.BOM_UTF8 + text.encode("utf-8"), formatdate(usegmt=True))
+
+    def _respond(self, handler: BaseHTTPRequestHandler) -> None:
+        with self._lock:
+            self.requests += 1
+            failing = self._fail_every is not None and self.requests % self._fail_every == 0
+        sleep(self._latency)
+
+        match = re.fullmatch(r"/document/d/([^/]+)/export\?format=txt", handler.path)
+        body, last_modified = self._documents.get(match.group(1), (None, None)) if match is not None else (None, None)
+        if failing or body is None:
+            handler.send_response(503 if failing else 404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        if_none_match = handler.headers.get("If-None-Match")
+        if if_none_match == etag or (if_none_match is None and handler.headers.get("If-Modified-Since") == last_modified):
+            with self._lock:
+                self.not_modified += 1
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/plain; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("ETag", etag)
+        handler.send_header("Last-Modified", last_modified)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def start(self) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._respond(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever, name="local-docs", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
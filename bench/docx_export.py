@@ -0,0 +1,92 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from itertools import cycle, islice
+from multiprocessing import get_context
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import re
+import resource
+import sys
+import zipfile
+
+from tabulate import tabulate
+
+from bench.data import documents
+from pg_prep.sliding_window import slice
+from run.e2e_pipe import ClearText, Export, WrapText, PipelineManager
+
+
+def exported_windows(source, n_rows, target_window, ctxt_window):
+    # Stitched windows as Export gets them (the Arabic copies the Judaeo-Arabic), repeated up to n_rows
+    ids_texts = documents(source)
+    windows = slice(pgpids=[pgpid for pgpid, _ in ids_texts], contents=[content for _, content in ids_texts],
+                    target_window=target_window, ctxt_window=ctxt_window)
+    processed_words = WrapText(ClearText([article._original_text for article in windows]).output()).output()
+    for line in processed_words:
+        for word in line:
+            word.processed_word = word.original_word
+    articles = [article for document in PipelineManager._stitch(zip(windows, processed_words), False) for article in document]
+    return list(islice(cycle(articles), n_rows))
+
+
+def measure(writer, args, n_rows, file_path, start_time, results):
+    # Runs in a fresh process, ru_maxrss only grows
+    articles = exported_windows(args.source, n_rows, args.target_window, args.ctxt_window)
+    export = Export.__new__(Export)
+    export._in, export._global_start_time = articles, start_time
+    Export.DOCX_WRITER = writer
+
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timer_start = perf_counter()
+    export._save_docx(file_path)
+    seconds = perf_counter() - timer_start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((seconds, (peak_rss - start_rss) / 1024))
+
+
+def document_parts(file_path):
+    with zipfile.ZipFile(file_path) as docx:
+        return [(name, re.sub(rb"End time:  [0-9/ :.]+", b"", docx.read(name))) for name in docx.namelist()]
+
+
+def main():
+    parser = ArgumentParser(description="Time and memory of the docx export, with python-docx and streamed")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--target-window", type=int, default=300)
+    parser.add_argument("--ctxt-window", type=int, default=100)
+    parser.add_argument("--python-docx-max-rows", type=int, default=1000,
+                        help="python-docx is quadratic in the rows (every row.cells walks the whole table), skipped above")
+    args = parser.parse_args()
+
+    context = get_context("spawn")
+    start_time = datetime.now()
+    rows, identical = [], True
+    with TemporaryDirectory() as tmp_dir:
+        for n_rows in args.rows:
+            writers = [writer for writer in Export.DOCX_WRITERS if writer != "python-docx" or n_rows <= args.python_docx_max_rows]
+            timings = {writer: ("-", "-") for writer in Export.DOCX_WRITERS}
+            for writer in writers:
+                results = context.Queue()
+                process = context.Process(target=measure, args=(writer, args, n_rows, f"{tmp_dir}/{writer}.docx", start_time, results))
+                process.start()
+                timings[writer] = tuple(round(value, 2) for value in results.get())
+                process.join()
+
+            (docx_seconds, docx_mb), (stream_seconds, stream_mb) = timings["python-docx"], timings["stream"]
+            speedup = "-"
+            if "python-docx" in writers:
+                identical = identical and document_parts(f"{tmp_dir}/python-docx.docx") == document_parts(f"{tmp_dir}/stream.docx")
+                speedup = f"{docx_seconds / stream_seconds:.1f}x"
+            rows.append([n_rows, docx_seconds, stream_seconds, speedup, docx_mb, stream_mb])
+
+    print(tabulate(rows, headers=["rows", "python-docx s", "stream s", "speedup", "python-docx RSS growth MB",
+                                  "stream RSS growth MB"], tablefmt="pretty"))
+
+    if identical is False:
+        print("The streamed document differs from the python-docx one!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import json
+import os
+import shutil
+
+from tabulate import tabulate
+
+from bench.docx_export import exported_windows
+from run.e2e_pipe import Export
+
+
+def main():
+    parser = ArgumentParser(description="Time of a single docx export against sharded exports rendered in parallel")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--max-rows", type=int, default=1000, help="rows per shard")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--writer", default="stream", choices=Export.DOCX_WRITERS)
+    args = parser.parse_args()
+
+    articles = exported_windows(args.source, args.rows, target_window=300, ctxt_window=100)
+    Export.DOCX_WRITER = args.writer
+    Export.SHARD_MAX_ROWS = args.max_rows
+    export = Export.__new__(Export)
+    export._in, export._global_start_time = articles, datetime.now()
+
+    rows = []
+    with TemporaryDirectory() as tmp_dir:
+        start_time = perf_counter()
+        export._save_docx(f"{tmp_dir}/single.docx")
+        single_seconds = perf_counter() - start_time
+        rows.append(["single file", 1, round(single_seconds, 2), "1.00", round(os.path.getsize(f"{tmp_dir}/single.docx") / 2 ** 20, 1)])
+
+    for workers in args.workers:
+        Export.SHARD_WORKERS = workers
+        start_time = perf_counter()
+        index_path = export._create_docx_shards()
+        seconds = perf_counter() - start_time
+
+        with open(index_path) as f:
+            index = json.load(f)
+        shards_dir = os.path.dirname(index_path)
+        largest_mb = max(os.path.getsize(f"{shards_dir}/{shard['file']}") for shard in index["shards"]) / 2 ** 20
+        rows.append([f"{len(index['shards'])} shards", workers, round(seconds, 2), f"{single_seconds / seconds:.2f}", round(largest_mb, 1)])
+        shutil.rmtree(shards_dir)
+
+    print(f"{len(articles)} rows, {os.cpu_count()} CPUs")
+    print(tabulate(rows, headers=["export", "workers", "seconds", "speedup", "largest file MB"], tablefmt="pretty"))
+
+
+if __name__ == "__main__":
+    main()
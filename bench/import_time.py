@@ -0,0 +1,78 @@
+from argparse import ArgumentParser
+from statistics import median
+from typing import Dict, List, Tuple
+import os
+import subprocess
+import sys
+
+from tabulate import tabulate
+
+cwd = os.path.dirname(os.path.realpath(__file__))
+REPO_ROOT = os.path.realpath(cwd + "/..")
+
+# Loaded only by the features that need them, never at startup
+LAZY_MODULES = [
+    "torch",
+    "transformers",
+    "onnxruntime",
+    "docx",
+    "googleapiclient",
+    "google.oauth2",
+    "requests",
+    "pandas"
+]
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    # (self, cumulative) microseconds of every module imported by a fresh interpreter importing the module
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO_ROOT] + [p for p in [os.environ.get("PYTHONPATH")] if p]))
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             capture_output=True, text=True, cwd=REPO_ROOT, env=env)
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr}")
+
+    times = {}
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") is False or "|" not in line or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+
+    return times
+
+
+def main():
+    parser = ArgumentParser(description="Startup time of the pipeline modules (python -X importtime), against a budget")
+    parser.add_argument("--modules", nargs="+", default=["run.e2e_pipe", "run.service"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=500, help="maximal median import time of every module")
+    parser.add_argument("--top", type=int, default=10, help="number of heaviest imports to show")
+    args = parser.parse_args()
+
+    rows, failures = [], []
+    for module in args.modules:
+        runs: List[Dict[str, Tuple[int, int]]] = [import_times(module) for _ in range(args.runs)]
+        module_ms = median(times[module][1] for times in runs) / 1000
+        eager = sorted(name for name in runs[0] if name in LAZY_MODULES)
+        rows.append([module, round(module_ms, 1), args.budget_ms, ", ".join(eager) or "-"])
+
+        if module_ms > args.budget_ms:
+            failures.append(f"{module} takes {module_ms:.1f}ms to import, the budget is {args.budget_ms}ms")
+        if len(eager) > 0:
+            failures.append(f"{module} imports {', '.join(eager)} at startup")
+
+        heaviest = sorted(runs[0].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        print(f"Heaviest imports (self time) of {module}:")
+        print(tabulate([[name, round(self_us / 1000, 1), round(cumulative_us / 1000, 1)]
+                        for name, (self_us, cumulative_us) in heaviest],
+                       headers=["module", "self ms", "cumulative ms"], tablefmt="pretty"))
+
+    print(tabulate(rows, headers=["module", "median ms", "budget ms", "eagerly imported heavy modules"], tablefmt="pretty"))
+
+    if len(failures) > 0:
+        print("\n".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
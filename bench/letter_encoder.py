@@ -0,0 +1,58 @@
+from argparse import ArgumentParser
+from time import perf_counter
+import sys
+
+from tabulate import tabulate
+
+from bench.data import wrapped_windows
+from run.e2e_pipe import PipelineManager
+from run.letter_encoder import LetterEncoder
+from run.model_registry import MODEL_REGISTRY
+
+
+def best_time(func, runs):
+    times = []
+    for _ in range(runs):
+        start_time = perf_counter()
+        func()
+        times.append(perf_counter() - start_time)
+    return min(times)
+
+
+def main():
+    parser = ArgumentParser(description="Check the letter encoder against the real tokenizers and time both")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--limit", type=int, default=None, help="number of documents (all of them by default)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    windows = wrapped_windows(args.source, args.limit, target_window=300, ctxt_window=100)
+    lines = [' '.join(word.original_word for word in line) for line in windows]
+    batches = [lines[i: i + args.batch_size] for i in range(0, len(lines), args.batch_size)]
+
+    rows, all_match = [], True
+    for model_name, revision in PipelineManager.nn_models():
+        tokenizer = MODEL_REGISTRY.get(model_name, revision).tokenizer
+        encoder = LetterEncoder.from_tokenizer(tokenizer)
+        if encoder is None:
+            rows.append([model_name, "unsupported vocabulary", "-", "-", "-"])
+            all_match = False
+            continue
+
+        matches = all(encoder.matches(tokenizer, batch) for batch in batches)
+        all_match = all_match and matches
+        tokenizer_time = best_time(lambda: [tokenizer(batch, padding=True, return_tensors="np") for batch in batches], args.runs)
+        encoder_time = best_time(lambda: [encoder.encode(batch) for batch in batches], args.runs)
+        rows.append([model_name, matches, round(tokenizer_time * 1000, 1), round(encoder_time * 1000, 1),
+                     f"{tokenizer_time / encoder_time:.1f}x"])
+
+    print(f"{len(lines)} lines in {len(batches)} batches")
+    print(tabulate(rows, headers=["model", "identical ids", "tokenizer ms", "letter encoder ms", "speedup"], tablefmt="pretty"))
+
+    if all_match is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+from argparse import ArgumentParser
+from time import perf_counter
+import sys
+
+from tabulate import tabulate
+
+from bench.data import wrapped_windows
+from run.e2e_pipe import CodeSwitch, Transliterate, PipelineManager
+
+
+def run_decoding(task, lines, backend, decoding, runs):
+    # The first run warms the model, the reported time is the best of the following runs
+    task(lines, backend=backend, decoding=decoding)
+    best_time, task_run = None, None
+    for _ in range(runs):
+        start_time = perf_counter()
+        task_run = task(lines, backend=backend, decoding=decoding)
+        seconds = perf_counter() - start_time
+        best_time = seconds if best_time is None else min(best_time, seconds)
+
+    return task_run, best_time
+
+
+def as_tuples(lines):
+    return [[(word.original_word, word.processed_word, word.lang) for word in line] for line in lines]
+
+
+def main():
+    parser = ArgumentParser(description="Equivalence and speed of the logits decoding against the per-token dicts one")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--limit", type=int, default=None, help="number of documents (all of them by default)")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = wrapped_windows(args.source, args.limit, target_window=300, ctxt_window=100)
+    print(f"{len(lines)} windows, {sum(len(line) for line in lines)} words")
+
+    code_switch_ref, _ = run_decoding(CodeSwitch, lines, args.backend, "dicts", 1)
+    rows, identical = [], True
+    for task, task_input in [(CodeSwitch, lines), (Transliterate, code_switch_ref.output())]:
+        dicts_run, dicts_time = run_decoding(task, task_input, args.backend, "dicts", args.runs)
+        logits_run, logits_time = run_decoding(task, task_input, args.backend, "logits", args.runs)
+        same = as_tuples(dicts_run.output()) == as_tuples(logits_run.output())
+        identical = identical and same
+        rows.append([task.__name__, same, round(dicts_time, 2), round(logits_time, 2), f"{dicts_time / logits_time:.2f}x"])
+
+    PipelineManager.unload(args.backend)
+    print(tabulate(rows, headers=["task", "identical words", "dicts seconds", "logits seconds", "speedup"], tablefmt="pretty"))
+
+    if identical is False:
+        print("The logits decoding doesn't match the per-token dicts decoding!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from argparse import ArgumentParser
+from time import perf_counter
+import sys
+
+from tabulate import tabulate
+
+from bench.data import wrapped_windows
+from run.e2e_pipe import CodeSwitch, Transliterate, PipelineManager
+
+
+def run_backend(task, lines, backend, runs):
+    # The first run warms the model, the reported time is the best of the following runs
+    task(lines, backend=backend)
+    best_time, task_run = None, None
+    for _ in range(runs):
+        start_time = perf_counter()
+        task_run = task(lines, backend=backend)
+        seconds = perf_counter() - start_time
+        best_time = seconds if best_time is None else min(best_time, seconds)
+
+    return task_run, best_time
+
+
+def agreement(reference, candidate, attribute):
+    words = [(getattr(w_ref, attribute), getattr(w_cand, attribute))
+             for line_ref, line_cand in zip(reference, candidate)
+             for w_ref, w_cand in zip(line_ref, line_cand)]
+    lines_mismatch = sum(len(line_ref) != len(line_cand) for line_ref, line_cand in zip(reference, candidate))
+    words_match = sum(ref == cand for ref, cand in words)
+    return words_match, len(words), lines_mismatch
+
+
+def main():
+    parser = ArgumentParser(description="Parity and speed of the ONNX Runtime backends against the PyTorch one")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--limit", type=int, default=None, help="number of documents (all of them by default)")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--target-window", type=int, default=300)
+    parser.add_argument("--ctxt-window", type=int, default=100)
+    args = parser.parse_args()
+
+    lines = wrapped_windows(args.source, args.limit, args.target_window, args.ctxt_window)
+    print(f"{len(lines)} windows, {sum(len(line) for line in lines)} words")
+
+    # Transliterate gets the same (PyTorch) code-switching input for every backend
+    code_switch_ref, code_switch_time = run_backend(CodeSwitch, lines, "torch", args.runs)
+    transliterate_ref, transliterate_time = run_backend(Transliterate, code_switch_ref.output(), "torch", args.runs)
+
+    rows = [
+        ["CodeSwitch", "torch", round(code_switch_time, 2), "1.00", "100%", 0],
+        ["Transliterate", "torch", round(transliterate_time, 2), "1.00", "100%", 0]
+    ]
+    exact_parity = True
+    for backend in args.backends:
+        code_switch_run, seconds = run_backend(CodeSwitch, lines, backend, args.runs)
+        match, total, lines_mismatch = agreement(code_switch_ref.output(), code_switch_run.output(), "lang")
+        rows.append(["CodeSwitch", backend, round(seconds, 2), f"{code_switch_time / seconds:.2f}", f"{match / max(total, 1):.2%}", lines_mismatch])
+        exact_parity = exact_parity and (backend != "onnx" or (match == total and lines_mismatch == 0))
+
+        transliterate_run, seconds = run_backend(Transliterate, code_switch_ref.output(), backend, args.runs)
+        match, total, lines_mismatch = agreement(transliterate_ref.output(), transliterate_run.output(), "processed_word")
+        rows.append(["Transliterate", backend, round(seconds, 2), f"{transliterate_time / seconds:.2f}", f"{match / max(total, 1):.2%}", lines_mismatch])
+        exact_parity = exact_parity and (backend != "onnx" or (match == total and lines_mismatch == 0))
+
+        PipelineManager.unload(backend)
+
+    print(tabulate(rows, headers=["task", "backend", "seconds", "speedup", "words agreement", "lines mismatch"], tablefmt="pretty"))
+
+    # The full precision export must reproduce the PyTorch labels exactly, int8 is only reported
+    if exact_parity is False:
+        print("The onnx backend doesn't match the torch backend!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
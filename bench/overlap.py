@@ -0,0 +1,72 @@
+from argparse import ArgumentParser
+from time import perf_counter
+import random
+import sys
+
+from tabulate import tabulate
+
+from pg_prep.pgp_record import longest_overlap
+from pg_prep.sliding_window import HE_LETTERS
+
+
+def substrings(s):
+    for j in range(0, len(s)):
+        yield s[0:j+1]
+
+
+def intersect(s1, s2, which_to_reverse):
+    # The former GenizaArticle overlap, kept as the reference: every prefix of both windows in a set
+    set1 = set([s[::-1] for s in list(substrings(s1))]) if which_to_reverse == 0 else set(substrings(s1))
+    set2 = set([s[::-1] for s in list(substrings(s2))]) if which_to_reverse == 1 else set(substrings(s2))
+    return set1 & set2
+
+
+def window_pair(size, overlap, rng):
+    # A previous target and a current target sharing `overlap` characters, as duplicated by two windows
+    text = ' '.join(''.join(rng.choice(HE_LETTERS) for _ in range(rng.randint(1, 7))) for _ in range(size // 4 + 1))
+    shared = text[size - overlap: size]
+    return text[:size], shared + text[size: 2 * size - overlap]
+
+
+def timed(func, runs):
+    best_time = None
+    for _ in range(runs):
+        start_time = perf_counter()
+        result = func()
+        seconds = perf_counter() - start_time
+        best_time = seconds if best_time is None else min(best_time, seconds)
+    return result, best_time
+
+
+def main():
+    parser = ArgumentParser(description="Longest suffix/prefix overlap of two windows: prefix sets against KMP")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000, 3000])
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    rows, identical = [], True
+    for size in args.sizes:
+        prev_target, target = window_pair(size, args.overlap, rng)
+        # Case B compares the targets, case C the trailing and leading contexts (which_to_reverse=1)
+        sets_b, sets_b_time = timed(lambda: max(intersect(prev_target[::-1], target, 0), key=len, default=""), args.runs)
+        kmp_b, kmp_b_time = timed(lambda: longest_overlap(prev_target, target), args.runs)
+        sets_c, sets_c_time = timed(lambda: max(intersect(target, prev_target[::-1], 1), key=len, default=""), args.runs)
+        kmp_c, kmp_c_time = timed(lambda: longest_overlap(prev_target, target), args.runs)
+
+        same = sets_b == kmp_b and sets_c == kmp_c
+        identical = identical and same
+        sets_time, kmp_time = sets_b_time + sets_c_time, kmp_b_time + kmp_c_time
+        rows.append([size, len(kmp_b), same, round(sets_time * 1000, 2), round(kmp_time * 1000, 2), f"{sets_time / kmp_time:.0f}x"])
+
+    print(tabulate(rows, headers=["window chars", "overlap", "identical", "prefix sets ms", "KMP ms", "speedup"], tablefmt="pretty"))
+
+    if identical is False:
+        print("The KMP overlap doesn't match the prefix sets one!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import random
+import sys
+
+from tabulate import tabulate
+
+from bench.data import PGP_DATA_PATH
+from pg_prep.prep_pg_data import build_store, close_store, content_by_pgps, iter_articles
+
+
+def csv_content_by_pgps(pgpids, csv_path):
+    # The former lookup, the whole CSV is read for every call
+    import pandas as pd
+
+    ids_texts_df = pd.read_csv(csv_path)
+    return ids_texts_df[ids_texts_df['pgpid'].isin(pgpids)].values.tolist()
+
+
+def best_time(func, runs):
+    times, result = [], None
+    for _ in range(runs):
+        start_time = perf_counter()
+        result = func()
+        times.append(perf_counter() - start_time)
+    return result, min(times)
+
+
+def main():
+    parser = ArgumentParser(description="Lookups by pgpid in the indexed article store against scanning the CSV")
+    parser.add_argument("--csv", default=f"{PGP_DATA_PATH}/idd_ja_articles.csv")
+    parser.add_argument("--queries", type=int, nargs="+", default=[1, 1000], help="number of pgpids per query")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp_dir:
+        store_path = f"{tmp_dir}/idd_ja_articles.sqlite"
+        start_time = perf_counter()
+        build_store(args.csv, store_path)
+        build_seconds = perf_counter() - start_time
+
+        all_pgpids = sorted({pgpid for pgpid, _ in iter_articles(store_path, args.csv)})
+        rng = random.Random(args.seed)
+
+        rows, identical = [], True
+        for n_pgpids in args.queries:
+            pgpids = rng.sample(all_pgpids, min(n_pgpids, len(all_pgpids)))
+            csv_rows, csv_seconds = best_time(lambda: csv_content_by_pgps(pgpids, args.csv), args.runs)
+            store_rows, store_seconds = best_time(lambda: content_by_pgps(pgpids, store_path, args.csv), args.runs)
+            identical = identical and csv_rows == store_rows
+            rows.append([len(pgpids), len(store_rows), round(csv_seconds * 1000, 2), round(store_seconds * 1000, 2),
+                         f"{csv_seconds / store_seconds:.0f}x"])
+        close_store(store_path)
+
+    print(f"{len(all_pgpids)} pgpids, store built in {build_seconds:.2f}s")
+    print(tabulate(rows, headers=["pgpids", "rows", "CSV ms", "store ms", "speedup"], tablefmt="pretty"))
+
+    if identical is False:
+        print("The store doesn't return the rows of the CSV!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
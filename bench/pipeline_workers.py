@@ -0,0 +1,46 @@
+from argparse import ArgumentParser
+from time import perf_counter
+
+from tabulate import tabulate
+
+from bench.data import documents
+from pg_prep.sliding_window import slice
+from run.e2e_pipe import PipelineManager
+
+
+def run_once(ids_texts, workers, target_window, ctxt_window):
+    sliced = slice(pgpids=[pgpid for pgpid, _ in ids_texts], contents=[content for _, content in ids_texts],
+                   target_window=target_window, ctxt_window=ctxt_window)
+    windows = len(sliced)
+
+    # The worker processes (with workers > 1) load the models before the timing, as the main process does
+    PipelineManager.warm(workers=workers)
+    start_time = perf_counter()
+    PipelineManager(sliced, output_format="by_list_str", workers=workers)
+    return windows, perf_counter() - start_time
+
+
+def main():
+    parser = ArgumentParser(description="Scaling of PipelineManager with the number of worker processes")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--limit", type=int, default=200, help="number of documents")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--target-window", type=int, default=300)
+    parser.add_argument("--ctxt-window", type=int, default=100)
+    args = parser.parse_args()
+
+    ids_texts = documents(args.source, args.limit)
+
+    rows, serial_time = [], None
+    for workers in args.workers:
+        windows, seconds = run_once(ids_texts, workers, args.target_window, args.ctxt_window)
+        serial_time = seconds if serial_time is None else serial_time
+        speedup = serial_time / seconds
+        rows.append([workers, windows, round(seconds, 2), round(windows / seconds, 1), round(speedup, 2), f"{speedup * args.workers[0] / workers:.0%}"])
+
+    print(tabulate(rows, headers=["workers", "windows", "seconds", "windows/sec", "speedup", "efficiency"], tablefmt="pretty"))
+    PipelineManager.unload()
+
+
+if __name__ == "__main__":
+    main()
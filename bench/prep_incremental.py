@@ -0,0 +1,102 @@
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import csv
+import filecmp
+import random
+import sys
+
+from tabulate import tabulate
+
+from bench.prep_memory import write_inputs
+from pg_prep.prep_pg_data import MIN_CONTENT_LEN, pgpids_to_transliterate, stream_prepare_data, update_prepared_data
+
+TODAY = "2024-06-01T00:00:00+00:00"
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    return rows[0], rows[1:]
+
+
+def write_csv(path, header, rows):
+    with open(path, "w") as f:
+        write = csv.writer(f)
+        write.writerow(header)
+        write.writerows(rows)
+
+
+def refresh_export(data_dir, changed_ratio, rng):
+    # A newer export: some documents edited (content and last_modified), one of them left without any article,
+    # some deleted, some added. Returns the pgpids whose articles changed and the ones whose articles are gone.
+    pgpids_header, pgpids_rows = read_csv(f"{data_dir}/ja_articles_pgpids.csv")
+    footnotes_header, footnotes_rows = read_csv(f"{data_dir}/footnotes.csv")
+    n_changed = max(1, int(len(pgpids_rows) * changed_ratio))
+
+    edited = {row[0] for row in rng.sample(pgpids_rows, n_changed)}
+    deleted = {row[0] for row in rng.sample(pgpids_rows, n_changed) if row[0] not in edited}
+    known = {row[0] for row in pgpids_rows}
+    added = [row[1] for row in footnotes_rows if row[1] not in known][:n_changed]
+
+    pgpids_rows = [[row[0], row[1], TODAY if row[0] in edited else row[2]] for row in pgpids_rows if row[0] not in deleted]
+    pgpids_rows += [[pgpid, f"https://example.org/documents/{pgpid}/", TODAY] for pgpid in added]
+    content = footnotes_header.index("content")
+    emptied = set(sorted(row[1] for row in footnotes_rows if row[1] in edited and len(row[content]) > MIN_CONTENT_LEN)[:1])
+    for row in footnotes_rows:
+        if row[1] in emptied:
+            row[content] = ""
+        elif row[1] in edited and len(row[content]) > 0:
+            row[content] = row[content][::-1]
+
+    write_csv(f"{data_dir}/ja_articles_pgpids.csv", pgpids_header, pgpids_rows)
+    write_csv(f"{data_dir}/footnotes.csv", footnotes_header, footnotes_rows)
+    return (edited | set(added)) - emptied, deleted | emptied
+
+
+def main():
+    parser = ArgumentParser(description="Time of a full preparation of the PGP data against an incremental one")
+    parser.add_argument("--footnotes", type=int, default=320000, help="rows of footnotes.csv")
+    parser.add_argument("--pgpids", type=int, default=3000)
+    parser.add_argument("--changed", type=float, default=0.01, help="ratio of the pgpids edited, deleted and added")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with TemporaryDirectory() as data_dir:
+        inputs = [f"{data_dir}/ja_articles_pgpids.csv", f"{data_dir}/footnotes.csv"]
+        write_inputs(data_dir, args.footnotes, args.pgpids, args.seed)
+        start_time = perf_counter()
+        stream_prepare_data(10000, *inputs, f"{data_dir}/incremental.csv", f"{data_dir}/incremental.sqlite")
+        full_seconds = perf_counter() - start_time
+
+        start_time = perf_counter()
+        unchanged, _ = update_prepared_data(10000, *inputs, f"{data_dir}/incremental.csv", f"{data_dir}/incremental.sqlite")
+        unchanged_seconds = perf_counter() - start_time
+
+        changed, deleted = refresh_export(data_dir, args.changed, rng)
+        start_time = perf_counter()
+        flagged, dropped = update_prepared_data(10000, *inputs, f"{data_dir}/incremental.csv", f"{data_dir}/incremental.sqlite")
+        incremental_seconds = perf_counter() - start_time
+
+        stream_prepare_data(10000, *inputs, f"{data_dir}/full.csv", f"{data_dir}/full.sqlite")
+        identical = filecmp.cmp(f"{data_dir}/full.csv", f"{data_dir}/incremental.csv", shallow=False)
+        # Every changed document with an article is flagged, the deleted and emptied ones are dropped
+        with_articles = {str(pgpid) for pgpid in pgpids_to_transliterate(f"{data_dir}/full.sqlite")}
+        flags_match = {str(pgpid) for pgpid in flagged} == changed & with_articles and {str(pgpid) for pgpid in dropped} == deleted
+
+    rows = [
+        ["full", round(full_seconds, 2), "-", "-"],
+        ["incremental, no change", round(unchanged_seconds, 2), len(unchanged), 0],
+        [f"incremental, {args.changed:.0%} changed", round(incremental_seconds, 2), len(flagged), len(dropped)]
+    ]
+    print(f"{args.footnotes} footnotes, {args.pgpids} pgpids")
+    print(tabulate(rows, headers=["preparation", "seconds", "flagged", "deleted"], tablefmt="pretty"))
+
+    if identical is False or flags_match is False:
+        print("The incremental preparation doesn't match the full one!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
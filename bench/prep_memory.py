@@ -0,0 +1,91 @@
+from argparse import ArgumentParser
+from multiprocessing import get_context
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import csv
+import filecmp
+import random
+import resource
+import sys
+
+from tabulate import tabulate
+
+from bench.data import alkuzari_documents
+
+MODES = ["merge", "stream"]
+
+
+def write_inputs(data_dir, n_footnotes, n_pgpids, seed):
+    # A footnotes.csv export with n_footnotes rows (documents texts from Alkuzari) and the pgpids of interest
+    rng = random.Random(seed)
+    texts = [text for _, text in alkuzari_documents()]
+    n_documents = max(n_pgpids * 3, n_footnotes // 2)
+    with open(f"{data_dir}/footnotes.csv", "w") as f:
+        write = csv.writer(f)
+        write.writerow(["id", "document_id", "source", "location", "doc_relation", "notes", "content", "url"])
+        for footnote_id in range(n_footnotes):
+            content = rng.choice(texts)[:rng.randint(0, 2000)] if rng.random() > 0.1 else ""
+            write.writerow([footnote_id, rng.randint(1, n_documents), f"source {rng.randint(1, 5000)}", "",
+                            "Edition", "x" * rng.randint(0, 200), content, f"https://example.org/{footnote_id}"])
+    with open(f"{data_dir}/ja_articles_pgpids.csv", "w") as f:
+        write = csv.writer(f)
+        write.writerow(["pgpid", "url", "last_modified"])
+        write.writerows([pgpid, f"https://example.org/documents/{pgpid}/", "2024-01-01T00:00:00+00:00"]
+                        for pgpid in rng.sample(range(1, n_documents + 1), n_pgpids))
+
+
+def measure(mode, data_dir, chunk_size, results):
+    # Runs in a fresh process, ru_maxrss only grows
+    import pg_prep.prep_pg_data as prep
+
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = perf_counter()
+    if mode == "merge":
+        prep.DATA_DIR = data_dir
+        ids_text, skipped = prep.process_ja_articles_merging(*prep.read_ja_articles())
+        with open(f"{data_dir}/merge.csv", "w") as f:
+            write = csv.writer(f)
+            write.writerow(["pgpid", "content"])
+            write.writerows(ids_text)
+        n_articles = len(ids_text)
+    else:
+        n_articles, skipped = prep.stream_prepare_data(chunk_size, f"{data_dir}/ja_articles_pgpids.csv",
+                                                       f"{data_dir}/footnotes.csv", f"{data_dir}/stream.csv",
+                                                       f"{data_dir}/stream.sqlite")
+    seconds = perf_counter() - start_time
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((n_articles, skipped, seconds, peak_rss / 1024, (peak_rss - start_rss) / 1024))
+
+
+def main():
+    parser = ArgumentParser(description="Peak RSS of building idd_ja_articles with the pandas merge and streamed")
+    parser.add_argument("--footnotes", type=int, nargs="+", default=[20000, 80000, 320000], help="rows of footnotes.csv")
+    parser.add_argument("--pgpids", type=int, default=3000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    context = get_context("spawn")
+    rows, identical = [], True
+    for n_footnotes in args.footnotes:
+        with TemporaryDirectory() as data_dir:
+            write_inputs(data_dir, n_footnotes, args.pgpids, args.seed)
+            for mode in MODES:
+                results = context.Queue()
+                process = context.Process(target=measure, args=(mode, data_dir, args.chunk_size, results))
+                process.start()
+                n_articles, skipped, seconds, peak_mb, grown_mb = results.get()
+                process.join()
+                rows.append([n_footnotes, mode, n_articles, skipped, round(seconds, 2), round(peak_mb, 1), round(grown_mb, 1)])
+            identical = identical and filecmp.cmp(f"{data_dir}/merge.csv", f"{data_dir}/stream.csv", shallow=False)
+
+    print(tabulate(rows, headers=["footnotes", "mode", "articles", "skipped", "seconds", "peak RSS MB", "RSS growth MB"],
+                   tablefmt="pretty"))
+
+    if identical is False:
+        print("The streamed articles differ from the merged ones!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from argparse import ArgumentParser
+from itertools import tee
+from multiprocessing import get_context
+from time import perf_counter
+import resource
+
+from tabulate import tabulate
+
+from bench.data import documents, iter_documents
+from pg_prep.pgp_record import GenizaArticle
+from pg_prep.sliding_window import iter_slice, slice, sliding_window
+from run.e2e_pipe import PipelineManager
+
+MODES = ["concat", "list", "generator"]
+
+
+def concat_slice(pgpids, contents, target_window, ctxt_window):
+    # The former slice, the list of windows is copied for every document
+    chunked_articles = []
+    for article_content, article_pgpid in zip(contents, pgpids):
+        which_target_window = target_window if len(article_content) >= 512 else len(article_content)
+        which_ctxt_window = ctxt_window if len(article_content) >= 512 else 0
+
+        chunks = list(sliding_window(article_content, target_window=which_target_window, ctxt_window=which_ctxt_window))
+        chunked_articles = chunked_articles + [GenizaArticle(original_text=chunk[0], pgpid=article_pgpid,
+                                                             ctxt_win_size=which_ctxt_window,
+                                                             target_win_size=which_target_window,
+                                                             original_leading_boarder=chunk[1],
+                                                             original_target_boarder=chunk[2]) for chunk in chunks]
+    return chunked_articles
+
+
+def windows(mode, source, limit, target_window, ctxt_window):
+    if mode == "generator":
+        pgpids, contents = tee(iter_documents(source, limit))
+        return iter_slice(pgpids=(pgpid for pgpid, _ in pgpids), contents=(content for _, content in contents),
+                          target_window=target_window, ctxt_window=ctxt_window)
+
+    ids_texts = documents(source, limit)
+    slice_func = concat_slice if mode == "concat" else slice
+    return slice_func(pgpids=[pgpid for pgpid, _ in ids_texts], contents=[content for _, content in ids_texts],
+                      target_window=target_window, ctxt_window=ctxt_window)
+
+
+def measure(mode, args, results):
+    # Runs in a fresh process, ru_maxrss only grows
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = perf_counter()
+
+    sliced = windows(mode, args.source, args.limit, args.target_window, args.ctxt_window)
+    if args.stream:
+        n_windows = sum(1 for _ in PipelineManager.stream(sliced, micro_batch_size=args.micro_batch_size))
+    else:
+        n_windows = sum(1 for _ in sliced)
+
+    seconds = perf_counter() - start_time
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((n_windows, seconds, peak_rss / 1024, (peak_rss - start_rss) / 1024))
+
+
+def main():
+    parser = ArgumentParser(description="Time and peak RSS of slicing every document, as a list or lazily")
+    parser.add_argument("--source", default="pgp", choices=["alkuzari", "pgp"])
+    parser.add_argument("--limit", type=int, default=None, help="number of documents (all of them by default)")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--target-window", type=int, default=300)
+    parser.add_argument("--ctxt-window", type=int, default=100)
+    parser.add_argument("--stream", action="store_true", help="feed the windows to PipelineManager.stream (loads the models)")
+    parser.add_argument("--micro-batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    context = get_context("spawn")
+    rows = []
+    for mode in args.modes:
+        results = context.Queue()
+        process = context.Process(target=measure, args=(mode, args, results))
+        process.start()
+        n_windows, seconds, peak_mb, grown_mb = results.get()
+        process.join()
+        rows.append([mode, n_windows, round(seconds, 2), round(peak_mb, 1), round(grown_mb, 1)])
+
+    print(tabulate(rows, headers=["mode", "documents" if args.stream else "windows", "seconds", "peak RSS MB", "RSS growth MB"],
+                   tablefmt="pretty"))
+
+
+if __name__ == "__main__":
+    main()
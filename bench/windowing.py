@@ -0,0 +1,47 @@
+from argparse import ArgumentParser
+
+from tabulate import tabulate
+
+from bench.data import documents
+from pg_prep.sliding_window import slice, slice_by_tokens, window_tokens, count_tokens, MAX_TOKENS, MIN_OVERLAP
+
+
+def report(name, articles, documents_tokens, max_tokens):
+    tokens = window_tokens(articles)
+    # Every window also pays [CLS] and [SEP]
+    inference_tokens = sum(tokens) + 2 * len(tokens)
+    return [name, len(articles), inference_tokens, f"{inference_tokens / max(documents_tokens, 1):.2f}",
+            f"{sum(tokens) / max(len(tokens), 1) / max_tokens:.1%}", sum(window > max_tokens for window in tokens)]
+
+
+def main():
+    parser = ArgumentParser(description="Model tokens of the character windows against the token-budget windows")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--limit", type=int, default=None, help="number of documents (all of them by default)")
+    parser.add_argument("--target-window", type=int, default=300)
+    parser.add_argument("--ctxt-window", type=int, default=100)
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS)
+    parser.add_argument("--min-overlap", type=int, nargs="+", default=[MIN_OVERLAP])
+    args = parser.parse_args()
+
+    ids_texts = [(pgpid, content) for pgpid, content in documents(args.source, args.limit) if len(content.split()) > 0]
+    pgpids, contents = [pgpid for pgpid, _ in ids_texts], [content for _, content in ids_texts]
+    documents_tokens = sum(count_tokens(word) for content in contents for word in content.split())
+    print(f"{len(ids_texts)} documents, {documents_tokens} tokens")
+
+    char_windows = slice(pgpids=pgpids, contents=contents, target_window=args.target_window, ctxt_window=args.ctxt_window)
+    rows = [report(f"chars {args.target_window}+{args.ctxt_window}", char_windows, documents_tokens, args.max_tokens)]
+    for min_overlap in args.min_overlap:
+        token_windows = slice_by_tokens(pgpids=pgpids, contents=contents, max_tokens=args.max_tokens, min_overlap=min_overlap)
+        rows.append(report(f"tokens {args.max_tokens}, overlap {min_overlap}", token_windows, documents_tokens, args.max_tokens))
+
+    for row in rows[1:]:
+        row.append(f"{1 - row[2] / rows[0][2]:.1%}")
+    rows[0].append("-")
+
+    print(tabulate(rows, headers=["windowing", "windows", "inference tokens", "passes per token", "budget fill",
+                                  "over budget", "saved"], tablefmt="pretty"))
+
+
+if __name__ == "__main__":
+    main()
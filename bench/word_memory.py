@@ -0,0 +1,79 @@
+from argparse import ArgumentParser
+from copy import deepcopy
+from time import perf_counter
+import tracemalloc
+
+from tabulate import tabulate
+
+from bench.data import wrapped_windows
+from run.e2e_pipe import Word, Transliterate
+
+
+class DictWord:
+    # The former representation of a word: a __dict__ per instance, copied with deepcopy between the stages
+    def __init__(self, original_word, result_word, lang):
+        self._original_word = original_word
+        self._processed_word = result_word
+        self._lang = lang
+
+    @property
+    def original_word(self):
+        return self._original_word
+
+    @property
+    def lang(self):
+        return self._lang
+
+
+def deepcopy_merge(original_line, ar_line):
+    merged_line = []
+    i_ar = 0
+    for original_word in original_line:
+        if original_word.lang == Word.Lang.AR:
+            merged_line.append(deepcopy(ar_line[i_ar]))
+            i_ar += 1
+        else:
+            merged_line.append(deepcopy(original_word))
+    return merged_line
+
+
+def run_stages(words, word_cls, merge):
+    # CodeSwitch-like output (every other word is Arabic), the Transliterate output of its Arabic words, and their merge
+    code_switched = [[word_cls(word.original_word, "", Word.Lang.AR if i % 2 == 0 else Word.Lang.NAR)
+                      for i, word in enumerate(line)] for line in words]
+    transliterated = [[word_cls(word.original_word, word.original_word, Word.Lang.AR)
+                       for word in line if word.lang == Word.Lang.AR] for line in code_switched]
+    return [merge(original_line, ar_line) for original_line, ar_line in zip(code_switched, transliterated)]
+
+
+def measure(words, word_cls, merge):
+    tracemalloc.start()
+    start_time = perf_counter()
+    merged = run_stages(words, word_cls, merge)
+    seconds = perf_counter() - start_time
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del merged
+    return seconds, retained, peak
+
+
+def main():
+    parser = ArgumentParser(description="Memory of the pipeline words: __slots__ Words merged in place vs __dict__ words with deepcopy")
+    parser.add_argument("--source", default="alkuzari", choices=["alkuzari", "pgp"])
+    parser.add_argument("--limit", type=int, default=None, help="number of documents (all of them by default)")
+    args = parser.parse_args()
+
+    words = wrapped_windows(args.source, args.limit, target_window=300, ctxt_window=100)
+    print(f"{len(words)} windows, {sum(len(line) for line in words)} words")
+
+    rows = []
+    for name, word_cls, merge in [("__dict__ + deepcopy", DictWord, deepcopy_merge),
+                                  ("__slots__ + in place", Word, Transliterate._merge_ar_he)]:
+        seconds, retained, peak = measure(words, word_cls, merge)
+        rows.append([name, round(seconds, 2), round(retained / 2 ** 20, 1), round(peak / 2 ** 20, 1)])
+
+    print(tabulate(rows, headers=["words", "seconds", "retained MB", "peak MB"], tablefmt="pretty"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,148 @@
+import numpy as np
 
-class GenizaArticle(object):
 
-	_pgpid = -1
+def longest_overlap(s1, s2):
+	# The longest suffix of s1 which is also a prefix of s2, in linear time (KMP failure function of s2)
+	s1 = s1[-len(s2):] if len(s2) > 0 else ""
+	if len(s1) == 0:
+		return ""
 
-	_ctxt_win_size, _target_win_size = -1, -1
+	failure = [0] * len(s2)
+	k = 0
+	for i in range(1, len(s2)):
+		while k > 0 and s2[i] != s2[k]:
+			k = failure[k - 1]
+		if s2[i] == s2[k]:
+			k = k + 1
+		failure[i] = k
 
-	_original_leading_boarder, _original_target_boarder, _original_errb_boarder, _original_errc_boarder = -1, -1, -1, -1
-	_original_text, _original_leading_ctxt, _original_target, _original_trailing_ctxt, _original_errb, _original_errc = "", "", "", "", "", ""
+	k = 0
+	for c in s1:
+		while k > 0 and (k == len(s2) or s2[k] != c):
+			k = failure[k - 1]
+		if s2[k] == c:
+			k = k + 1
+	return s2[:k]
 
-	_processed_leading_boarder, _processed_target_boarder, _processed_errb_boarder, _processed_errc_boarder = -1, -1, -1, -1
-	_processed_text, _processed_leading_ctxt, _processed_target, _processed_trailing_ctxt, _processed_errb, _processed_errc = "", "", "", "", "", ""
 
-	_processed_words = []
+class GenizaArticle(object):
 
-	_leading_end_word, _target_end_word = -1, -1
+	# One original and one processed text per window, the contexts, target and errors are spans of them (by the boarders)
+	__slots__ = (
+		"_pgpid", "_ctxt_win_size", "_target_win_size",
+		"_original_text", "_original_leading_boarder", "_original_target_boarder", "_original_errb_boarder", "_original_errc_boarder",
+		"_original_marked", "_original_merged_target",
+		"_processed_text", "_processed_leading_boarder", "_processed_target_boarder", "_processed_errb_boarder", "_processed_errc_boarder",
+		"_processed_marked", "_processed_merged_target",
+		"_processed_words", "_leading_end_word", "_target_end_word", "_snapped_leading_end_word", "_snapped_target_end_word",
+		"_original_word_ends", "_processed_word_ends"
+	)
 
 
-	def __init__(self, pgpid, ctxt_win_size, target_win_size, original_text, original_leading_boarder = -1, original_target_boarder = -1):
+	def __init__(self, pgpid, ctxt_win_size, target_win_size, original_text, original_leading_boarder = -1, original_target_boarder = -1,
+				 leading_end_word = -1, target_end_word = -1):
 
 		self._pgpid = pgpid
 		self._original_text = original_text
+		self._processed_text = ""
 
 		self._ctxt_win_size = ctxt_win_size
 		self._target_win_size = target_win_size
 
+		self._original_leading_boarder, self._original_target_boarder, self._original_errb_boarder, self._original_errc_boarder = -1, -1, -1, -1
+		self._processed_leading_boarder, self._processed_target_boarder, self._processed_errb_boarder, self._processed_errc_boarder = -1, -1, -1, -1
 		if original_leading_boarder > -1 and original_target_boarder > -1:
 			self._original_leading_boarder = original_leading_boarder
 			self._original_target_boarder = original_target_boarder
 
+		# The spans are read only once marked, a merged article keeps its joined target
+		self._original_marked, self._processed_marked = False, False
+		self._original_merged_target, self._processed_merged_target = None, None
+
+		self._processed_words = []
+		self._original_word_ends, self._processed_word_ends = None, None
+		self._leading_end_word, self._target_end_word = -1, -1
+
+		# Windows cut on word boundaries (slice_by_tokens) give their first and last target words
+		self._snapped_leading_end_word, self._snapped_target_end_word = -1, -1
+		if leading_end_word > -1 and target_end_word > -1:
+			self._snapped_leading_end_word = leading_end_word
+			self._snapped_target_end_word = target_end_word
+
+
+	def _text_part(self, which_text, part):
+
+		if which_text:
+			text, marked, merged_target = self._processed_text, self._processed_marked, self._processed_merged_target
+			leading, target, errb, errc = self._processed_leading_boarder, self._processed_target_boarder, self._processed_errb_boarder, self._processed_errc_boarder
+		else:
+			text, marked, merged_target = self._original_text, self._original_marked, self._original_merged_target
+			leading, target, errb, errc = self._original_leading_boarder, self._original_target_boarder, self._original_errb_boarder, self._original_errc_boarder
+
+		if marked is False:
+			return ""
+		if part == "errb":
+			return text[leading: errb] if errb > -1 else ""
+		if part == "errc":
+			return text[leading: errc] if errb == -1 and errc > -1 else ""
+		if merged_target is not None:
+			return merged_target if part == "target" else ""
+		if part == "leading_ctxt":
+			return text[: leading]
+		if part == "trailing_ctxt":
+			return text[target:]
+
+		target_start = errb if errb > -1 else errc if errc > -1 else leading
+		return text[target_start: target]
+
+
+	def target_span(self, which_text):
+
+		# (start, end) of the target in the text of the window, text[start: end] is the target piece before any merge
+		if which_text:
+			text, leading, target, errb, errc = self._processed_text, self._processed_leading_boarder, self._processed_target_boarder, self._processed_errb_boarder, self._processed_errc_boarder
+		else:
+			text, leading, target, errb, errc = self._original_text, self._original_leading_boarder, self._original_target_boarder, self._original_errb_boarder, self._original_errc_boarder
+
+		target_start = errb if errb > -1 else errc if errc > -1 else leading
+		start, end, _ = slice(target_start, target).indices(len(text))
+		return start, max(start, end)
+
+
+	_original_leading_ctxt = property(lambda self: self._text_part(False, "leading_ctxt"))
+	_original_errb = property(lambda self: self._text_part(False, "errb"))
+	_original_errc = property(lambda self: self._text_part(False, "errc"))
+	_original_target = property(lambda self: self._text_part(False, "target"))
+	_original_trailing_ctxt = property(lambda self: self._text_part(False, "trailing_ctxt"))
+
+	_processed_leading_ctxt = property(lambda self: self._text_part(True, "leading_ctxt"))
+	_processed_errb = property(lambda self: self._text_part(True, "errb"))
+	_processed_errc = property(lambda self: self._text_part(True, "errc"))
+	_processed_target = property(lambda self: self._text_part(True, "target"))
+	_processed_trailing_ctxt = property(lambda self: self._text_part(True, "trailing_ctxt"))
+
 	
 	def find_word_indices(self, which_boarders = 0):
 
+		if self._snapped_leading_end_word > -1 and self._snapped_target_end_word > -1:
+			self._leading_end_word = self._snapped_leading_end_word
+			self._target_end_word = self._snapped_target_end_word
+			return
+
 		leading_boarder = self._original_leading_boarder if which_boarders == 0 else self._processed_leading_boarder
-		errb_boarder = self._original_errb_boarder if which_boarders == 0 else self._processed_errb_boarder
 		target_boarder = self._original_target_boarder if which_boarders == 0 else self._processed_target_boarder
 
-		word_idx, char_idx = 0, 0
-		for word in self._processed_words:
-			crt_word = word.original_word if which_boarders == 0 else word.processed_word
-			char_idx = char_idx + len(crt_word) + 1 #for the space
-			if self._leading_end_word > -1 and char_idx >= target_boarder:
-				self._target_end_word = word_idx
-				break
-			elif self._leading_end_word == -1 and char_idx >= leading_boarder:
-				self._leading_end_word = word_idx
-			word_idx = word_idx + 1
+		# The first word ending (space included) at or after the leading boarder, then the first following one at or after the target boarder
+		word_ends = self.word_ends(which_boarders != 0)
+		target_from = 0
+		if self._leading_end_word == -1:
+			leading_end_word = int(np.searchsorted(word_ends, leading_boarder, side="left"))
+			if leading_end_word < len(word_ends):
+				self._leading_end_word = leading_end_word
+			target_from = len(word_ends) if self._leading_end_word == -1 else self._leading_end_word + 1
+		target_end_word = max(target_from, int(np.searchsorted(word_ends, target_boarder, side="left")))
+		if target_end_word < len(word_ends):
+			self._target_end_word = target_end_word
 		self._target_end_word = self._target_end_word if self._target_end_word > 0 else len(self._processed_words)
 		self._target_end_word = self._target_end_word - 2 if self._ctxt_win_size > 0 else self._target_end_word - 1
 
@@ -52,20 +150,16 @@ class GenizaArticle(object):
 	def find_text_indices(self, which_text, leading_end_word, target_end_word):
 
 		leading_end_text, target_end_text = -1, -1
-		char_idx, word_idx = 0, 0
-
-		for word in self._processed_words:
-
-			word_len = len(word.processed_word) if which_text else len(word.original_word)
-			char_idx = char_idx + word_len + 1 #for the space
 
-			if leading_end_word > -1 and word_idx == target_end_word:
-				target_end_text = char_idx
-				break
-			elif leading_end_word == word_idx:
-				leading_end_text = char_idx - word_len - 1
-
-			word_idx = word_idx + 1
+		# The target ends after the space of its last word and the leading context before the first target word
+		word_ends = self.word_ends(which_text)
+		if leading_end_word > -1:
+			last_word = target_end_word if 0 <= target_end_word < len(word_ends) else len(word_ends)
+			if last_word < len(word_ends):
+				target_end_text = int(word_ends[last_word])
+			# A window cut on word boundaries can have a single target word
+			if leading_end_word < last_word or (leading_end_word == last_word and self._snapped_target_end_word > -1):
+				leading_end_text = int(word_ends[leading_end_word - 1]) if leading_end_word > 0 else 0
 
 		if which_text:
 			self._processed_leading_boarder = leading_end_text
@@ -77,16 +171,8 @@ class GenizaArticle(object):
 
 	def mark_original_text(self):
 
-		self._original_leading_ctxt = self._original_text[: self._original_leading_boarder]
-		if self._original_errb_boarder > -1:
-			self._original_errb = self._original_text[self._original_leading_boarder: self._original_errb_boarder]
-			self._original_target = self._original_text[self._original_errb_boarder: self._original_target_boarder]
-		elif self._original_errc_boarder > -1:
-			self._original_errc = self._original_text[self._original_leading_boarder: self._original_errc_boarder]
-			self._original_target = self._original_text[self._original_errc_boarder: self._original_target_boarder]
-		else:
-			self._original_target = self._original_text[self._original_leading_boarder: self._original_target_boarder]
-		self._original_trailing_ctxt = self._original_text[self._original_target_boarder: ]
+		self._original_marked = True
+		self._original_merged_target = None
 
 
 	def adjust_original_text(self):
@@ -99,16 +185,8 @@ class GenizaArticle(object):
 
 	def mark_processed_text(self):
 
-		self._processed_leading_ctxt = self._processed_text[: self._processed_leading_boarder]
-		if self._processed_errb_boarder > -1:
-			self._processed_errb = self._processed_text[self._processed_leading_boarder: self._processed_errb_boarder]
-			self._processed_target = self._processed_text[self._processed_errb_boarder: self._processed_target_boarder]
-		elif self._processed_errc_boarder > -1:
-			self._processed_errc = self._processed_text[self._processed_leading_boarder: self._processed_errc_boarder]
-			self._processed_target = self._processed_text[self._processed_errc_boarder: self._processed_target_boarder]
-		else:
-			self._processed_target = self._processed_text[self._processed_leading_boarder: self._processed_target_boarder]
-		self._processed_trailing_ctxt = self._processed_text[self._processed_target_boarder: ]
+		self._processed_marked = True
+		self._processed_merged_target = None
 
 
 	def adjust_processed_text(self):
@@ -127,9 +205,23 @@ class GenizaArticle(object):
 		self.adjust_original_text()
 
 
+	def word_ends(self, which_text):
+
+		# Cumulative character offsets (a space after every word) of the processed words, built once per assignment
+		if which_text:
+			if self._processed_word_ends is None:
+				self._processed_word_ends = np.cumsum(np.fromiter((len(word.processed_word) + 1 for word in self._processed_words), dtype=np.int64, count=len(self._processed_words)))
+			return self._processed_word_ends
+
+		if self._original_word_ends is None:
+			self._original_word_ends = np.cumsum(np.fromiter((len(word.original_word) + 1 for word in self._processed_words), dtype=np.int64, count=len(self._processed_words)))
+		return self._original_word_ends
+
+
 	def assign_processed(self, processed_words):
 		
 		self._processed_words = processed_words
+		self._original_word_ends, self._processed_word_ends = None, None
 		self.align_boarders(which_boarders = 0)
 
 
@@ -137,40 +229,33 @@ class GenizaArticle(object):
 		return f"{self._processed_leading_ctxt}\n{self._processed_target}\n{self._processed_trailing_ctxt}"
 
 
-	def substrings(self, s):
-		for j in range(0, len(s)):
-			yield s[0:j+1]
-
-
-	def intersect(self, s1, s2, which_to_reverse):
-		set1 = set([s[::-1] for s in list(self.substrings(s1))]) if which_to_reverse == 0 else set(self.substrings(s1))
-		set2 = set([s[::-1] for s in list(self.substrings(s2))]) if which_to_reverse == 1 else set(self.substrings(s2))
-		return set1 & set2
-
-
 	def detect_and_highlight_errors(self, prev_article):
 
+		# Windows cut on word boundaries follow each other exactly, a word repeated across them isn't an error
+		if self._snapped_leading_end_word > -1 and prev_article._snapped_leading_end_word > -1:
+			return
+
 		#Error B (duplication) in the processed text
-		proc_case_b_err = max(self.intersect(prev_article._processed_target[::-1], self._processed_target, 0), key=len, default="")
+		proc_case_b_err = longest_overlap(prev_article._processed_target, self._processed_target)
 		if len(proc_case_b_err) > 2:
 			self._processed_errb_boarder = self._processed_leading_boarder + len(proc_case_b_err)
 			self.mark_processed_text()
 
 		#Error B (duplication) in the original text
-		org_case_b_err = max(self.intersect(prev_article._original_target[::-1], self._original_target, 0), key=len, default="")
+		org_case_b_err = longest_overlap(prev_article._original_target, self._original_target)
 		if len(org_case_b_err) > 2:
 			self._original_errb_boarder = self._original_leading_boarder + len(org_case_b_err)
 			self.mark_original_text()
 
 		#Error C (elimination) in the processed text
-		case_c_err = max(self.intersect(prev_article._processed_trailing_ctxt, self._processed_leading_ctxt[::-1], 1), key=len, default="")
+		case_c_err = longest_overlap(self._processed_leading_ctxt, prev_article._processed_trailing_ctxt)
 		if len(case_c_err) > 2:
 			self._processed_errc_boarder = self._processed_leading_boarder
 			self._processed_leading_boarder = self._processed_leading_boarder - len(case_c_err)
 			self.mark_processed_text()
 
 		#Error C (elimination) in the original text
-		case_c_err = max(self.intersect(prev_article._original_trailing_ctxt, self._original_leading_ctxt[::-1], 1), key=len, default="")
+		case_c_err = longest_overlap(self._original_leading_ctxt, prev_article._original_trailing_ctxt)
 		if len(case_c_err) > 2:
 			self._original_errc_boarder = self._original_leading_boarder
 			self._original_leading_boarder = self._original_leading_boarder - len(case_c_err)
@@ -178,7 +263,7 @@ class GenizaArticle(object):
 
 	def detect_and_fix_errors(self, prev_article):
 
-		case_b_err = max(self.intersect(prev_article._processed_target[::-1], self._processed_target, 0), key=len, default="")
+		case_b_err = longest_overlap(prev_article._processed_target, self._processed_target)
 		if len(case_b_err) > 2:
 			print(f"Case B error detected => {case_b_err}")
 			#fixing the processed/output/Arabic
@@ -188,7 +273,7 @@ class GenizaArticle(object):
 			self._leading_end_word = self._leading_end_word + len(case_b_err.split())
 			self.adjust_original_text()
 
-		case_c_err = max(self.intersect(prev_article._processed_trailing_ctxt, self._processed_leading_ctxt[::-1], 1), key=len, default="")
+		case_c_err = longest_overlap(self._processed_leading_ctxt, prev_article._processed_trailing_ctxt)
 		if len(case_c_err) > 2:
 			print(f"Case C error detected => {case_c_err}")
 			#fixing the processed/output/Arabic
@@ -199,13 +284,14 @@ class GenizaArticle(object):
 			self.adjust_original_text()
 
 
-	def merge(self, another_article):
+	def merge(self, *another_articles):
 
-		if self._pgpid != another_article._pgpid:
+		# All the following windows of a document are merged at once, so the targets are joined a single time
+		if any(self._pgpid != another_article._pgpid for another_article in another_articles):
 			print(f"Can't merge two different articles!")
 			return
 
-		self._original_leading_ctxt, self._processed_leading_ctxt = "", ""
-		self._original_target = self._original_target + another_article._original_target
-		self._processed_target = self._processed_target + another_article._processed_target
-		self._original_trailing_ctxt, self._processed_trailing_ctxt = "", ""
+		# The contexts of a merged article are empty
+		self._original_merged_target = ''.join([self._original_target] + [another_article._original_target for another_article in another_articles])
+		self._processed_merged_target = ''.join([self._processed_target] + [another_article._processed_target for another_article in another_articles])
+		self._original_marked, self._processed_marked = True, True
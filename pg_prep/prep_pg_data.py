@@ -1,18 +1,31 @@
 #coding: utf8
 
 
-import pandas as pd
 import csv
+import os
+import sqlite3
+from hashlib import sha256
 import numpy as np
-import matplotlib.pyplot as plt
 import statistics as st
 
 
 DATA_DIR = "../resources/pgp_data"
+PGPIDS_CSV = f"{DATA_DIR}/ja_articles_pgpids.csv"
+FOOTNOTES_CSV = f"{DATA_DIR}/footnotes.csv"
+FOOTNOTES_CHUNK = 10000
+MIN_CONTENT_LEN = 5
+ARTICLES_CSV = f"{DATA_DIR}/idd_ja_articles.csv"
+# Indexed copy of idd_ja_articles.csv, rebuilt whenever the CSV is newer
+ARTICLES_STORE = f"{DATA_DIR}/idd_ja_articles.sqlite"
+STORE_QUERY_CHUNK = 500
+
+_store_connections = {}
 
 
 def read_ja_articles():
 
+	import pandas as pd
+
 	#pgpids (of interest)
 	ja_articles_df = pd.read_csv(f"{DATA_DIR}/ja_articles_pgpids.csv")
 	pgpid_df = ja_articles_df[["pgpid"]]
@@ -28,7 +41,7 @@ def read_ja_articles():
 def process_ja_articles_merging(pgpid_df, ids_contents_df):
 
 	all_ids_text = pgpid_df.merge(ids_contents_df, left_on='pgpid', right_on='document_id')[['pgpid', 'content']]
-	mask = (all_ids_text['content'].str.len() > 5)
+	mask = (all_ids_text['content'].str.len() > MIN_CONTENT_LEN)
 	ids_text_df = all_ids_text.loc[mask]
 	ids_text = ids_text_df.values.tolist()
 	skipped = len(all_ids_text) - len(ids_text_df)
@@ -37,6 +50,7 @@ def process_ja_articles_merging(pgpid_df, ids_contents_df):
 
 def ja_docs_stats(ids_contents):
 
+	import matplotlib.pyplot as plt
 	articles_lens = [len(doc[1]) for doc in ids_contents]
 	print(f"Total count is {len(articles_lens)}")
 	print(f"Average document length is {round(np.nanmean(articles_lens), 2)}")
@@ -53,25 +67,288 @@ def ja_docs_stats(ids_contents):
 
 def save_ja_articles(ids_text, skipped):
 
-	with open(f'{DATA_DIR}/idd_ja_articles.csv', 'w') as f:
+	with open(ARTICLES_CSV, 'w') as f:
 		write = csv.writer(f)
 		write.writerow(['pgpid', 'content'])
 		write.writerows(ids_text)
 
 
+def _new_store(store_path):
+
+	# Written aside and swapped in by _swap_store, the readers never see a partial store
+	tmp_path = f"{store_path}.tmp"
+	if os.path.exists(tmp_path):
+		os.remove(tmp_path)
+
+	connection = sqlite3.connect(tmp_path)
+	connection.execute("CREATE TABLE articles (position INTEGER PRIMARY KEY, pgpid INTEGER NOT NULL, content TEXT NOT NULL)")
+	connection.execute("CREATE TABLE manifest (pgpid INTEGER PRIMARY KEY, last_modified TEXT, content_hash TEXT NOT NULL, "
+						"needs_transliteration INTEGER NOT NULL)")
+	return connection
+
+
+def _swap_store(connection, store_path):
+
+	connection.execute("CREATE INDEX articles_pgpid ON articles (pgpid)")
+	connection.commit()
+	connection.close()
+	close_store(store_path)
+	os.replace(f"{store_path}.tmp", store_path)
+
+
+def save_ja_articles_store(ids_text, store_path = ARTICLES_STORE):
+
+	connection = _new_store(store_path)
+	connection.executemany("INSERT INTO articles (pgpid, content) VALUES (?, ?)",
+							((int(pgpid), content) for pgpid, content in ids_text))
+	_swap_store(connection, store_path)
+
+
+def build_store(csv_path = ARTICLES_CSV, store_path = ARTICLES_STORE):
+
+	with open(csv_path, newline='') as f:
+		reader = csv.reader(f)
+		next(reader)
+		save_ja_articles_store(reader, store_path)
+
+
+def _store(store_path = ARTICLES_STORE, csv_path = ARTICLES_CSV):
+
+	stale = not os.path.exists(store_path) or \
+		(os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(store_path))
+	if stale:
+		if not os.path.exists(csv_path):
+			raise FileNotFoundError(f"Neither {store_path} nor {csv_path} exist, run prepare_data first")
+		build_store(csv_path, store_path)
+
+	if store_path not in _store_connections:
+		_store_connections[store_path] = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True, check_same_thread=False)
+	return _store_connections[store_path]
+
+
+def close_store(store_path = ARTICLES_STORE):
+
+	if store_path in _store_connections:
+		_store_connections.pop(store_path).close()
+
+
 def prepare_data(save: True):
 
 	pgpid_df, ids_contents_df = read_ja_articles()
 	ids_text, skipped = process_ja_articles_merging(pgpid_df, ids_contents_df)
 	if save:
 		save_ja_articles(ids_text, skipped)
+		save_ja_articles_store(ids_text)
 	return ids_text
 
 
-def content_by_pgps(pgpids):
+def _read_pgpids(pgpids_csv):
+
+	# pgpid -> (ranks in ja_articles_pgpids.csv, last_modified)
+	import pandas as pd
+
+	pgpids_df = pd.read_csv(pgpids_csv, usecols=lambda column: column in ["pgpid", "last_modified"], dtype={"last_modified": object})
+	last_modified = pgpids_df["last_modified"].tolist() if "last_modified" in pgpids_df else [None] * len(pgpids_df)
+	pgpids = {}
+	for rank, (pgpid, modified) in enumerate(zip(pgpids_df["pgpid"].tolist(), last_modified)):
+		ranks, _ = pgpids.setdefault(int(pgpid), ([], None if pd.isna(modified) else str(modified)))
+		ranks.append(rank)
+	return pgpids
+
+
+def _stage_footnotes(connection, footnotes_csv, pgpid_ranks, chunk_size):
+
+	# Hash-joins footnotes.csv, chunk by chunk, against the pgpids into the temporary matches table
+	import pandas as pd
+
+	connection.execute("CREATE TEMP TABLE matches (rank INTEGER NOT NULL, row INTEGER NOT NULL, pgpid INTEGER NOT NULL, content TEXT)")
+	row, skipped = 0, 0
+	for chunk in pd.read_csv(footnotes_csv, usecols=["document_id", "content"], dtype={"content": object}, chunksize=chunk_size):
+		matches = []
+		for document_id, content in zip(chunk["document_id"].tolist(), chunk["content"].tolist()):
+			row += 1
+			if pd.isna(document_id) or int(document_id) not in pgpid_ranks:
+				continue
+			for rank in pgpid_ranks[int(document_id)]:
+				if isinstance(content, str) and len(content) > MIN_CONTENT_LEN:
+					matches.append((rank, row, int(document_id), content))
+				else:
+					skipped += 1
+		connection.executemany("INSERT INTO matches VALUES (?, ?, ?, ?)", matches)
+	return skipped
+
+
+def _update_manifest(connection, pgpids):
+
+	# Hashes the articles of the pgpids (pgpid -> last_modified), the ones whose content changed are flagged for
+	# (re-)transliteration. Returns the flagged pgpids and the emptied ones (they had articles, none is left).
+	connection.execute("CREATE TEMP TABLE hashed (pgpid INTEGER PRIMARY KEY)")
+	connection.executemany("INSERT INTO hashed VALUES (?)", ((pgpid,) for pgpid in pgpids))
+	hashes = {}
+	for pgpid, content in connection.execute("SELECT pgpid, content FROM articles WHERE pgpid IN (SELECT pgpid FROM hashed) ORDER BY position"):
+		hashes.setdefault(pgpid, sha256()).update(content.encode("utf-8") + b"\0")
+	previous = {pgpid: (content_hash, needs_transliteration) for pgpid, content_hash, needs_transliteration in
+				connection.execute("SELECT pgpid, content_hash, needs_transliteration FROM manifest WHERE pgpid IN (SELECT pgpid FROM hashed)")}
+	connection.execute("DROP TABLE hashed")
+
+	empty_hash = sha256().hexdigest()
+	flagged, emptied, entries = [], [], []
+	for pgpid, last_modified in pgpids.items():
+		content_hash = hashes[pgpid].hexdigest() if pgpid in hashes else empty_hash
+		previous_hash, needs_transliteration = previous.get(pgpid, (None, 0))
+		if pgpid in hashes and content_hash != previous_hash:
+			flagged.append(pgpid)
+			needs_transliteration = 1
+		elif pgpid not in hashes and previous_hash not in [None, empty_hash]:
+			emptied.append(pgpid)
+			needs_transliteration = 0
+		entries.append((pgpid, last_modified, content_hash, needs_transliteration))
+	connection.executemany("INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?)", entries)
+	return flagged, emptied
+
+
+def _write_articles_csv(connection, csv_path, chunk_size):
+
+	n_articles = 0
+	with open(csv_path, 'w') as f:
+		write = csv.writer(f)
+		write.writerow(['pgpid', 'content'])
+		cursor = connection.execute("SELECT pgpid, content FROM articles ORDER BY position")
+		while True:
+			rows = cursor.fetchmany(chunk_size)
+			if len(rows) == 0:
+				break
+			write.writerows(rows)
+			n_articles += len(rows)
+	return n_articles
+
+
+def stream_prepare_data(chunk_size = FOOTNOTES_CHUNK, pgpids_csv = PGPIDS_CSV, footnotes_csv = FOOTNOTES_CSV,
+						csv_path = ARTICLES_CSV, store_path = ARTICLES_STORE):
+
+	# prepare_data in bounded memory: footnotes.csv is read chunk by chunk and hash-joined against the pgpids, the
+	# matches are staged on disk and written out in the order of the merge (pgpids order, then footnotes order)
+	pgpids = _read_pgpids(pgpids_csv)
+
+	connection = _new_store(store_path)
+	skipped = _stage_footnotes(connection, footnotes_csv, {pgpid: ranks for pgpid, (ranks, _) in pgpids.items()}, chunk_size)
+	connection.execute("INSERT INTO articles (pgpid, content) SELECT pgpid, content FROM matches ORDER BY rank, row")
+	connection.execute("DROP TABLE matches")
+	_update_manifest(connection, {pgpid: last_modified for pgpid, (_, last_modified) in pgpids.items()})
+	connection.commit()
+
+	n_articles = _write_articles_csv(connection, csv_path, chunk_size)
+	_swap_store(connection, store_path)
+
+	return n_articles, skipped
+
+
+def _has_manifest(store_path):
+
+	if not os.path.exists(store_path):
+		return False
+	connection = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True)
+	try:
+		return connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'manifest'").fetchone() is not None \
+			and connection.execute("SELECT COUNT(*) FROM manifest").fetchone()[0] > 0
+	finally:
+		connection.close()
+
+
+def update_prepared_data(chunk_size = FOOTNOTES_CHUNK, pgpids_csv = PGPIDS_CSV, footnotes_csv = FOOTNOTES_CSV,
+						csv_path = ARTICLES_CSV, store_path = ARTICLES_STORE):
+
+	# Incremental stream_prepare_data: only the documents added or whose last_modified changed since the previous
+	# preparation are re-extracted, the deleted ones are dropped. Returns the pgpids flagged for (re-)transliteration
+	# (their content changed) and the deleted pgpids, with the ones still listed but left without any article.
+	if not _has_manifest(store_path):
+		stream_prepare_data(chunk_size, pgpids_csv, footnotes_csv, csv_path, store_path)
+		return pgpids_to_transliterate(store_path), []
+
+	pgpids = _read_pgpids(pgpids_csv)
+	close_store(store_path)
+	connection = sqlite3.connect(store_path, isolation_level=None)
+	try:
+		manifest = dict(connection.execute("SELECT pgpid, last_modified FROM manifest"))
+		modified = {pgpid: (ranks, last_modified) for pgpid, (ranks, last_modified) in pgpids.items()
+					if pgpid not in manifest or manifest[pgpid] != last_modified}
+		deleted = [pgpid for pgpid in manifest if pgpid not in pgpids]
+		if len(modified) == 0 and len(deleted) == 0:
+			return [], []
+
+		connection.execute("BEGIN IMMEDIATE")
+		_stage_footnotes(connection, footnotes_csv, {pgpid: ranks for pgpid, (ranks, _) in modified.items()}, chunk_size)
+		connection.execute("CREATE TEMP TABLE ranks (pgpid INTEGER PRIMARY KEY, rank INTEGER NOT NULL, modified INTEGER NOT NULL)")
+		connection.executemany("INSERT INTO ranks VALUES (?, ?, ?)",
+								((pgpid, min(ranks), pgpid in modified) for pgpid, (ranks, _) in pgpids.items()))
+		connection.execute("DELETE FROM articles WHERE pgpid NOT IN (SELECT pgpid FROM ranks WHERE modified = 0)")
+		connection.execute("DELETE FROM manifest WHERE pgpid NOT IN (SELECT pgpid FROM ranks)")
+		connection.execute("INSERT INTO articles (pgpid, content) SELECT pgpid, content FROM matches ORDER BY rank, row")
+
+		# The re-extracted articles are appended, the table is rewritten in the order of a full preparation
+		connection.execute("CREATE TABLE ordered (position INTEGER PRIMARY KEY, pgpid INTEGER NOT NULL, content TEXT NOT NULL)")
+		connection.execute("INSERT INTO ordered (pgpid, content) SELECT articles.pgpid, articles.content FROM articles "
+							"JOIN ranks ON ranks.pgpid = articles.pgpid ORDER BY ranks.rank, articles.position")
+		connection.execute("DROP TABLE articles")
+		connection.execute("ALTER TABLE ordered RENAME TO articles")
+		connection.execute("CREATE INDEX articles_pgpid ON articles (pgpid)")
+		flagged, emptied = _update_manifest(connection, {pgpid: last_modified for pgpid, (_, last_modified) in modified.items()})
+		connection.execute("DROP TABLE matches")
+		connection.execute("DROP TABLE ranks")
+		connection.execute("COMMIT")
+
+		_write_articles_csv(connection, csv_path, chunk_size)
+	finally:
+		connection.close()
+	# The store stays newer than the CSV, it isn't rebuilt from it
+	os.utime(store_path)
+
+	return flagged, deleted + emptied
+
+
+def pgpids_to_transliterate(store_path = ARTICLES_STORE):
+
+	connection = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True)
+	try:
+		return [pgpid for pgpid, in connection.execute(
+			"SELECT manifest.pgpid FROM manifest JOIN (SELECT pgpid, MIN(position) AS position FROM articles GROUP BY pgpid) AS first "
+			"ON first.pgpid = manifest.pgpid WHERE needs_transliteration = 1 ORDER BY first.position")]
+	finally:
+		connection.close()
+
+
+def mark_transliterated(pgpids, store_path = ARTICLES_STORE):
+
+	connection = sqlite3.connect(store_path)
+	try:
+		connection.executemany("UPDATE manifest SET needs_transliteration = 0 WHERE pgpid = ?", ((int(pgpid),) for pgpid in pgpids))
+		connection.commit()
+	finally:
+		connection.close()
+
+
+def content_by_pgps(pgpids, store_path = ARTICLES_STORE, csv_path = ARTICLES_CSV):
+
+	# [pgpid, content] rows of the pgpids, in the order of idd_ja_articles.csv
+	store = _store(store_path, csv_path)
+	pgpids = list(dict.fromkeys(int(pgpid) for pgpid in pgpids))
+	rows = []
+	for start in range(0, len(pgpids), STORE_QUERY_CHUNK):
+		chunk = pgpids[start: start + STORE_QUERY_CHUNK]
+		rows += store.execute(f"SELECT position, pgpid, content FROM articles WHERE pgpid IN ({','.join('?' * len(chunk))})",
+							chunk).fetchall()
+	return [[pgpid, content] for _, pgpid, content in sorted(rows)]
+
+
+def iter_articles(store_path = ARTICLES_STORE, csv_path = ARTICLES_CSV, chunk_size = 1000):
 
-	ids_texts_df = pd.read_csv(f"{DATA_DIR}/idd_ja_articles.csv")
-	return ids_texts_df[ids_texts_df['pgpid'].isin(pgpids)].values.tolist()
+	# (pgpid, content) of every article in the order of idd_ja_articles.csv, chunk_size rows in memory at a time
+	cursor = _store(store_path, csv_path).execute("SELECT pgpid, content FROM articles ORDER BY position")
+	while True:
+		rows = cursor.fetchmany(chunk_size)
+		if len(rows) == 0:
+			return
+		yield from rows
 
 def prep_and_stats():
 	id_texts = prepare_data(save = True)
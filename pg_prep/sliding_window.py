@@ -1,8 +1,15 @@
 #coding: utf8
 
 from pg_prep.pgp_record import GenizaArticle
+from itertools import accumulate
 import cProfile
 
+# The models get 512 tokens, [CLS] and [SEP] included (Task.MAX_LEN)
+MAX_TOKENS = 510
+MIN_OVERLAP = 64
+# The letters ClearText keeps, the WordPiece vocabularies of both models hold a token per letter
+HE_LETTERS = "אבגדהוזחטיכלמנסעפצקרשתךםןףץ"
+
 class FORMATS:
 	
 	TEXT_GREEN = '\033[92m'
@@ -37,22 +44,146 @@ def test_sliding_window(article_content, target_window, ctxt_window):
 	show_chunks(article_content, chunks)
 
 
-def slice(pgpids, contents, target_window, ctxt_window):
+def iter_slice(pgpids, contents, target_window, ctxt_window):
+	# Yields the windows document by document (pgpids and contents can be lazy iterables), e.g. for PipelineManager.stream
 
-	chunked_articles = []
 	for article_content, article_pgpid in zip(contents, pgpids):
 
 		which_target_window = target_window if len(article_content) >= 512 else len(article_content)
 		which_ctxt_window = ctxt_window if len(article_content) >= 512 else 0
 
-		chunks_gen = sliding_window(article_content, target_window = which_target_window, ctxt_window = which_ctxt_window)
-		chunks = list(chunks_gen)
+		for chunk in sliding_window(article_content, target_window = which_target_window, ctxt_window = which_ctxt_window):
+			yield GenizaArticle(original_text = chunk[0],
+								pgpid = article_pgpid,
+								ctxt_win_size = which_ctxt_window,
+								target_win_size = which_target_window,
+								original_leading_boarder = chunk[1],
+								original_target_boarder = chunk[2])
+
+
+def slice(pgpids, contents, target_window, ctxt_window):
+
+	return list(iter_slice(pgpids, contents, target_window, ctxt_window))
+
+
+def count_tokens(word):
+	# The model tokens of a word once cleaned by ClearText (non Hebrew letters are dropped): a token per letter, which
+	# holds as long as LetterEncoder.from_tokenizer accepts the model tokenizer (see token_counter)
+	return sum(1 for l in word if l in HE_LETTERS)
+
+
+def token_counter(tokenizer=None):
+	# count_tokens when the tokenizer maps a letter to a token (LetterEncoder checks its vocabulary and probe lines), otherwise
+	# the tokenizer counts the cleaned word
+	if tokenizer is None:
+		return count_tokens
+
+	from run.letter_encoder import LetterEncoder
+	if LetterEncoder.from_tokenizer(tokenizer) is not None:
+		return count_tokens
+
+	def count_tokenized(word):
+		cleaned = ''.join(l for l in word if l in HE_LETTERS)
+		return len(tokenizer.tokenize(cleaned)) if len(cleaned) > 0 else 0
+
+	return count_tokenized
+
+
+def token_window(word_tokens, max_tokens=MAX_TOKENS, min_overlap=MIN_OVERLAP):
+	# Yields (window start, target start, target end, window end) word indices. Every target is packed as close to
+	# max_tokens as possible, with at least min_overlap tokens (in whole words) of context on each side when available
+	words_count = len(word_tokens)
+	# tokens_before[i] is the sum of word_tokens[:i], the tokens left after a word are a difference
+	tokens_before = list(accumulate(word_tokens, initial = 0))
+	if tokens_before[-1] <= max_tokens:
+		yield 0, 0, words_count, words_count
+		return
+
+	def next_letters_word(word):
+		# The first word with letters from word on, the caller knows there's one
+		while word_tokens[word] == 0:
+			word = word + 1
+		return word
+
+	target_start = 0
+	while target_start < words_count:
+		window_start, leading_tokens = target_start, 0
+		while window_start > 0 and leading_tokens < min_overlap:
+			window_start = window_start - 1
+			leading_tokens = leading_tokens + word_tokens[window_start]
+
+		# The rest of the document fits, no trailing context is needed
+		rest_tokens = tokens_before[-1] - tokens_before[target_start]
+		if leading_tokens + rest_tokens <= max_tokens:
+			yield window_start, target_start, words_count, words_count
+			return
+
+		target_end, target_tokens = target_start, 0
+		while target_end < words_count and leading_tokens + target_tokens + word_tokens[target_end] + min_overlap <= max_tokens:
+			target_tokens = target_tokens + word_tokens[target_end]
+			target_end = target_end + 1
+		# A target holds at least a word with letters, even a single one longer than the budget
+		while target_tokens == 0:
+			target_tokens = target_tokens + word_tokens[target_end]
+			target_end = target_end + 1
+
+		# Words without letters left at the end of the document go with the last target
+		if tokens_before[-1] == tokens_before[target_end]:
+			yield window_start, target_start, words_count, words_count
+			return
+
+		# Otherwise the window keeps a trailing word with letters (whose space ends the target), the target gives up
+		# its last words when that word doesn't fit
+		while target_end - target_start > 1 and tokens_before[target_end - 1] > tokens_before[target_start] and \
+				leading_tokens + target_tokens + word_tokens[next_letters_word(target_end)] > max_tokens:
+			target_end = target_end - 1
+			target_tokens = target_tokens - word_tokens[target_end]
+
+		window_end, trailing_tokens = next_letters_word(target_end) + 1, word_tokens[next_letters_word(target_end)]
+		while window_end < words_count and trailing_tokens < min_overlap and \
+				leading_tokens + target_tokens + trailing_tokens + word_tokens[window_end] <= max_tokens:
+			trailing_tokens = trailing_tokens + word_tokens[window_end]
+			window_end = window_end + 1
+
+		yield window_start, target_start, target_end, window_end
+		target_start = target_end
+
+
+def iter_slice_by_tokens(pgpids, contents, max_tokens=MAX_TOKENS, min_overlap=MIN_OVERLAP, tokenizer=None):
+	# With the model tokenizer, the budget is checked against it (see token_counter)
+	word_counter = token_counter(tokenizer)
+
+	for article_content, article_pgpid in zip(contents, pgpids):
+
+		words = article_content.split()
+		if len(words) == 0:
+			continue
+		word_tokens = [word_counter(word) for word in words]
+		windows = list(token_window(word_tokens, max_tokens = max_tokens, min_overlap = min_overlap))
+
+		for window_start, target_start, target_end, window_end in windows:
+			# The windows are cut on word boundaries, so the target words (after ClearText) are known upfront
+			cleaned_leading = sum(1 for tokens in word_tokens[window_start: target_start] if tokens > 0)
+			cleaned_target = sum(1 for tokens in word_tokens[target_start: target_end] if tokens > 0)
+			leading_text = ' '.join(words[window_start: target_start])
+			target_text = ' '.join(words[target_start: target_end])
+			leading_boarder = len(leading_text) + 1 if len(leading_text) > 0 else 0
+
+			yield GenizaArticle(original_text = ' '.join(words[window_start: window_end]),
+								pgpid = article_pgpid,
+								ctxt_win_size = min_overlap if len(windows) > 1 else 0,
+								target_win_size = max_tokens,
+								original_leading_boarder = leading_boarder,
+								original_target_boarder = leading_boarder + len(target_text),
+								leading_end_word = cleaned_leading if cleaned_target > 0 else -1,
+								target_end_word = cleaned_leading + cleaned_target - 1 if cleaned_target > 0 else -1)
+
+
+def slice_by_tokens(pgpids, contents, max_tokens=MAX_TOKENS, min_overlap=MIN_OVERLAP, tokenizer=None):
+
+	return list(iter_slice_by_tokens(pgpids, contents, max_tokens = max_tokens, min_overlap = min_overlap, tokenizer = tokenizer))
 
-		chunked_articles = chunked_articles + [GenizaArticle(original_text = chunk[0],
-									pgpid = article_pgpid,
-									ctxt_win_size = which_ctxt_window,
-									target_win_size = which_target_window,
-									original_leading_boarder = chunk[1],
-									original_target_boarder = chunk[2]) for chunk in chunks]
-	return chunked_articles
 
+def window_tokens(articles):
+	# The tokens every window sends to the models
+	return [sum(count_tokens(word) for word in article._original_text.split()) for article in articles]
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+
+class BatchStats:
+    lines: int
+    batches: int
+    tokens: int
+    padded_tokens: int
+    seconds: float
+    cache_hits: int
+    cache_misses: int
+
+    def __init__(self):
+        self.lines = 0
+        self.batches = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __repr__(self):
+        return f"<BatchStats: {self.lines} lines, {self.batches} batches, {self.tokens} tokens, " \
+               f"{self.tokens_per_sec:.1f} tokens/sec, padding {self.padding_ratio:.1%}, " \
+               f"cache {self.cache_hits} hits / {self.cache_misses} misses>"
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.tokens / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def padding_ratio(self) -> float:
+        return 1 - self.tokens / self.padded_tokens if self.padded_tokens > 0 else 0.0
+
+    def add(self, other: BatchStats) -> None:
+        self.lines += other.lines
+        self.batches += other.batches
+        self.tokens += other.tokens
+        self.padded_tokens += other.padded_tokens
+        self.seconds += other.seconds
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+
+
+class BatchedInference:
+    # Sorts the lines by their token length, so each batch is padded only up to its own longest line
+    DEFAULT_BATCH_SIZE = 16
+
+    _pipe: Any
+    _batch_size: int
+    _max_batch_tokens: Optional[int]
+    _stats: BatchStats
+
+    def __init__(self, pipe: Any, batch_size: Optional[int] = None, max_batch_tokens: Optional[int] = None):
+        batch_size = self.DEFAULT_BATCH_SIZE if batch_size is None else batch_size
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if max_batch_tokens is not None and max_batch_tokens < 1:
+            raise ValueError(f"max_batch_tokens must be positive, got {max_batch_tokens}")
+
+        self._pipe = pipe
+        self._batch_size = batch_size
+        self._max_batch_tokens = max_batch_tokens
+        self._stats = BatchStats()
+
+    def _token_lengths(self, lines: List[str]) -> List[int]:
+        if hasattr(self._pipe, "token_lengths"):
+            return self._pipe.token_lengths(lines)
+        return [len(ids) for ids in self._pipe.tokenizer(lines, add_special_tokens=True)["input_ids"]]
+
+    def _make_batches(self, lengths: List[int]) -> List[List[int]]:
+        batches, batch = [], []
+        for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+            # Lines arrive in ascending order, so the current line sets the padded length of the batch
+            exceeds_budget = self._max_batch_tokens is not None and lengths[i] * (len(batch) + 1) > self._max_batch_tokens
+            if len(batch) > 0 and (len(batch) == self._batch_size or exceeds_budget):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+
+        if len(batch) > 0:
+            batches.append(batch)
+
+        return batches
+
+    def run(self, lines: List[str], infer: Optional[Callable[..., List]] = None) -> List[Any]:
+        # infer defaults to the pipe itself (per-token dicts), it gets the lines of a batch and batch_size
+        infer = self._pipe if infer is None else infer
+        results: List[Optional[Any]] = [None] * len(lines)
+        if len(lines) == 0:
+            return []
+
+        lengths = self._token_lengths(lines)
+        for batch in self._make_batches(lengths):
+            start_time = perf_counter()
+            batch_output = infer([lines[i] for i in batch], batch_size=len(batch))
+            self._stats.seconds += perf_counter() - start_time
+
+            for i, line_output in zip(batch, batch_output):
+                results[i] = line_output
+
+            self._stats.batches += 1
+            self._stats.lines += len(batch)
+            self._stats.tokens += sum(lengths[i] for i in batch)
+            self._stats.padded_tokens += max(lengths[i] for i in batch) * len(batch)
+
+        return results
+
+    def stats(self) -> BatchStats:
+        return self._stats
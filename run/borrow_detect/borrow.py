@@ -1,4 +1,5 @@
-import pandas as pd
+from __future__ import annotations
+
 from typing import Optional, Tuple, List, Dict, Set
 from enum import Enum
 from pre_train.aligner.transliterate import Ja2Ar
@@ -31,6 +32,8 @@ class Corpus:
         self._total_words = self._calc_total_words()
 
     def _load(self) -> None:
+        import pandas as pd
+
         self._corpus = pd.read_csv(
             filepath_or_buffer=CORPUS_PATH + f"{self._lang}_clear.csv",
             sep=",",
@@ -95,15 +98,23 @@ class CorpusHe(Corpus):
 
 
 class FreqCalculator:
-    _CORPUS_MAP = {
-        Lang.AR: CorpusAr(),
-        Lang.HE: CorpusHe(),
-        Lang.AM: CorpusAm()
+    # Every corpus is read once per process, when it's first needed
+    _CORPUS_CLASSES = {
+        Lang.AR: CorpusAr,
+        Lang.HE: CorpusHe,
+        Lang.AM: CorpusAm
     }
+    _CORPUS_MAP: Dict[Lang, Corpus] = {}
 
     def __init__(self):
         pass
 
+    @classmethod
+    def _get_corpus(cls, lang: Lang) -> Corpus:
+        if lang not in cls._CORPUS_MAP:
+            cls._CORPUS_MAP[lang] = cls._CORPUS_CLASSES[lang]()
+        return cls._CORPUS_MAP[lang]
+
     @staticmethod
     def _get_stem(word: str, lang: Lang, prefix_ar: str, prefix_ja: str) -> str:
         prefix = prefix_ar if lang == Lang.AR else prefix_ja
@@ -113,7 +124,7 @@ class FreqCalculator:
         return word[len(prefix):]
 
     def score(self, word: str, lang: Lang, prefix_ja: str, prefix_ar: Optional[str] = None) -> float:
-        corpus = self._CORPUS_MAP[lang]
+        corpus = self._get_corpus(lang)
         stem = self._get_stem(word, lang, prefix_ar, prefix_ja)
 
         freq_word, freq_stem = corpus.find_word_freq(word), corpus.find_word_freq(stem)
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from time import sleep
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import codecs
+import hashlib
+import json
+import os
+import random
+import uuid
+
+EXPORT_URL = "https://docs.google.com/document/d/{document_id}/export?format=txt"
+CHUNK_SIZE = 64 * 1024
+
+
+def decoded_lines(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    # The lines of str.splitlines, decoded chunk by chunk. The last line of a chunk is held back, it may go on (or
+    # end with the "\n" of a "\r\n") in the next one.
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).splitlines(keepends=True)
+        pending = lines.pop() if len(lines) > 0 else ""
+        for line in lines:
+            yield line.splitlines()[0]
+    yield from (pending + decoder.decode(b"", final=True)).splitlines()
+
+
+class FetchStats:
+    documents: int
+    not_modified: int
+    retries: int
+    bytes: int
+
+    def __init__(self):
+        self.documents = 0
+        self.not_modified = 0
+        self.retries = 0
+        self.bytes = 0
+
+    def __repr__(self):
+        return f"<FetchStats: {self.documents} documents, {self.not_modified} not modified, " \
+               f"{self.retries} retries, {self.bytes} bytes downloaded>"
+
+
+class DocsCache:
+    # The last exported text of every document with its validators (ETag, Last-Modified), for conditional requests
+    _directory: str
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return f"{self._directory}/{hashlib.sha256(url.encode('utf-8')).hexdigest()}"
+
+    def validators(self, url: str) -> Dict[str, str]:
+        # The conditional request headers, none when the document isn't cached
+        try:
+            with open(f"{self._path(url)}.json") as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if os.path.exists(f"{self._path(url)}.txt") is False:
+            return {}
+
+        headers = {}
+        if metadata.get("etag") is not None:
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified") is not None:
+            headers["If-Modified-Since"] = metadata["last_modified"]
+        return headers
+
+    def chunks(self, url: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        with open(f"{self._path(url)}.txt", "rb") as f:
+            yield from iter(lambda: f.read(chunk_size), b"")
+
+    def temp_path(self, url: str) -> str:
+        return f"{self._path(url)}.{uuid.uuid4().hex}.tmp"
+
+    def commit(self, url: str, temp_path: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        # The text is replaced before its validators: a reader seeing the new text with the former validators only
+        # downloads it again
+        os.replace(temp_path, f"{self._path(url)}.txt")
+        metadata_path = self.temp_path(url)
+        with open(metadata_path, "w") as f:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified}, f)
+        os.replace(metadata_path, f"{self._path(url)}.json")
+
+
+class DocsFetcher:
+    # Fetches the text exports of Google Docs through a pooled session, with a timeout and retries (exponential
+    # backoff and jitter) on connection errors and the retriable statuses. With a cache, the requests are
+    # conditional and an unchanged document (304) is read from the cache.
+    RETRIABLE_STATUSES = [408, 429, 500, 502, 503, 504]
+
+    _export_url: str
+    _cache: Optional[DocsCache]
+    _workers: int
+    _timeout: float
+    _max_retries: int
+    _backoff_seconds: float
+    _max_backoff_seconds: float
+    _chunk_size: int
+    _session: Any
+    _lock: Lock
+    stats: FetchStats
+
+    def __init__(self, export_url: str = EXPORT_URL, cache_dir: Optional[str] = None, workers: int = 8,
+                 timeout: float = 30.0, max_retries: int = 3, backoff_seconds: float = 1.0,
+                 max_backoff_seconds: float = 16.0, chunk_size: int = CHUNK_SIZE):
+        if workers < 1:
+            raise ValueError(f"workers must be positive, got {workers}")
+        if max_retries < 0:
+            raise ValueError(f"max_retries can't be negative, got {max_retries}")
+        if "{document_id}" not in export_url:
+            raise ValueError(f"export_url must have a {{document_id}} field, got {export_url}")
+
+        self._export_url = export_url
+        self._cache = DocsCache(cache_dir) if cache_dir is not None else None
+        self._workers = workers
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff_seconds = backoff_seconds
+        self._max_backoff_seconds = max_backoff_seconds
+        self._chunk_size = chunk_size
+        self._session = None
+        self._lock = Lock()
+        self.stats = FetchStats()
+
+    def _pooled_session(self) -> Any:
+        # One session shared by the workers, its connection pool keeps a connection per worker alive
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._workers)
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            return self._session
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + count)
+
+    def _request(self, url: str) -> Any:
+        # The response, streamed, once its status is 200 or 304. Only the requests are retried, not the reading
+        # of a body already being streamed.
+        import requests
+
+        session = self._pooled_session()
+        headers = self._cache.validators(url) if self._cache is not None else {}
+        for attempt in range(self._max_retries + 1):
+            try:
+                response = session.get(url, headers=headers, timeout=self._timeout, stream=True)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self._max_retries:
+                    raise
+            else:
+                if response.status_code == 200 or (response.status_code == 304 and len(headers) > 0):
+                    return response
+                # Reading the (error) body gives the connection back to the pool
+                response.content
+                if response.status_code not in self.RETRIABLE_STATUSES or attempt == self._max_retries:
+                    raise RuntimeError(f"The link {url} is broken, please check if the permissions are public. "
+                                       f"Status code: {response.status_code}")
+            self._count(retries=1)
+            backoff = min(self._max_backoff_seconds, self._backoff_seconds * 2 ** attempt)
+            sleep(backoff * random.uniform(0.5, 1.0))
+
+    def _downloaded_chunks(self, url: str, response: Any) -> Iterator[bytes]:
+        # The body, copied to the cache as it's read. The cache is updated only once the whole body is read.
+        if self._cache is None:
+            for chunk in response.iter_content(chunk_size=self._chunk_size):
+                self._count(bytes=len(chunk))
+                yield chunk
+            return
+
+        temp_path = self._cache.temp_path(url)
+        try:
+            with open(temp_path, "wb") as copy:
+                for chunk in response.iter_content(chunk_size=self._chunk_size):
+                    copy.write(chunk)
+                    self._count(bytes=len(chunk))
+                    yield chunk
+            self._cache.commit(url, temp_path, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def iter_lines(self, document_id: str) -> Iterator[str]:
+        # The decoded lines of the document, as they're downloaded
+        url = self._export_url.format(document_id=document_id)
+        response = self._request(url)
+        if response.status_code == 304:
+            response.content
+            self._count(documents=1, not_modified=1)
+            yield from decoded_lines(self._cache.chunks(url, self._chunk_size))
+            return
+
+        # A fully read response gives its connection back to the pool, closing it drops the connection
+        read = False
+        try:
+            self._count(documents=1)
+            yield from decoded_lines(self._downloaded_chunks(url, response))
+            read = True
+        finally:
+            if read is False:
+                response.close()
+
+    def fetch(self, document_id: str) -> List[str]:
+        return list(self.iter_lines(document_id))
+
+    def fetch_many(self, document_ids: Iterable[str]) -> Iterator[Tuple[str, List[str]]]:
+        # Yields (document id, lines) in the order of document_ids, fetched by workers threads. At most two
+        # documents per worker are fetched ahead of the consumer.
+        executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="docs-fetch")
+        pending: Deque[Tuple[str, Future]] = deque()
+        try:
+            for document_id in document_ids:
+                pending.append((document_id, executor.submit(self.fetch, document_id)))
+                if len(pending) >= 2 * self._workers:
+                    document_id, future = pending.popleft()
+                    yield document_id, future.result()
+            while len(pending) > 0:
+                document_id, future = pending.popleft()
+                yield document_id, future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from io import BytesIO
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from xml.sax.saxutils import escape
+import re
+import zipfile
+
+# (text, highlight color, bold)
+Run = Tuple[str, Optional[str], bool]
+# Runs of the Arabic cell, runs of the JA cell, text and url of the hyperlink
+Row = Tuple[List[Run], List[Run], str, str]
+
+
+class DocxTableStream:
+    # Writes the rows of a document table straight to WordprocessingML, as python-docx serializes them.
+    # The skeleton is the document saved by python-docx with everything but the rows: the rows are streamed
+    # after the header row of its table, the document XML is never built as a tree.
+    DOCUMENT_PART = "word/document.xml"
+    RELS_PART = "word/_rels/document.xml.rels"
+    HYPERLINK_RELTYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink"
+    END_TIME_MARKER = "@END_TIME@"
+    # WD_COLOR_INDEX names to their XML values
+    HIGHLIGHTS = {"RED": "red", "PINK": "magenta", "BRIGHT_GREEN": "green"}
+    ATTRIBUTE_ENTITIES = {'"': "&quot;"}
+
+    _skeleton: bytes
+    _cell_widths: List[str]
+
+    def __init__(self, skeleton: bytes):
+        self._skeleton = skeleton
+        with zipfile.ZipFile(BytesIO(skeleton)) as skeleton_zip:
+            names = skeleton_zip.namelist()
+            document_xml = skeleton_zip.read(self.DOCUMENT_PART).decode("utf-8")
+        if names.index(self.DOCUMENT_PART) > names.index(self.RELS_PART):
+            raise ValueError(f"{self.DOCUMENT_PART} must precede {self.RELS_PART} in the skeleton")
+        if document_xml.count("</w:tbl>") != 1 or self.END_TIME_MARKER not in document_xml:
+            raise ValueError("The skeleton must have a single table and the end time marker")
+        self._cell_widths = re.findall(r'<w:gridCol w:w="(\d+)"/>', document_xml)
+
+    @staticmethod
+    def _text(text: str) -> str:
+        # As python-docx sets a run text: tabs and line breaks are elements, spaces are kept
+        xml, pieces = [], re.split(r"([\t\n\r])", text)
+        for piece in pieces:
+            if piece == "\t":
+                xml.append("<w:tab/>")
+            elif piece in ["\n", "\r"]:
+                xml.append("<w:br/>")
+            elif len(piece) > 0:
+                space = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ""
+                xml.append(f"<w:t{space}>{escape(piece)}</w:t>")
+        return "".join(xml)
+
+    def _run(self, text: str, highlight: Optional[str], bold: bool) -> str:
+        properties = ("<w:b/>" if bold else "") + \
+                     (f'<w:highlight w:val="{self.HIGHLIGHTS[highlight]}"/>' if highlight is not None else "")
+        return "<w:r>" + (f"<w:rPr>{properties}</w:rPr>" if len(properties) > 0 else "") + self._text(text) + "</w:r>"
+
+    def _cell(self, width: str, content: str) -> str:
+        return f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>' \
+               f'<w:p><w:pPr><w:jc w:val="right"/></w:pPr>{content}</w:p></w:tc>'
+
+    def _row(self, row: Row, r_id: str) -> str:
+        arabic_runs, ja_runs, link_text, _ = row
+        return "<w:tr>" + \
+            self._cell(self._cell_widths[0], "".join(self._run(*run) for run in arabic_runs)) + \
+            self._cell(self._cell_widths[1], "".join(self._run(*run) for run in ja_runs)) + \
+            self._cell(self._cell_widths[2], f'<w:hyperlink r:id="{r_id}">{self._run(link_text, None, False)}</w:hyperlink>') + \
+            "</w:tr>"
+
+    def write(self, file_path: str, rows: Iterable[Row], end_time: Callable[[], str]) -> int:
+        # Returns the number of rows written. Hyperlinks to the same url share their relationship, as in python-docx.
+        link_ids: Dict[str, str] = {}
+        n_rows = 0
+        with zipfile.ZipFile(BytesIO(self._skeleton)) as skeleton, \
+                zipfile.ZipFile(file_path, "w", compression=zipfile.ZIP_DEFLATED) as docx:
+            rels_xml = skeleton.read(self.RELS_PART).decode("utf-8")
+            used_ids = {int(r_id) for r_id in re.findall(r'Id="rId(\d+)"', rels_xml)}
+            # The free ids in increasing order, as python-docx numbers the relationships. The skeleton ids are
+            # contiguous from 1, the counter only skips over the used ones.
+            next_id = 1
+
+            for info in skeleton.infolist():
+                if info.filename == self.DOCUMENT_PART:
+                    document_xml = skeleton.read(info).decode("utf-8")
+                    table_end = document_xml.index("</w:tbl>")
+                    with docx.open(info.filename, "w") as part:
+                        part.write(document_xml[:table_end].encode("utf-8"))
+                        for row in rows:
+                            url = row[3]
+                            if url not in link_ids:
+                                while next_id in used_ids:
+                                    next_id += 1
+                                link_ids[url] = f"rId{next_id}"
+                                next_id += 1
+                            part.write(self._row(row, link_ids[url]).encode("utf-8"))
+                            n_rows += 1
+                        part.write(document_xml[table_end:].replace(self.END_TIME_MARKER, escape(end_time())).encode("utf-8"))
+                elif info.filename == self.RELS_PART:
+                    # Written after the document XML (checked in __init__), the links are all known here
+                    links = "".join(f'<Relationship Id="{r_id}" Type="{self.HYPERLINK_RELTYPE}" Target="{escape(url, self.ATTRIBUTE_ENTITIES)}" '
+                                    f'TargetMode="External"/>' for url, r_id in link_ids.items())
+                    docx.writestr(info.filename, rels_xml.replace("</Relationships>", links + "</Relationships>"),
+                                  compress_type=zipfile.ZIP_DEFLATED)
+                else:
+                    docx.writestr(info.filename, skeleton.read(info), compress_type=zipfile.ZIP_DEFLATED)
+
+        return n_rows
+
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, local
+from time import sleep
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import os
+import random
+import uuid
+
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+GOOGLE_DOC_MIMETYPE = "application/vnd.google-apps.document"
+# Google requires multiples of 256 KB for the chunks of a resumable upload
+CHUNK_SIZE = 20 * 256 * 1024
+
+
+class GoogleDriveClient:
+    # Uploads the docx to Drive, converts it to a Google Doc and shares it with anyone having the link
+    SCOPES = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/documents']
+    RETRIABLE_STATUSES = [408, 429, 500, 502, 503, 504]
+    # Marks the converted copy with the id of its upload, so a copy applied by Drive (whose response was lost) is found
+    UPLOAD_PROPERTY = "transliteration_upload_id"
+
+    _credentials_json: Optional[str]
+    _http: Any
+    _service: Any
+
+    def __init__(self, credentials_json: Optional[str], http: Any = None):
+        # With an httplib2-like http (e.g. googleapiclient.http.HttpMockSequence), no credentials are used
+        self._credentials_json = credentials_json
+        self._http = http
+        self._service = None
+
+    def _drive(self) -> Any:
+        # The Google API clients are imported only when a document is uploaded
+        if self._service is None:
+            from googleapiclient.discovery import build
+
+            if self._http is not None:
+                self._service = build('drive', 'v3', http=self._http, static_discovery=True)
+            else:
+                from google.oauth2 import service_account
+
+                credentials = service_account.Credentials.from_service_account_file(self._credentials_json, scopes=self.SCOPES)
+                self._service = build('drive', 'v3', credentials=credentials)
+        return self._service
+
+    def start_upload(self, file_path: str, name: str, mimetype: str, chunk_size: int) -> Any:
+        from googleapiclient.http import MediaFileUpload
+
+        media = MediaFileUpload(file_path, mimetype=mimetype, chunksize=chunk_size, resumable=True)
+        return self._drive().files().create(body={'name': name}, media_body=media, fields='id')
+
+    def next_chunk(self, upload: Any) -> Tuple[float, Optional[str]]:
+        # (uploaded ratio, the file id once the upload is complete). After a failure, the next call resumes the
+        # upload from the last byte the server acknowledged.
+        status, response = upload.next_chunk()
+        if response is not None:
+            return 1.0, response['id']
+        return status.progress() if status is not None else 0.0, None
+
+    def convert(self, file_id: str, name: str, upload_id: str) -> str:
+        copy = self._drive().files().copy(
+            fileId=file_id,
+            body={'parents': [], 'mimeType': GOOGLE_DOC_MIMETYPE, 'name': name,
+                  'appProperties': {self.UPLOAD_PROPERTY: upload_id}}
+        ).execute()
+        return copy['id']
+
+    def find_converted(self, upload_id: str) -> Optional[str]:
+        files = self._drive().files().list(
+            q=f"appProperties has {{ key='{self.UPLOAD_PROPERTY}' and value='{upload_id}' }} and trashed = false",
+            fields='files(id)'
+        ).execute()['files']
+        return files[0]['id'] if len(files) > 0 else None
+
+    def share(self, document_id: str) -> None:
+        self._drive().permissions().create(
+            fileId=document_id,
+            body={'role': 'writer', 'type': 'anyone', 'allowFileDiscovery': False},
+            fields='id'
+        ).execute()
+
+    def is_shared(self, document_id: str) -> bool:
+        permissions = self._drive().permissions().list(fileId=document_id, fields='permissions(type,role)').execute()
+        return any(permission['type'] == 'anyone' for permission in permissions['permissions'])
+
+    @staticmethod
+    def document_url(document_id: str) -> str:
+        return f'https://docs.google.com/document/d/{document_id}/edit'
+
+    def is_retriable(self, error: Exception) -> bool:
+        from googleapiclient.errors import HttpError
+
+        if isinstance(error, HttpError):
+            return error.resp.status in self.RETRIABLE_STATUSES
+        return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class LocalDriveClient:
+    # Drive stand-in keeping the uploads in a local directory, for running the export without Google credentials.
+    # Every fail_every-th request raises a ConnectionError to exercise the retries: before doing anything, or with
+    # lost_responses after the request was applied (as a timeout after Drive processed it).
+    _root: str
+    _fail_every: Optional[int]
+    _lost_responses: bool
+    _requests: int
+    _lock: Lock
+    permissions: Dict[str, List[Dict[str, Any]]]
+
+    def __init__(self, root: str, fail_every: Optional[int] = None, lost_responses: bool = False):
+        if fail_every is not None and fail_every < 2:
+            raise ValueError(f"fail_every must be at least 2, got {fail_every}")
+
+        self._root = root
+        self._fail_every = fail_every
+        self._lost_responses = lost_responses
+        self._requests = 0
+        self._lock = Lock()
+        self.permissions = {}
+        os.makedirs(f"{root}/uploads", exist_ok=True)
+
+    def _request(self) -> bool:
+        # Whether the response of the request is lost, once it's applied
+        with self._lock:
+            self._requests += 1
+            failing = self._fail_every is not None and self._requests % self._fail_every == 0
+        if failing and self._lost_responses is False:
+            raise ConnectionError(f"Simulated failure of request {self._requests}")
+        return failing
+
+    @staticmethod
+    def _response(lost: bool, result: Any) -> Any:
+        if lost:
+            raise ConnectionError("Simulated lost response")
+        return result
+
+    def _path(self, file_id: str) -> str:
+        return f"{self._root}/{file_id}"
+
+    def start_upload(self, file_path: str, name: str, mimetype: str, chunk_size: int) -> Dict[str, Any]:
+        lost = self._request()
+        upload = {"id": uuid.uuid4().hex, "file_path": file_path, "size": os.path.getsize(file_path), "chunk_size": chunk_size}
+        open(f"{self._root}/uploads/{upload['id']}", "wb").close()
+        with open(f"{self._root}/uploads/{upload['id']}.json", "w") as f:
+            json.dump({"name": name, "mimeType": mimetype}, f)
+        return self._response(lost, upload)
+
+    def next_chunk(self, upload: Dict[str, Any]) -> Tuple[float, Optional[str]]:
+        lost = self._request()
+        part_path = f"{self._root}/uploads/{upload['id']}"
+        if os.path.exists(part_path) is False:
+            # Completed by a request whose response was lost, as the status query of a resumable upload tells
+            return self._response(lost, (1.0, upload["id"]))
+        offset = os.path.getsize(part_path)
+        with open(upload["file_path"], "rb") as source, open(part_path, "ab") as part:
+            source.seek(offset)
+            part.write(source.read(upload["chunk_size"]))
+            offset = part.tell()
+
+        if offset < upload["size"]:
+            return self._response(lost, (offset / upload["size"], None))
+        os.replace(part_path, self._path(upload["id"]))
+        os.replace(f"{part_path}.json", f"{self._path(upload['id'])}.json")
+        return self._response(lost, (1.0, upload["id"]))
+
+    def convert(self, file_id: str, name: str, upload_id: str) -> str:
+        lost = self._request()
+        document_id = uuid.uuid4().hex
+        with open(self._path(file_id), "rb") as source, open(self._path(document_id), "wb") as document:
+            document.write(source.read())
+        with open(f"{self._path(document_id)}.json", "w") as f:
+            json.dump({"name": name, "mimeType": GOOGLE_DOC_MIMETYPE, "appProperties": {"upload_id": upload_id}}, f)
+        return self._response(lost, document_id)
+
+    def find_converted(self, upload_id: str) -> Optional[str]:
+        lost = self._request()
+        found = None
+        for file_name in os.listdir(self._root):
+            if file_name.endswith(".json"):
+                with open(f"{self._root}/{file_name}") as f:
+                    if json.load(f).get("appProperties", {}).get("upload_id") == upload_id:
+                        found = file_name[:-len(".json")]
+        return self._response(lost, found)
+
+    def documents(self) -> List[str]:
+        # The converted documents
+        converted = []
+        for file_name in os.listdir(self._root):
+            if file_name.endswith(".json"):
+                with open(f"{self._root}/{file_name}") as f:
+                    if json.load(f)["mimeType"] == GOOGLE_DOC_MIMETYPE:
+                        converted.append(file_name[:-len(".json")])
+        return converted
+
+    def share(self, document_id: str) -> None:
+        lost = self._request()
+        self.permissions.setdefault(document_id, []).append({'role': 'writer', 'type': 'anyone', 'allowFileDiscovery': False})
+        self._response(lost, None)
+
+    def is_shared(self, document_id: str) -> bool:
+        lost = self._request()
+        return self._response(lost, any(permission['type'] == 'anyone' for permission in self.permissions.get(document_id, [])))
+
+    def document_url(self, document_id: str) -> str:
+        return f"file://{os.path.abspath(self._path(document_id))}"
+
+    @staticmethod
+    def is_retriable(error: Exception) -> bool:
+        return isinstance(error, ConnectionError)
+
+
+class DriveUploader:
+    # Uploads in background threads, submit returns a future of the document URL. Every request to Drive is
+    # retried with exponential backoff (and jitter) on the errors the client deems retriable.
+    _client_factory: Callable[[], Any]
+    _workers: int
+    _max_retries: int
+    _backoff_seconds: float
+    _max_backoff_seconds: float
+    _chunk_size: int
+    _executor: Optional[ThreadPoolExecutor]
+    _lock: Lock
+    _clients: local
+
+    def __init__(self, client_factory: Callable[[], Any], workers: int = 1, max_retries: int = 5,
+                 backoff_seconds: float = 1.0, max_backoff_seconds: float = 32.0, chunk_size: int = CHUNK_SIZE):
+        if workers < 1:
+            raise ValueError(f"workers must be positive, got {workers}")
+        if max_retries < 0:
+            raise ValueError(f"max_retries can't be negative, got {max_retries}")
+
+        self._client_factory = client_factory
+        self._workers = workers
+        self._max_retries = max_retries
+        self._backoff_seconds = backoff_seconds
+        self._max_backoff_seconds = max_backoff_seconds
+        self._chunk_size = chunk_size
+        self._executor = None
+        self._lock = Lock()
+        self._clients = local()
+
+    def _client(self) -> Any:
+        # The clients (and their HTTP connections) aren't shared between threads
+        if getattr(self._clients, "client", None) is None:
+            self._clients.client = self._client_factory()
+        return self._clients.client
+
+    def _retrying(self, client: Any, request: Callable, *args, recover: Optional[Callable[[], Any]] = None) -> Any:
+        # A request that isn't idempotent may have been applied by Drive before failing (e.g. a timeout): recover
+        # looks its result up before it's retried, and returns None when it wasn't applied
+        for attempt in range(self._max_retries + 1):
+            try:
+                return request(*args)
+            except Exception as error:
+                if attempt == self._max_retries or client.is_retriable(error) is False:
+                    raise
+                backoff = min(self._max_backoff_seconds, self._backoff_seconds * 2 ** attempt)
+                sleep(backoff * random.uniform(0.5, 1.0))
+                if recover is not None:
+                    recovered = recover()
+                    if recovered is not None:
+                        return recovered
+
+    def upload(self, file_path: str, name: str) -> str:
+        client = self._client()
+        # start_upload only prepares the request, the resumable chunks are safe to retry
+        upload = self._retrying(client, client.start_upload, file_path, 'My Document', DOCX_MIMETYPE, self._chunk_size)
+        file_id = None
+        while file_id is None:
+            _, file_id = self._retrying(client, client.next_chunk, upload)
+
+        # A retried copy or permission would create a second document or permission
+        upload_id = uuid.uuid4().hex
+        document_id = self._retrying(client, client.convert, file_id, name, upload_id,
+                                     recover=lambda: self._retrying(client, client.find_converted, upload_id))
+        self._retrying(client, client.share, document_id,
+                       recover=lambda: True if self._retrying(client, client.is_shared, document_id) else None)
+        return client.document_url(document_id)
+
+    def submit(self, file_path: str, name: str, callback: Optional[Callable[[Future], None]] = None) -> Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="drive-upload")
+            future = self._executor.submit(self.upload, file_path, name)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
@@ -1,27 +1,32 @@
 from __future__ import annotations
 
-from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
-from typing import List, Optional, Any, Tuple, Dict
+from typing import List, Optional, Any, Tuple, Dict, Iterable, Iterator, Callable
+from itertools import islice, groupby
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+import hashlib
+import json
+import multiprocessing
+import os
 from enum import Enum
-from copy import deepcopy
-from docx import Document
-from docx.shared import Pt, Cm
 from datetime import datetime
-from docx.enum.style import WD_STYLE_TYPE
-from docx.enum.table import WD_TABLE_ALIGNMENT
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.text import WD_COLOR_INDEX
-from docx.oxml.shared import OxmlElement, qn
-from docx.opc import constants
-from docx.text.run import Run
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from googleapiclient.http import MediaFileUpload
-import requests
+from time import perf_counter
+from io import BytesIO
 import re
 
 from run.borrow_detect.borrow import FreqComparator
+from run.model_registry import MODEL_REGISTRY
+from run.batch_infer import BatchedInference, BatchStats
+from run.token_classifier import DirectTokenClassifier
+from run.inference_cache import InferenceCache
+from run.docx_stream import DocxTableStream
+from run.drive_upload import DriveUploader, GoogleDriveClient
+from run.docs_import import DocsFetcher
+from run.records_export import record_writer
 from pg_prep.pgp_record import GenizaArticle
+from pg_prep.sliding_window import HE_LETTERS, iter_slice
 
 AR_LABEL = "B-JA"
 text = [
@@ -46,6 +51,9 @@ class Word:
         "B-NJA": Lang.NAR
     }
 
+    # No per-word __dict__, the pipeline holds one Word per word of every window
+    __slots__ = ("_original_word", "_processed_word", "_lang")
+
     def __init__(self, original_word: str, result_word: str, lang: Lang):
         self._original_word: str = original_word
         self._processed_word: str = result_word
@@ -91,7 +99,7 @@ class Task:
     _end_time: Optional[datetime]
 
     def __init__(self):
-        self.HE_LETTERS = "אבגדהוזחטיכלמנסעפצקרשתךםןףץ"
+        self.HE_LETTERS = HE_LETTERS
         self.MAX_LEN = 510
         self._start_time = datetime.now()
         self._end_time = None
@@ -124,21 +132,93 @@ class PrePipeline(Task):
 
 class InPipeline(Task):
     TASK_NAME = "token-classification"
+    BATCH_SIZE = BatchedInference.DEFAULT_BATCH_SIZE
+    MAX_BATCH_TOKENS: Optional[int] = None
+    BACKEND = "torch"
+    # "logits" decodes the words straight from the argmax of the logits, "dicts" merges the per-token dicts
+    # of the HF pipeline (the reference, and the only option of the torch-pipeline backend)
+    DECODINGS = ["logits", "dicts"]
+    DECODING = "logits"
+
     _in: List[List[Word]]
     _out: List[List[Word]]
     _model_name: str
-
-    def __init__(self, inp: List[List[Word]], model_name: Optional[str] = None):
+    _model_revision: Optional[str]
+    _batch_size: int
+    _max_batch_tokens: Optional[int]
+    _backend: str
+    _decoding: str
+    _cache: Optional[InferenceCache]
+    _batch_stats: BatchStats
+
+    def __init__(self, inp: List[List[Word]], model_name: Optional[str] = None, model_revision: Optional[str] = None,
+                 batch_size: Optional[int] = None, max_batch_tokens: Optional[int] = None, backend: Optional[str] = None,
+                 decoding: Optional[str] = None, cache: Optional[InferenceCache] = None):
         super().__init__()
         self._in = inp
         self._model_name = model_name
+        self._model_revision = model_revision
+        self._batch_size = self.BATCH_SIZE if batch_size is None else batch_size
+        self._max_batch_tokens = self.MAX_BATCH_TOKENS if max_batch_tokens is None else max_batch_tokens
+        self._backend = self.BACKEND if backend is None else backend
+        self._decoding = self.DECODING if decoding is None else decoding
+        if self._decoding not in self.DECODINGS:
+            raise ValueError(f"Unknown decoding {self._decoding}, expected one of {self.DECODINGS}")
+        self._cache = cache
+        self._batch_stats = BatchStats()
+
+    def _pipe(self) -> Any:
+        # Models are loaded once per process and shared by every task and PipelineManager
+        return MODEL_REGISTRY.get(self._model_name, self._model_revision, self._backend).pipe
+
+    def _decodes_logits(self) -> bool:
+        return self._decoding == "logits" and isinstance(self._pipe(), DirectTokenClassifier)
+
+    def _run_nn(self, input_nn: List[str], infer: Optional[Callable[..., List]] = None) -> List[Any]:
+        engine = BatchedInference(self._pipe(), batch_size=self._batch_size, max_batch_tokens=self._max_batch_tokens)
+        nn_output = engine.run(input_nn, infer)
+        self._batch_stats.add(engine.stats())
+
+        return nn_output
+
+    def _infer(self, input_nn: List[str]) -> List[List[Word]]:
+        raise NotImplementedError
+
+    @staticmethod
+    def _dump_words(line: List[Word]) -> List[List[str]]:
+        return [[word.original_word, word.processed_word, word.lang.name] for word in line]
+
+    @staticmethod
+    def _load_words(dumped_line: List[List[str]]) -> List[Word]:
+        return [Word(original_word=original, result_word=processed, lang=Word.Lang[lang]) for original, processed, lang in dumped_line]
+
+    def _infer_cached(self, input_nn: List[str]) -> List[List[Word]]:
+        # Only the lines missing from the cache (each distinct line once) are sent to the model
+        if self._cache is None:
+            return self._infer(input_nn)
+
+        # Keyed by the commit the model was resolved to, so new weights on the hub aren't served the old outputs
+        loaded = MODEL_REGISTRY.get(self._model_name, self._model_revision, self._backend)
+        revision = loaded.commit_hash or self._model_revision
+        keys = [InferenceCache.key(type(self).__name__, self._model_name, revision, self._backend, line) for line in input_nn]
+        cached = self._cache.get_many(keys)
+        missing = {key: line for key, line in zip(keys, input_nn) if key not in cached}
 
-    def _run_nn(self, input_nn: List[str]) -> List[Dict]:
-        model = AutoModelForTokenClassification.from_pretrained(self._model_name)
-        tokenizer = AutoTokenizer.from_pretrained(self._model_name)
-        pipe = pipeline(task=self.TASK_NAME, model=model, tokenizer=tokenizer)
+        inferred: Dict[str, List[Word]] = {}
+        if len(missing) > 0:
+            inferred = dict(zip(missing.keys(), self._infer(list(missing.values()))))
+            dumped = {key: self._dump_words(line) for key, line in inferred.items()}
+            self._cache.put_many(dumped)
+            cached.update(dumped)
 
-        return pipe(input_nn)
+        self._batch_stats.cache_hits += len(input_nn) - len(missing)
+        self._batch_stats.cache_misses += len(missing)
+
+        # Every line gets its own Word objects, later tasks modify them in place
+        return [inferred.pop(key) if key in inferred else self._load_words(cached[key]) for key in keys]
+
+    def get_batch_stats(self) -> BatchStats:
+        return self._batch_stats
 
     def output(self):
         return self._out
@@ -158,6 +238,10 @@ class PostPipeline(Task):
 class Import(PrePipeline):
     _out: List[str]
 
+    # Shared by the imports: e.g. DocsFetcher(cache_dir=..., workers=16) for conditional requests backed by a cache
+    DOCS_FETCHER = DocsFetcher()
+    DOCUMENT_URL = re.compile(r"https:\/\/docs\.google\.com\/document\/d\/.+\/edit\?usp=sharing")
+
     def __init__(self):
         super().__init__()
 
@@ -178,20 +262,45 @@ class Import(PrePipeline):
         self._out = text
 
 
-    def by_docx_path(self, document_url: str) -> None:
+    @classmethod
+    def _document_id(cls, document_url: str) -> str:
         if isinstance(document_url, str) is False:
             raise TypeError("Expected to received str")
-        res = re.compile(r"https:\/\/docs\.google\.com\/document\/d\/.+\/edit\?usp=sharing").match(document_url)
-        if res is None:
+        if cls.DOCUMENT_URL.match(document_url) is None:
             raise ValueError("Expected to received URL of Google Doc")
 
-        document_id = document_url.split('/')[-2]
-        document_txt_url = f'https://docs.google.com/document/d/{document_id}/export?format=txt'
-        response = requests.get(document_txt_url)
-        if response.status_code != 200:
-            raise RuntimeError(f"The link {document_txt_url} is broken, please check if the permissions are public. Status code: {response.status_code}")
+        return document_url.split('/')[-2]
+
+    @classmethod
+    def document_pgpid(cls, document_url: str) -> int:
+        # A stable id per Google Doc, from its document id. Negative like the ad-hoc texts' -1, so it's never a PGP id
+        digest = hashlib.sha256(cls._document_id(document_url).encode("utf-8")).digest()
+        return -2 - int.from_bytes(digest[:7], "big")
 
-        self._out = self._split_text(response.content.decode("utf-8"))
+    def by_docx_path(self, document_url: str) -> None:
+        self._out = self.DOCS_FETCHER.fetch(self._document_id(document_url))
+
+    @classmethod
+    def iter_docx_paths(cls, document_urls: Iterable[str]) -> Iterator[Tuple[str, List[str]]]:
+        # (document url, lines) in the order of document_urls, the documents are fetched concurrently
+        urls = deque()
+
+        def document_ids() -> Iterator[str]:
+            for document_url in document_urls:
+                document_id = cls._document_id(document_url)
+                urls.append(document_url)
+                yield document_id
+
+        for _, lines in cls.DOCS_FETCHER.fetch_many(document_ids()):
+            yield urls.popleft(), lines
+
+    @classmethod
+    def articles_by_docx_paths(cls, document_urls: Iterable[str], target_window: int = 300,
+                               ctxt_window: int = 100) -> Iterator[GenizaArticle]:
+        # The windows of the documents as they're fetched, e.g. for PipelineManager.stream. A document's pgpid is
+        # its document_pgpid, whatever the order of document_urls.
+        for document_url, lines in cls.iter_docx_paths(document_urls):
+            yield from iter_slice([cls.document_pgpid(document_url)], ["\n".join(lines)], target_window, ctxt_window)
 
     def output(self):
         return self._out
@@ -232,9 +341,10 @@ class WrapText(PrePipeline):
 
 class CodeSwitch(InPipeline):
     MODEL_NAME = "dwmit/ja_classification"
+    MODEL_REVISION = None
 
-    def __init__(self, inp: List[List[Word]]):
-        super().__init__(inp, model_name=self.MODEL_NAME)
+    def __init__(self, inp: List[List[Word]], **kwargs):
+        super().__init__(inp, model_name=self.MODEL_NAME, model_revision=self.MODEL_REVISION, **kwargs)
         self._out = self._process()
 
     def _merge_tokens(self, tokens: Dict) -> List[Word]:
@@ -261,16 +371,29 @@ class CodeSwitch(InPipeline):
 
         return words
 
+    @staticmethod
+    def _labeled_words(words: List[str], labels: List[str]) -> List[Word]:
+        langs = [Word.convert_label(label) for label in labels]
+        return [Word(original_word=word, result_word=word if lang == Word.Lang.NAR else "", lang=lang)
+                for word, lang in zip(words, langs)]
+
+    def _infer(self, input_nn: List[str]) -> List[List[Word]]:
+        if self._decodes_logits():
+            nn_output = self._run_nn(input_nn, self._pipe().word_labels)
+            return [self._labeled_words(words, labels) for words, labels in nn_output]
+
+        nn_output = self._run_nn(input_nn)
+        return [self._merge_tokens(line_output) for line_output in nn_output]
+
     def _process(self) -> List[List[Word]]:
         processed_lines = []
 
         nn_input = [' '.join(word.original_word for word in line) for line in self._in]
-        nn_output = self._run_nn(nn_input)
+        lines_result = self._infer_cached(nn_input)
 
-        assert len(nn_output) == len(self._in)
-        for i_line in range(len(nn_output)):
-            line_output = nn_output[i_line]
-            line_result = self._merge_tokens(line_output)
+        assert len(lines_result) == len(self._in)
+        for i_line in range(len(lines_result)):
+            line_result = lines_result[i_line]
             assert len(line_result) == len(self._in[i_line])
             assert all(
                 line_result[i_word].original_word == self._in[i_line][i_word].original_word
@@ -293,8 +416,8 @@ class BorrowDetector(InPipeline):
 
     _freq_comparator: FreqComparator
 
-    def __init__(self, inp: List[List[Word]]):
-        super().__init__(inp)
+    def __init__(self, inp: List[List[Word]], **kwargs):
+        super().__init__(inp, **kwargs)
         self._freq_comparator = FreqComparator()
         self._out = self._process()
 
@@ -315,9 +438,10 @@ class BorrowDetector(InPipeline):
 
 class Transliterate(InPipeline):
     MODEL_NAME = "dwmit/transliterate"
+    MODEL_REVISION = None
 
-    def __init__(self, inp: List[List[Word]]):
-        super().__init__(inp, model_name=self.MODEL_NAME)
+    def __init__(self, inp: List[List[Word]], **kwargs):
+        super().__init__(inp, model_name=self.MODEL_NAME, model_revision=self.MODEL_REVISION, **kwargs)
         self._out = self._process()
 
     def _merge_tokens(self, tokens: Dict) -> List[Word]:
@@ -344,29 +468,30 @@ class Transliterate(InPipeline):
 
     @staticmethod
     def _merge_ar_he(original_line: List[Word], ar_line: List[Word]):
-        merged_line = []
+        # The words are moved, not copied: every line owns its words and the input lines aren't used after this task
+        ar_words = iter(ar_line)
+        return [next(ar_words) if original_word.lang == Word.Lang.AR else original_word for original_word in original_line]
 
-        i_ar = 0
-        for original_word in original_line:
-            if original_word.lang == Word.Lang.AR:
-                merged_line.append(deepcopy(ar_line[i_ar]))
-                i_ar += 1
-            else:
-                merged_line.append(deepcopy(original_word))
+    def _infer(self, input_nn: List[str]) -> List[List[Word]]:
+        if self._decodes_logits():
+            nn_output = self._run_nn(input_nn, self._pipe().word_label_strings)
+            return [[Word(original_word=word_he, result_word=word_ar, lang=Word.Lang.AR)
+                     for word_he, word_ar in zip(words_he, words_ar)]
+                    for words_he, words_ar in nn_output]
 
-        return merged_line
+        nn_output = self._run_nn(input_nn)
+        return [self._merge_tokens(line_output) for line_output in nn_output]
 
     def _process(self) -> List[List[Word]]:
         processed_lines = []
 
         nn_input = [' '.join(word.original_word for word in line if word.lang == Word.Lang.AR) for line in self._in]
-        nn_output = self._run_nn(nn_input)
+        lines_result = self._infer_cached(nn_input)
 
-        assert len(nn_output) == len(self._in)
-        for i_line in range(len(nn_output)):
+        assert len(lines_result) == len(self._in)
+        for i_line in range(len(lines_result)):
             line_input = self._in[i_line]
-            line_output = nn_output[i_line]
-            line_result = self._merge_tokens(line_output)
+            line_result = lines_result[i_line]
             line_merged = self._merge_ar_he(line_input, line_result)
             assert len(line_merged) == len(line_input)
             processed_lines.append(line_merged)
@@ -383,14 +508,29 @@ class Export(PostPipeline):
     CREDENTIALS_JSON = "../global_def/docx-read-7b56daaf11c4.json"
     LEGAL_OUTPUT_FORMATS = [
         "by_docx_path",
-        "by_list_str"
+        "by_list_str",
+        "by_records",
+        "by_docx_shards"
     ]
+    DOCX_WRITERS = ["python-docx", "stream"]
+    DOCX_WRITER = "stream"
+    MIN_EXPORTED_TEXT = 5
+    # by_docx_shards: the documents are kept whole, a shard covers pgpid // SHARD_PGPID_RANGE (if set) and at most
+    # SHARD_MAX_ROWS rows (if set) unless a single document is longer
+    SHARD_MAX_ROWS: Optional[int] = 1000
+    SHARD_PGPID_RANGE: Optional[int] = None
+    SHARD_WORKERS = os.cpu_count() or 1
+    PGP_DOCUMENT_URL = "https://geniza.princeton.edu/en/documents/{pgpid}/"
+    # Replaceable, e.g. by DriveUploader(lambda: LocalDriveClient(path)) to export without Google credentials
+    DRIVE_UPLOADER = DriveUploader(lambda: GoogleDriveClient(Export.CREDENTIALS_JSON))
 
     _out: str
     _global_start_time: datetime
+    _upload: Optional[Future]
 
     def __init__(self, inp: List[List[Word]], *args, **kwargs):
         super().__init__(inp)
+        self._upload = None
         if "global_start_time" not in kwargs:
             raise KeyError("global_start_time hasn't been passed to Export task")
         if "output_format" not in kwargs:
@@ -403,6 +543,10 @@ class Export(PostPipeline):
             self._out = self._create_docx()
         elif self._output_format == "by_list_str":
             self._out = self._create_list()
+        elif self._output_format == "by_records":
+            self._out = self._create_records()
+        elif self._output_format == "by_docx_shards":
+            self._out = self._create_docx_shards()
         else:
             raise KeyError(f"output_format {self._output_format} not legal, options: {self.LEGAL_OUTPUT_FORMATS}")
 
@@ -415,7 +559,30 @@ class Export(PostPipeline):
             for geniza_article in self._in
         ]
 
+    def _create_records(self) -> List[Dict[str, Any]]:
+        # One record per window, aligned word by word, with the span of its target in both texts
+        records = []
+        for _, windows in groupby(self._in, key=lambda geniza_article: geniza_article._pgpid):
+            for i_window, geniza_article in enumerate(windows):
+                original_target_start, original_target_end = geniza_article.target_span(False)
+                processed_target_start, processed_target_end = geniza_article.target_span(True)
+                records.append({
+                    "pgpid": int(geniza_article._pgpid),
+                    "window": i_window,
+                    "original_words": [word.original_word for word in geniza_article._processed_words],
+                    "processed_words": [word.processed_word for word in geniza_article._processed_words],
+                    "langs": [word.lang.name for word in geniza_article._processed_words],
+                    "original_target_start": original_target_start,
+                    "original_target_end": original_target_end,
+                    "processed_target_start": processed_target_start,
+                    "processed_target_end": processed_target_end
+                })
+        return records
+
     def _add_hyperlink(self, paragraph, text, url):
+        from docx.oxml.shared import OxmlElement, qn
+        from docx.opc import constants
+        from docx.text.run import Run
 
         # This gets access to the document.xml.rels file and gets a new relation id value
         part = paragraph.part
@@ -434,7 +601,33 @@ class Export(PostPipeline):
         paragraph._p.append(hyperlink)
         return hyperlink
 
-    def _create_docx(self):
+    def _exported_articles(self) -> Iterator[GenizaArticle]:
+        return (geniza_article for geniza_article in self._in if len(geniza_article._processed_text) >= self.MIN_EXPORTED_TEXT)
+
+    @staticmethod
+    def _cell_runs(geniza_article: GenizaArticle, which_text: str) -> List[Tuple[str, Optional[str], bool]]:
+        # (text, highlight color, bold) of the runs of the Arabic ("processed") or the JA ("original") cell of a window
+        leading_ctxt = getattr(geniza_article, f"_{which_text}_leading_ctxt")
+        trailing_ctxt = getattr(geniza_article, f"_{which_text}_trailing_ctxt")
+        in_ctxt = len(leading_ctxt) > 0 or len(trailing_ctxt) > 0
+        runs = [
+            (leading_ctxt, None, False),
+            (getattr(geniza_article, f"_{which_text}_errb"), "RED", False),
+            # The eliminated piece is only shown on the Arabic side
+            (getattr(geniza_article, f"_{which_text}_errc") if which_text == "processed" else "", "PINK", False),
+            (getattr(geniza_article, f"_{which_text}_target"), "BRIGHT_GREEN" if in_ctxt else None, in_ctxt),
+            (trailing_ctxt, None, False)
+        ]
+        return [run for run in runs if len(run[0]) > 0]
+
+    def _docx_document(self, articles: Iterable[GenizaArticle], end_time: Optional[str] = None) -> Any:
+        # python-docx is imported only when a document is exported
+        from docx import Document
+        from docx.shared import Pt, Cm
+        from docx.enum.style import WD_STYLE_TYPE
+        from docx.enum.table import WD_TABLE_ALIGNMENT
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        from docx.enum.text import WD_COLOR_INDEX
 
         document = Document()
         h = document.add_heading('Judaeo-Arabic to Arabic transliteration', 0)
@@ -456,46 +649,20 @@ class Export(PostPipeline):
         hdr_cells[1].text = 'JA'
 
         hdr_cells[2].text = 'PGPID'  ##'
-        for i, geniza_article in enumerate(self._in):
-
-            if len(geniza_article._processed_text) < 5:
-                continue
+        for geniza_article in articles:
             row_cells = table.add_row().cells
 
-            arabic_cell_par = row_cells[0].paragraphs[0]
-            if len(geniza_article._processed_leading_ctxt) > 0:
-                ctxt1_run = arabic_cell_par.add_run(geniza_article._processed_leading_ctxt)
-            if len(geniza_article._processed_errb) > 0:
-                errb_run = arabic_cell_par.add_run(geniza_article._processed_errb)
-                errb_run.font.highlight_color = WD_COLOR_INDEX.RED
-            if len(geniza_article._processed_errc) > 0:
-                errc_run = arabic_cell_par.add_run(geniza_article._processed_errc)
-                errc_run.font.highlight_color = WD_COLOR_INDEX.PINK
-            if len(geniza_article._processed_target) > 0:
-                target_run = arabic_cell_par.add_run(geniza_article._processed_target)
-                if len(geniza_article._processed_leading_ctxt) > 0 or len(geniza_article._processed_trailing_ctxt) > 0:
-                    target_run.bold = True
-                    target_run.font.highlight_color = WD_COLOR_INDEX.BRIGHT_GREEN
-            if len(geniza_article._processed_trailing_ctxt) > 0:
-                ctxt2_run = arabic_cell_par.add_run(geniza_article._processed_trailing_ctxt)
-
-            ja_cell_par = row_cells[1].paragraphs[0]
-            if len(geniza_article._original_leading_ctxt) > 0:
-                ctxt1_run = ja_cell_par.add_run(geniza_article._original_leading_ctxt)
-            if len(geniza_article._original_errb) > 0:
-                errb_run = ja_cell_par.add_run(geniza_article._original_errb)
-                errb_run.font.highlight_color = WD_COLOR_INDEX.RED
-            if len(geniza_article._original_target) > 0:
-                target_run = ja_cell_par.add_run(geniza_article._original_target)
-                if len(geniza_article._original_leading_ctxt) > 0 or len(geniza_article._original_trailing_ctxt) > 0:
-                    target_run.bold = True
-                    target_run.font.highlight_color = WD_COLOR_INDEX.BRIGHT_GREEN
-            if len(geniza_article._original_trailing_ctxt) > 0:
-                ctxt2_run = ja_cell_par.add_run(geniza_article._original_trailing_ctxt)
+            for cell, which_text in [(row_cells[0], "processed"), (row_cells[1], "original")]:
+                cell_par = cell.paragraphs[0]
+                for text, highlight, bold in self._cell_runs(geniza_article, which_text):
+                    run = cell_par.add_run(text)
+                    if bold:
+                        run.bold = True
+                    if highlight is not None:
+                        run.font.highlight_color = getattr(WD_COLOR_INDEX, highlight)
 
             pgpid_str = str(geniza_article._pgpid)
-            self._add_hyperlink(row_cells[2].paragraphs[0], pgpid_str,
-                                f"https://geniza.princeton.edu/en/documents/{pgpid_str}/")
+            self._add_hyperlink(row_cells[2].paragraphs[0], pgpid_str, self.PGP_DOCUMENT_URL.format(pgpid=pgpid_str))
 
         for i, row in enumerate(table.rows):
             for cell in row.cells:
@@ -510,9 +677,9 @@ class Export(PostPipeline):
         document.add_paragraph()
 
         p = document.add_paragraph()
-        p.add_run(f"Start time: {self._global_start_time.strftime('%d/%m/%Y %H:%M:%S.%f')[:-3]}", style="CommentsStyle")
+        p.add_run(f"Start time: {self._format_time(self._global_start_time)}", style="CommentsStyle")
         p.add_run().add_break()
-        p.add_run(f"End time:  {datetime.now().strftime('%d/%m/%Y %H:%M:%S.%f')[:-3]}", style="CommentsStyle")
+        p.add_run(f"End time:  {self._format_time(datetime.now()) if end_time is None else end_time}", style="CommentsStyle")
 
         p = document.add_paragraph()
         p.add_run('This tool has been created by ', style="CommentsStyle")
@@ -524,58 +691,104 @@ class Export(PostPipeline):
         p.add_run('.', style="CommentsStyle")
 
         document.add_page_break()
+        return document
+
+    @staticmethod
+    def _format_time(time: datetime) -> str:
+        return time.strftime('%d/%m/%Y %H:%M:%S.%f')[:-3]
+
+    def _save_docx(self, file_path: str) -> None:
+        if self.DOCX_WRITER not in self.DOCX_WRITERS:
+            raise KeyError(f"docx writer {self.DOCX_WRITER} is unknown, options: {self.DOCX_WRITERS}")
+
+        if self.DOCX_WRITER == "python-docx":
+            self._docx_document(self._exported_articles()).save(file_path)
+            return
+
+        # python-docx saves everything but the rows, which are written straight into the document XML
+        skeleton = BytesIO()
+        self._docx_document([], end_time=DocxTableStream.END_TIME_MARKER).save(skeleton)
+        DocxTableStream(skeleton.getvalue()).write(
+            file_path,
+            ((self._cell_runs(geniza_article, "processed"), self._cell_runs(geniza_article, "original"),
+              str(geniza_article._pgpid), self.PGP_DOCUMENT_URL.format(pgpid=geniza_article._pgpid))
+             for geniza_article in self._exported_articles()),
+            lambda: self._format_time(datetime.now())
+        )
 
+    def _create_docx(self):
+        # The local document is returned right away, the Drive URL is resolved by the upload future
         final_file_name = f'{datetime.now().strftime("%Y-%m-%d_%H:%M:%S_%f")[:-3]} - JA Transliteration'
         from pathlib import Path
         dir_name = f'../run/transliterations'
         Path(dir_name).mkdir(parents=True, exist_ok=True)
         file_path = f'../run/transliterations/{final_file_name}.docx'
 
-        document.save(file_path)
-
-        credentials = service_account.Credentials.from_service_account_file(
-            self.CREDENTIALS_JSON,
-            scopes=['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/documents']
-        )
-
-        drive_service = build('drive', 'v3', credentials=credentials)
+        self._save_docx(file_path)
+        self._upload = self.DRIVE_UPLOADER.submit(file_path, final_file_name)
+        return file_path
+
+    def upload(self) -> Optional[Future]:
+        return self._upload
+
+    def _shards(self) -> List[List[GenizaArticle]]:
+        if self.SHARD_MAX_ROWS is not None and self.SHARD_MAX_ROWS < 1:
+            raise ValueError(f"SHARD_MAX_ROWS must be positive, got {self.SHARD_MAX_ROWS}")
+        if self.SHARD_PGPID_RANGE is not None and self.SHARD_PGPID_RANGE < 1:
+            raise ValueError(f"SHARD_PGPID_RANGE must be positive, got {self.SHARD_PGPID_RANGE}")
+
+        shards, shard, shard_range = [], [], None
+        for pgpid, windows in groupby(self._exported_articles(), key=lambda geniza_article: geniza_article._pgpid):
+            document = list(windows)
+            pgpid_range = int(pgpid) // self.SHARD_PGPID_RANGE if self.SHARD_PGPID_RANGE is not None else None
+            too_long = self.SHARD_MAX_ROWS is not None and len(shard) + len(document) > self.SHARD_MAX_ROWS
+            if len(shard) > 0 and (pgpid_range != shard_range or too_long):
+                shards.append(shard)
+                shard = []
+            shard.extend(document)
+            shard_range = pgpid_range
+        if len(shard) > 0:
+            shards.append(shard)
+
+        return shards
+
+    def _create_docx_shards(self) -> str:
+        # Every shard is rendered to its own docx by a pool of processes, the returned index lists them
+        final_dir_name = f'{datetime.now().strftime("%Y-%m-%d_%H:%M:%S_%f")[:-3]} - JA Transliteration'
+        from pathlib import Path
+        dir_name = f'../run/transliterations/{final_dir_name}'
+        Path(dir_name).mkdir(parents=True, exist_ok=True)
 
-        file_metadata = {
-            'name': 'My Document'
-        }
-        media = MediaFileUpload(file_path,
-                                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-        uploaded_file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-
-        drive_file_id = uploaded_file['id']
-        conversion_response = drive_service.files().copy(
-            fileId=drive_file_id,
-            body={
-                'parents': [],
-                'mimeType': 'application/vnd.google-apps.document',
-                'name': final_file_name
-            }
-        ).execute()
-
-        converted_doc_id = conversion_response['id']
-
-        permission_body = {
-            'role': 'writer',
-            'type': 'anyone',
-            'allowFileDiscovery': False,
+        shards = self._shards()
+        file_names = [f"shard_{i_shard:04d}.docx" for i_shard in range(len(shards))]
+        render_args = ([f"{dir_name}/{file_name}" for file_name in file_names], shards,
+                       [self._global_start_time] * len(shards), [self.DOCX_WRITER] * len(shards))
+        workers = min(self.SHARD_WORKERS, len(shards))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context(PipelineManager.MP_CONTEXT)) as executor:
+                seconds = list(executor.map(_render_docx_shard, *render_args))
+        else:
+            seconds = list(map(_render_docx_shard, *render_args))
+
+        index = {
+            "start_time": self._format_time(self._global_start_time),
+            "end_time": self._format_time(datetime.now()),
+            "rows": sum(len(shard) for shard in shards),
+            "shards": [
+                {
+                    "file": file_name,
+                    "rows": len(shard),
+                    "pgpids": list(dict.fromkeys(int(geniza_article._pgpid) for geniza_article in shard)),
+                    "seconds": round(shard_seconds, 3)
+                }
+                for file_name, shard, shard_seconds in zip(file_names, shards, seconds)
+            ]
         }
-        response = drive_service.permissions().create(
-            fileId=converted_doc_id,
-            body=permission_body,
-            fields='id'
-        ).execute()
-
-        doc_url = f'https://docs.google.com/document/d/{converted_doc_id}/edit'
-        return doc_url
+        index_path = f"{dir_name}/index.json"
+        with open(index_path, "w") as f:
+            json.dump(index, f, indent=2)
+        return index_path
 
     def output(self):
         return self._out
@@ -587,6 +800,9 @@ class PipelineManager:
     _in_pipeline: List[List[Word]]
     _post_pipeline: List[List[Word]]
     _out: str
+    _nn_options: Dict[str, Any]
+    _batch_stats: Dict[str, BatchStats]
+    _upload: Optional[Future]
 
     PRE_PIPELINE_TASKS = [
         ClearText,
@@ -600,13 +816,116 @@ class PipelineManager:
     POST_PIPELINE_TASKS = [
         Export
     ]
-
-    def __init__(self, inp: List[str], output_format: str = "by_docx_path", stich_back=True):
+    STREAM_OUTPUT_FORMATS = [
+        "by_list_str",
+        "by_records"
+    ]
+    # A record per window: merging the continuations into their head window would drop their words
+    UNSTITCHED_OUTPUT_FORMATS = [
+        "by_records"
+    ]
+    MICRO_BATCH_SIZE = 64
+    SHARDS_PER_WORKER = 4
+    MP_CONTEXT = "spawn"
+
+    # The worker processes of workers > 1, kept for the life of the class so their models stay loaded between the
+    # calls. Replaced only when the workers count or the backend change, shut down by unload().
+    _pool: Optional[ProcessPoolExecutor] = None
+    _pool_key: Optional[Tuple[int, str]] = None
+    _pool_lock = Lock()
+
+    def __init__(self, inp: List[str], output_format: str = "by_docx_path", stich_back=True,
+                 batch_size: Optional[int] = None, max_batch_tokens: Optional[int] = None, workers: int = 1,
+                 backend: Optional[str] = None, decoding: Optional[str] = None, cache: Optional[InferenceCache] = None):
+        if workers < 1:
+            raise ValueError(f"workers must be positive, got {workers}")
+
+        self._setup(inp, output_format, batch_size, max_batch_tokens, backend, decoding, cache)
+        self._workers = workers
+
+        self._process(stich_back_long_ones = stich_back and output_format not in self.UNSTITCHED_OUTPUT_FORMATS)
+
+    def _setup(self, inp: Iterable[GenizaArticle], output_format: Optional[str],
+               batch_size: Optional[int], max_batch_tokens: Optional[int], backend: Optional[str] = None,
+               decoding: Optional[str] = None, cache: Optional[InferenceCache] = None) -> None:
         self._in = inp
         self._global_start_time = datetime.now()
         self._output_format = output_format
-
-        self._process(stich_back_long_ones = stich_back)
+        self._nn_options = {"batch_size": batch_size, "max_batch_tokens": max_batch_tokens, "backend": backend,
+                            "decoding": decoding, "cache": cache}
+        self._batch_stats = {}
+        self._workers = 1
+        self._upload = None
+
+    @classmethod
+    def stream(cls, articles: Iterable[GenizaArticle], output_format: str = "by_list_str", stich_back=True,
+               micro_batch_size: int = MICRO_BATCH_SIZE, batch_size: Optional[int] = None,
+               max_batch_tokens: Optional[int] = None, backend: Optional[str] = None,
+               decoding: Optional[str] = None, cache: Optional[InferenceCache] = None) -> Iterator[Tuple[int, Any]]:
+        # Yields (pgpid, output) per document, as soon as the last window of the document has been processed
+        if output_format not in cls.STREAM_OUTPUT_FORMATS:
+            raise KeyError(f"output_format {output_format} can't be streamed, options: {cls.STREAM_OUTPUT_FORMATS}")
+        if micro_batch_size < 1:
+            raise ValueError(f"micro_batch_size must be positive, got {micro_batch_size}")
+
+        manager = cls.__new__(cls)
+        manager._setup(articles, output_format, batch_size, max_batch_tokens, backend, decoding, cache)
+
+        return manager._stream(micro_batch_size, stich_back and output_format not in cls.UNSTITCHED_OUTPUT_FORMATS)
+
+    @classmethod
+    def export_records(cls, articles: Iterable[GenizaArticle], path: str, record_format: Optional[str] = None,
+                       micro_batch_size: int = MICRO_BATCH_SIZE, **nn_options) -> int:
+        # Streams a record per window to JSONL or Parquet, document by document while the pipeline runs. The windows
+        # aren't stitched back, every one keeps its words and target span. Returns the number of records written.
+        n_records = 0
+        with record_writer(path, record_format) as writer:
+            for _, records in cls.stream(articles, output_format="by_records", stich_back=False,
+                                         micro_batch_size=micro_batch_size, **nn_options):
+                writer.write(records)
+                n_records += len(records)
+        return n_records
+
+    @classmethod
+    def nn_models(cls) -> List[Tuple[str, Optional[str]]]:
+        return [(task.MODEL_NAME, task.MODEL_REVISION) for task in cls.IN_PIPELINE_TASKS if hasattr(task, "MODEL_NAME")]
+
+    @classmethod
+    def warm(cls, backend: Optional[str] = None, workers: int = 1) -> None:
+        # With workers > 1, also starts the worker processes, each loading the models once
+        backend = InPipeline.BACKEND if backend is None else backend
+        MODEL_REGISTRY.warm(cls.nn_models(), backend=backend)
+        if workers > 1:
+            pool = cls._shard_pool(workers, backend)
+            # The pool starts a process per task submitted while none is idle
+            list(pool.map(_shard_worker_pid, range(workers)))
+
+    @classmethod
+    def unload(cls, backend: Optional[str] = None) -> None:
+        for model_name, revision in cls.nn_models():
+            MODEL_REGISTRY.unload(model_name, revision, backend)
+        cls._shutdown_pool()
+
+    @classmethod
+    def _shard_pool(cls, workers: int, backend: str) -> ProcessPoolExecutor:
+        with cls._pool_lock:
+            if cls._pool is not None and cls._pool_key != (workers, backend):
+                cls._pool.shutdown(wait=True)
+                cls._pool = None
+            if cls._pool is None:
+                torch_threads = max(1, (os.cpu_count() or 1) // workers)
+                cls._pool = ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context(cls.MP_CONTEXT),
+                                                initializer=_init_shard_worker, initargs=(torch_threads, backend))
+                cls._pool_key = (workers, backend)
+            return cls._pool
+
+    @classmethod
+    def _shutdown_pool(cls) -> None:
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=True)
+                cls._pool, cls._pool_key = None, None
 
     def _process_pre_pipeline(self) -> List[List[Word]]:
         for task in self.PRE_PIPELINE_TASKS[:-1]:
@@ -616,55 +935,186 @@ class PipelineManager:
 
     def _process_in_pipeline(self) -> List[List[Word]]:
         for task in self.IN_PIPELINE_TASKS:
-            self._in_pipeline = task(self._in_pipeline).output()
+            task_run = task(self._in_pipeline, **self._nn_options)
+            self._in_pipeline = task_run.output()
+
+            task_stats = task_run.get_batch_stats()
+            if task_stats.batches > 0 or task_stats.cache_hits > 0:
+                self._batch_stats.setdefault(task.__name__, BatchStats()).add(task_stats)
 
         return self._in_pipeline
 
     def _process_post_pipeline(self) -> str:
         for task in self.POST_PIPELINE_TASKS:
-            self._out = task(
+            task_run = task(
                 self._post_pipeline,
                 global_start_time=self._global_start_time,
                 output_format=self._output_format
-            ).output()
+            )
+            self._out = task_run.output()
+            if isinstance(task_run, Export):
+                self._upload = task_run.upload()
         return self._out
 
-    def _process(self, stich_back_long_ones=True) -> None:
-
-        self._pre_pipeline = [geniza_article._original_text for geniza_article in self._in]
+    def _process_windows(self, articles: List[GenizaArticle]) -> List[List[Word]]:
+        self._pre_pipeline = [geniza_article._original_text for geniza_article in articles]
         self._in_pipeline = self._process_pre_pipeline()
-        post_pipeline_texts = self._process_in_pipeline()
+        return self._process_in_pipeline()
+
+    @staticmethod
+    def _micro_batches(articles: Iterable[GenizaArticle], micro_batch_size: int) -> Iterator[List[GenizaArticle]]:
+        articles = iter(articles)
+        while True:
+            batch = list(islice(articles, micro_batch_size))
+            if len(batch) == 0:
+                return
+            yield batch
 
-        # Handling long articles
-        prev_article, prev_head, unwanted, idx = None, None, [], 0
-        for geniza_article, org_processed_words in zip(self._in, post_pipeline_texts):
+    @staticmethod
+    def _finish_document(document: List[GenizaArticle], continuations: List[GenizaArticle]) -> List[GenizaArticle]:
+        if len(continuations) > 0:
+            document[0].merge(*continuations)
+        return document
+
+    @staticmethod
+    def _stitch(processed: Iterable[Tuple[GenizaArticle, List[Word]]], stich_back_long_ones=True) -> Iterator[List[GenizaArticle]]:
+        # Yields each document once a window of another document (or the end) shows up. When stitching back,
+        # the following windows of a document are collected and merged into its first window at once.
+        document, continuations, prev_article = [], [], None
+        for geniza_article, org_processed_words in processed:
 
             geniza_article.assign_processed(processed_words=org_processed_words)
-            #A continuing (long) article?
             if prev_article and prev_article._pgpid == geniza_article._pgpid:
 
-                #Detect and fix duplication and missing pieces
-                # geniza_article.detect_and_fix_errors(prev_article)
                 # Detect and highlight duplication and missing pieces
                 geniza_article.detect_and_highlight_errors(prev_article)
 
-                #Untangle, append and remove
                 if stich_back_long_ones:
-                    if prev_head and prev_head._pgpid == geniza_article._pgpid:
-                        prev_head.merge(geniza_article)
-                        unwanted.append(idx)
-                    else:
-                        prev_head = geniza_article
+                    continuations.append(geniza_article)
+                else:
+                    document.append(geniza_article)
             else:
-                prev_head = geniza_article
+                if len(document) > 0:
+                    yield PipelineManager._finish_document(document, continuations)
+                document, continuations = [geniza_article], []
             prev_article = geniza_article
-            idx = idx + 1
 
-        for i in sorted(unwanted, reverse=True):
-            del self._in[i]
+        if len(document) > 0:
+            yield PipelineManager._finish_document(document, continuations)
 
-        self._post_pipeline = self._in
+    @staticmethod
+    def _make_shards(articles: List[GenizaArticle], shards_count: int) -> List[List[GenizaArticle]]:
+        # Whole documents only (consecutive windows of one pgpid), so each worker can stitch them back
+        documents = [list(windows) for _, windows in groupby(articles, key=lambda article: article._pgpid)]
+        shard_size = max(1, -(-len(articles) // shards_count))
+
+        shards, shard = [], []
+        for document in documents:
+            shard.extend(document)
+            if len(shard) >= shard_size:
+                shards.append(shard)
+                shard = []
+        if len(shard) > 0:
+            shards.append(shard)
+
+        return shards
+
+    def _merge_batch_stats(self, batch_stats: Dict[str, BatchStats]) -> None:
+        for task_name, task_stats in batch_stats.items():
+            self._batch_stats.setdefault(task_name, BatchStats()).add(task_stats)
+
+    def _process_sharded(self, stich_back_long_ones=True) -> List[GenizaArticle]:
+        shards = self._make_shards(list(self._in), self._workers * self.SHARDS_PER_WORKER)
+        backend = InPipeline.BACKEND if self._nn_options["backend"] is None else self._nn_options["backend"]
+
+        pool = self._shard_pool(self._workers, backend)
+        try:
+            shards_results = list(pool.map(
+                _process_shard,
+                shards,
+                [stich_back_long_ones] * len(shards),
+                [self._nn_options] * len(shards)
+            ))
+        except BrokenProcessPool:
+            # A worker died, the next call starts a new pool
+            self._shutdown_pool()
+            raise
+
+        # executor.map keeps the shards order, which is the input order
+        stitched = []
+        for shard_articles, shard_batch_stats in shards_results:
+            stitched.extend(shard_articles)
+            self._merge_batch_stats(shard_batch_stats)
+
+        return stitched
+
+    def _stream(self, micro_batch_size: int, stich_back_long_ones=True) -> Iterator[Tuple[int, Any]]:
+        processed = (
+            (geniza_article, processed_words)
+            for batch in self._micro_batches(self._in, micro_batch_size)
+            for geniza_article, processed_words in zip(batch, self._process_windows(batch))
+        )
+
+        for document in self._stitch(processed, stich_back_long_ones):
+            self._post_pipeline = document
+            yield document[0]._pgpid, self._process_post_pipeline()
+
+    def _process(self, stich_back_long_ones=True) -> None:
+
+        if self._workers > 1 and len(self._in) > 0:
+            self._post_pipeline = self._process_sharded(stich_back_long_ones)
+            self._out = self._process_post_pipeline()
+            return
+
+        post_pipeline_texts = self._process_windows(self._in)
+
+        # Handling long articles: the merged windows are left out in the same single pass
+        processed = zip(self._in, post_pipeline_texts)
+        self._post_pipeline = [article for document in self._stitch(processed, stich_back_long_ones) for article in document]
         self._out = self._process_post_pipeline()
 
+    def get_batch_stats(self) -> Dict[str, BatchStats]:
+        return self._batch_stats
+
+    def upload(self) -> Optional[Future]:
+        # The Drive upload of a by_docx_path export, whose result is the document URL
+        return self._upload
+
+    def drive_url(self, timeout: Optional[float] = None) -> str:
+        if self._upload is None:
+            raise KeyError(f"output_format {self._output_format} isn't uploaded to Drive")
+        return self._upload.result(timeout=timeout)
+
     def output(self):
         return self._out
+
+
+def _init_shard_worker(torch_threads: int, backend: str) -> None:
+    import torch
+    # Keep the worker processes from oversubscribing the cores
+    torch.set_num_threads(torch_threads)
+    # Loaded once for the life of the worker, the pool is reused by the next calls
+    PipelineManager.warm(backend)
+
+
+def _shard_worker_pid(_: int) -> int:
+    return os.getpid()
+
+
+def _render_docx_shard(file_path: str, articles: List[GenizaArticle], global_start_time: datetime, docx_writer: str) -> float:
+    start_time = perf_counter()
+    export = Export.__new__(Export)
+    export._in, export._global_start_time, export.DOCX_WRITER = articles, global_start_time, docx_writer
+    export._save_docx(file_path)
+    return perf_counter() - start_time
+
+
+def _process_shard(articles: List[GenizaArticle], stich_back_long_ones: bool,
+                   nn_options: Dict[str, Any]) -> Tuple[List[GenizaArticle], Dict[str, BatchStats]]:
+    manager = PipelineManager.__new__(PipelineManager)
+    manager._setup(articles, None, **nn_options)
+
+    processed = zip(articles, manager._process_windows(articles))
+    stitched = [article for document in manager._stitch(processed, stich_back_long_ones) for article in document]
+
+    return stitched, manager.get_batch_stats()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from hashlib import sha256
+from threading import RLock
+from time import time
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import os
+import sqlite3
+
+cwd = os.path.dirname(os.path.realpath(__file__))
+CACHE_PATH = cwd + "/../resources/cache/inference.sqlite"
+
+
+class CacheStats:
+    hits: int
+    misses: int
+    entries: int
+    size_bytes: int
+    evictions: int
+
+    def __init__(self, hits: int = 0, misses: int = 0, entries: int = 0, size_bytes: int = 0, evictions: int = 0):
+        self.hits = hits
+        self.misses = misses
+        self.entries = entries
+        self.size_bytes = size_bytes
+        self.evictions = evictions
+
+    def __repr__(self):
+        return f"<CacheStats: {self.hits} hits, {self.misses} misses ({self.hit_ratio:.1%} hits), " \
+               f"{self.entries} entries, {self.size_bytes} bytes, {self.evictions} evictions>"
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hit_ratio,
+                "entries": self.entries, "size_bytes": self.size_bytes, "evictions": self.evictions}
+
+
+class InferenceCache:
+    # Content addressed: the key is the hash of the stage, the model (name, revision, backend) and the cleaned line,
+    # the value any JSON serializable output. Least recently used lines are evicted past max_bytes.
+    QUERY_CHUNK = 500
+
+    _path: str
+    _max_bytes: Optional[int]
+    _connection: Optional[sqlite3.Connection]
+    _lock: RLock
+    _stats: CacheStats
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: Optional[int] = None):
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError(f"max_bytes must be positive, got {max_bytes}")
+
+        self._path = path
+        self._max_bytes = max_bytes
+        self._connection = None
+        self._lock = RLock()
+        self._stats = CacheStats()
+
+    def __repr__(self):
+        return f"<InferenceCache: {self._path}, max_bytes={self._max_bytes}>"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Worker processes reopen the database, the hit/miss counters are per process
+        return {"path": self._path, "max_bytes": self._max_bytes}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["path"], state["max_bytes"])
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @staticmethod
+    def key(stage: str, model_name: str, revision: Optional[str], backend: str, line: str) -> str:
+        return sha256("\0".join([stage, model_name, revision or "", backend, line]).encode("utf-8")).hexdigest()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if os.path.dirname(self._path):
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            self._connection = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS lines "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS lines_last_used ON lines (last_used)")
+            self._connection.commit()
+        return self._connection
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Any] = {}
+        with self._lock:
+            db = self._db()
+            for start in range(0, len(keys), self.QUERY_CHUNK):
+                chunk = keys[start: start + self.QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = db.execute(f"SELECT key, value FROM lines WHERE key IN ({placeholders})", chunk).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+                db.execute(f"UPDATE lines SET last_used = ? WHERE key IN ({placeholders})", [time()] + chunk)
+            db.commit()
+
+            self._stats.hits += len(found)
+            self._stats.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, values: Dict[str, Any]) -> None:
+        now = time()
+        rows = []
+        for key, value in values.items():
+            dumped = json.dumps(value, ensure_ascii=False)
+            rows.append((key, dumped, len(dumped.encode("utf-8")), now))
+
+        with self._lock:
+            db = self._db()
+            db.executemany("INSERT OR REPLACE INTO lines (key, value, size, last_used) VALUES (?, ?, ?, ?)", rows)
+            db.commit()
+            if self._max_bytes is not None:
+                self.evict(self._max_bytes)
+
+    def evict(self, max_bytes: int) -> int:
+        # Drops the least recently used lines until the stored values fit in max_bytes
+        with self._lock:
+            db = self._db()
+            size_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM lines").fetchone()[0]
+            if size_bytes <= max_bytes:
+                return 0
+
+            evicted_keys: List[str] = []
+            for key, size in db.execute("SELECT key, size FROM lines ORDER BY last_used, key"):
+                if size_bytes <= max_bytes:
+                    break
+                evicted_keys.append(key)
+                size_bytes -= size
+
+            for start in range(0, len(evicted_keys), self.QUERY_CHUNK):
+                chunk = evicted_keys[start: start + self.QUERY_CHUNK]
+                db.execute(f"DELETE FROM lines WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            db.commit()
+            self._stats.evictions += len(evicted_keys)
+
+        return len(evicted_keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM lines")
+            db.commit()
+            self._stats = CacheStats()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            entries, size_bytes = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM lines").fetchone()
+            return CacheStats(hits=self._stats.hits, misses=self._stats.misses, entries=entries,
+                              size_bytes=size_bytes, evictions=self._stats.evictions)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
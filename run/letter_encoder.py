@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from typing import Any, List, NamedTuple, Optional
+
+import numpy as np
+
+from pg_prep.sliding_window import HE_LETTERS
+
+CONTINUATION_PREFIX = "##"
+LINES_SEPARATOR = "\n"
+
+# Lines the encoder is checked on against the real tokenizer, before it's used
+PROBE_LINES = [
+    HE_LETTERS,
+    ' '.join(HE_LETTERS),
+    "חצרנא נחן אלשהוד אלכאתמין שהאדתנא אספל הדא אלכתאב פי ביע",
+    "וקאל להם אלמשכילים",
+    "",
+    "א",
+]
+
+
+class EncodedBatch(NamedTuple):
+    input_ids: np.ndarray
+    attention_mask: np.ndarray
+    special_tokens_mask: np.ndarray
+    # Character span of every token in its line (-1 for special and padding tokens)
+    starts: np.ndarray
+    ends: np.ndarray
+
+
+class LetterEncoder:
+    # ClearText leaves only HE_LETTERS and spaces, and the WordPiece vocabulary holds a token per letter
+    # (and a '##' token per continuing letter), so the input ids are a direct table lookup
+    _base: int
+    _first_ids: np.ndarray
+    _continuation_ids: np.ndarray
+
+    def __init__(self, letters: str, first_ids: List[int], continuation_ids: List[int], cls_id: int, sep_id: int, pad_id: int):
+        codes = [ord(letter) for letter in letters]
+        self._base = min(codes)
+
+        self._first_ids = np.full(max(codes) - self._base + 1, -1, dtype=np.int64)
+        self._continuation_ids = np.full(max(codes) - self._base + 1, -1, dtype=np.int64)
+        self._first_ids[np.array(codes) - self._base] = first_ids
+        self._continuation_ids[np.array(codes) - self._base] = continuation_ids
+
+        self._cls_id = cls_id
+        self._sep_id = sep_id
+        self._pad_id = pad_id
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer: Any, letters: str = HE_LETTERS) -> Optional[LetterEncoder]:
+        vocab = tokenizer.get_vocab()
+        special_ids = [tokenizer.cls_token_id, tokenizer.sep_token_id, tokenizer.pad_token_id]
+        if any(token_id is None for token_id in special_ids) or \
+                any(letter not in vocab or CONTINUATION_PREFIX + letter not in vocab for letter in letters):
+            return None
+        # WordPiece would take a longer piece of letters (e.g. '##ות') over the single letters, whatever the probes hold
+        if any(cls._is_letters_piece(token, letters) for token in vocab):
+            return None
+
+        encoder = cls(letters,
+                      first_ids=[vocab[letter] for letter in letters],
+                      continuation_ids=[vocab[CONTINUATION_PREFIX + letter] for letter in letters],
+                      cls_id=tokenizer.cls_token_id, sep_id=tokenizer.sep_token_id, pad_id=tokenizer.pad_token_id)
+
+        return encoder if encoder.matches(tokenizer, PROBE_LINES) else None
+
+    @staticmethod
+    def _is_letters_piece(token: str, letters: str) -> bool:
+        piece = token[len(CONTINUATION_PREFIX):] if token.startswith(CONTINUATION_PREFIX) else token
+        return len(piece) > 1 and all(letter in letters for letter in piece)
+
+    @staticmethod
+    def token_lengths(lines: List[str]) -> List[int]:
+        # A token per letter, plus [CLS] and [SEP]
+        return [len(line) - line.count(' ') + 2 for line in lines]
+
+    def encode(self, lines: List[str]) -> EncodedBatch:
+        if any(LINES_SEPARATOR in line for line in lines):
+            raise ValueError("Expected to receive lines without line breaks")
+
+        if len(lines) == 0:
+            empty = np.zeros((0, 0), dtype=np.int64)
+            return EncodedBatch(input_ids=empty, attention_mask=empty, special_tokens_mask=empty, starts=empty, ends=empty)
+
+        lengths = np.array(self.token_lengths(lines), dtype=np.int64)
+        n_lines, max_len = len(lines), int(lengths.max())
+        input_ids = np.full((n_lines, max_len), self._pad_id, dtype=np.int64)
+        starts = np.full((n_lines, max_len), -1, dtype=np.int64)
+
+        codes = np.frombuffer(LINES_SEPARATOR.join(lines).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        is_separator = codes == ord(LINES_SEPARATOR)
+        is_letter = ~is_separator & (codes != ord(' '))
+
+        table_idx = codes[is_letter] - self._base
+        if np.any((table_idx < 0) | (table_idx >= len(self._first_ids))):
+            raise ValueError("Expected to receive only Hebrew letters and spaces")
+
+        is_word_start = is_letter & ~np.concatenate(([False], is_letter[:-1]))
+        letter_ids = np.where(is_word_start[is_letter], self._first_ids[table_idx], self._continuation_ids[table_idx])
+        if np.any(letter_ids < 0):
+            raise ValueError("Expected to receive only Hebrew letters and spaces")
+
+        # Line of every character, and its position relative to the start of that line
+        line_idx = np.cumsum(is_separator) - is_separator
+        line_starts = np.concatenate(([0], np.flatnonzero(is_separator) + 1))
+        char_offsets = np.arange(len(codes)) - line_starts[line_idx]
+        letters_before_line = np.concatenate(([0], np.cumsum(lengths - 2)))[line_idx[is_letter]]
+        token_positions = np.cumsum(is_letter)[is_letter] - letters_before_line
+
+        input_ids[line_idx[is_letter], token_positions] = letter_ids
+        starts[line_idx[is_letter], token_positions] = char_offsets[is_letter]
+        input_ids[:, 0] = self._cls_id
+        input_ids[np.arange(n_lines), lengths - 1] = self._sep_id
+
+        attention_mask = (np.arange(max_len)[None, :] < lengths[:, None]).astype(np.int64)
+        special_tokens_mask = ((starts == -1) & (attention_mask == 1)).astype(np.int64)
+
+        return EncodedBatch(input_ids=input_ids, attention_mask=attention_mask, special_tokens_mask=special_tokens_mask,
+                            starts=starts, ends=np.where(starts == -1, -1, starts + 1))
+
+    def matches(self, tokenizer: Any, lines: List[str]) -> bool:
+        try:
+            encoded = self.encode(lines)
+        except ValueError:
+            return False
+
+        expected = tokenizer(lines, padding=True, return_tensors="np")
+        return encoded.input_ids.shape == expected["input_ids"].shape and \
+            bool(np.all(encoded.input_ids == expected["input_ids"])) and \
+            bool(np.all(encoded.attention_mask == expected["attention_mask"]))
@@ -11,7 +11,18 @@ def present_output(output_format, pman):
             print()
 
     elif output_format == "by_docx_path":
-        print(f"Your transliteration is ready! Please visit: {pman.output()}")
+        print(f"Your transliteration is ready! It's saved in: {pman.output()}")
+        print("Uploading it to Google Drive...")
+        # Doesn't wait for the upload, the URL is printed once it's done (the interpreter waits for it before exiting)
+        pman.upload().add_done_callback(present_upload)
+
+
+def present_upload(upload):
+
+    if upload.exception() is not None:
+        print(f"The upload to Google Drive failed: {upload.exception()}")
+    else:
+        print(f"Uploaded to Google Drive! Please visit: {upload.result()}")
 
 
 def transliterate_ja():
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, List, NamedTuple, Optional, Tuple, Union
+
+from run.token_classifier import TorchTokenClassifier
+
+ModelKey = Tuple[str, Optional[str], str]
+
+
+class LoadedModel(NamedTuple):
+    model: Any
+    tokenizer: Any
+    pipe: Any
+    # The hub commit the weights were resolved to (None for a local model), e.g. to key cached outputs
+    commit_hash: Optional[str] = None
+
+
+class ModelRegistry:
+    # Process-wide cache of the HF models used by the InPipeline tasks, keyed by (model name, revision, backend)
+    TASK_NAME = "token-classification"
+    DEFAULT_CAPACITY = 2
+    BACKENDS = [
+        "torch",
+        "torch-pipeline",
+        "onnx",
+        "onnx-int8"
+    ]
+
+    _entries: OrderedDict
+    _capacity: int
+    _lock: RLock
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+
+        self._entries = OrderedDict()
+        self._capacity = capacity
+        self._lock = RLock()
+
+    def _key(self, model_name: str, revision: Optional[str] = None, backend: str = "torch") -> ModelKey:
+        if backend not in self.BACKENDS:
+            raise KeyError(f"backend {backend} is unknown, options: {self.BACKENDS}")
+
+        return model_name, revision, backend
+
+    def _load(self, model_name: str, revision: Optional[str], backend: str) -> LoadedModel:
+        if backend in ["onnx", "onnx-int8"]:
+            from run.onnx_backend import OnnxTokenClassifier, onnx_model_dir
+            classifier = OnnxTokenClassifier.from_dir(onnx_model_dir(model_name, revision), quantized=backend == "onnx-int8")
+            return LoadedModel(model=classifier._session, tokenizer=classifier.tokenizer, pipe=classifier,
+                               commit_hash=classifier.source_commit_hash)
+
+        # transformers (and torch) are imported only once a model is needed
+        from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
+
+        model = AutoModelForTokenClassification.from_pretrained(model_name, revision=revision)
+        tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+        if backend == "torch-pipeline":
+            # The HF pipeline, kept as the reference of the direct classifiers
+            pipe = pipeline(task=self.TASK_NAME, model=model, tokenizer=tokenizer)
+        else:
+            pipe = TorchTokenClassifier(model, tokenizer)
+
+        return LoadedModel(model=model, tokenizer=tokenizer, pipe=pipe, commit_hash=getattr(model.config, "_commit_hash", None))
+
+    def _evict(self) -> None:
+        while len(self._entries) > self._capacity:
+            # Least recently used entries are kept at the front
+            self._entries.popitem(last=False)
+
+    def get(self, model_name: str, revision: Optional[str] = None, backend: str = "torch") -> LoadedModel:
+        key = self._key(model_name, revision, backend)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            loaded = self._load(model_name, revision, backend)
+            self._entries[key] = loaded
+            self._evict()
+            return loaded
+
+    def warm(self, models: List[Union[str, Tuple[str, Optional[str]]]], backend: str = "torch") -> None:
+        for model in models:
+            model_name, revision = (model, None) if isinstance(model, str) else model
+            self.get(model_name, revision, backend)
+
+    def unload(self, model_name: str, revision: Optional[str] = None, backend: Optional[str] = None) -> bool:
+        # Without a backend, every backend of the model is unloaded
+        backends = self.BACKENDS if backend is None else [backend]
+        with self._lock:
+            removed = [self._entries.pop(self._key(model_name, revision, b), None) for b in backends]
+            return any(entry is not None for entry in removed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def set_capacity(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+
+        with self._lock:
+            self._capacity = capacity
+            self._evict()
+
+    def loaded(self) -> List[ModelKey]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def __contains__(self, key: ModelKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+MODEL_REGISTRY = ModelRegistry()
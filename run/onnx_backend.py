@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from typing import Any, Dict, List, Optional
+import inspect
+import os
+
+import numpy as np
+
+from run.token_classifier import DirectTokenClassifier
+
+cwd = os.path.dirname(os.path.realpath(__file__))
+ONNX_ROOT = cwd + "/../resources/onnx/"
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+
+def onnx_model_dir(model_name: str, revision: Optional[str] = None, root: str = ONNX_ROOT) -> str:
+    dir_name = model_name.replace("/", "--") + (f"@{revision}" if revision else "")
+    return os.path.join(root, dir_name)
+
+
+class OnnxTokenClassifier(DirectTokenClassifier):
+    # Runs the exported model with onnxruntime
+    _session: Any
+    _input_names: List[str]
+    # The hub commit of the exported weights (see export_onnx)
+    source_commit_hash: Optional[str] = None
+
+    def __init__(self, session: Any, tokenizer: Any, id2label: Dict[int, str], use_letter_encoder: bool = True):
+        super().__init__(tokenizer, id2label, use_letter_encoder=use_letter_encoder)
+        self._session = session
+        self._input_names = [model_input.name for model_input in session.get_inputs()]
+
+    @classmethod
+    def from_dir(cls, model_dir: str, quantized: bool = False) -> OnnxTokenClassifier:
+        import onnxruntime
+        from transformers import AutoConfig, AutoTokenizer
+
+        model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if os.path.isfile(model_path) is False:
+            raise FileNotFoundError(f"{model_path} doesn't exist, please export it first (python run/onnx_backend.py)")
+
+        session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        config = AutoConfig.from_pretrained(model_dir)
+
+        classifier = cls(session, tokenizer, config.id2label)
+        classifier.source_commit_hash = getattr(config, "source_commit_hash", None)
+        return classifier
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": np.zeros_like(input_ids)}
+        return self._session.run(None, {name: feeds[name] for name in self._input_names})[0]
+
+
+def export_onnx(model_name: str, revision: Optional[str] = None, root: str = ONNX_ROOT,
+                quantize: bool = False, opset: int = 14) -> str:
+    import torch
+    from transformers import AutoModelForTokenClassification, AutoTokenizer
+
+    model_dir = onnx_model_dir(model_name, revision, root)
+    os.makedirs(model_dir, exist_ok=True)
+
+    model = AutoModelForTokenClassification.from_pretrained(model_name, revision=revision).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+    dummy = tokenizer(["אלשהוד אלכאתמין", "נחן"], padding=True, return_tensors="pt")
+
+    # The TorchScript based exporter handles the dynamic batch and sequence axes without extra dependencies
+    export_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ["input_ids", "attention_mask", "logits"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            os.path.join(model_dir, ONNX_FILE),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **export_kwargs
+        )
+
+    tokenizer.save_pretrained(model_dir)
+    # The config of a saved model doesn't keep the commit it was downloaded from
+    model.config.source_commit_hash = getattr(model.config, "_commit_hash", None)
+    model.config.save_pretrained(model_dir)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(os.path.join(model_dir, ONNX_FILE), os.path.join(model_dir, ONNX_INT8_FILE),
+                         weight_type=QuantType.QInt8)
+
+    return model_dir
+
+
+def main():
+    from run.e2e_pipe import PipelineManager
+
+    parser = ArgumentParser(description="Export the token-classification models of the pipeline to ONNX")
+    parser.add_argument("--output", default=ONNX_ROOT, help="root directory of the exported models")
+    parser.add_argument("--quantize", action="store_true", help="also write an int8 dynamically quantized model")
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    for model_name, revision in PipelineManager.nn_models():
+        model_dir = export_onnx(model_name, revision, root=args.output, quantize=args.quantize, opset=args.opset)
+        print(f"Exported {model_name} to {model_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+import json
+import os
+
+
+class JsonlRecordWriter:
+    _path: str
+    _file: Any
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file = open(path, "w", encoding="utf-8")
+
+    def __enter__(self) -> JsonlRecordWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        self._file.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+class ParquetRecordWriter:
+    # The records are written in row groups of row_group_size, only one row group is held in memory
+    ROW_GROUP_SIZE = 1000
+
+    _path: str
+    _row_group_size: int
+    _buffer: List[Dict[str, Any]]
+    _writer: Any
+    _schema: Any
+
+    def __init__(self, path: str, row_group_size: int = ROW_GROUP_SIZE):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Writing Parquet requires pyarrow, install it or write JSONL") from error
+        if row_group_size < 1:
+            raise ValueError(f"row_group_size must be positive, got {row_group_size}")
+
+        self._path = path
+        self._row_group_size = row_group_size
+        self._buffer = []
+        # The fields of the Export "by_records" records
+        self._schema = pa.schema([
+            ("pgpid", pa.int64()),
+            ("window", pa.int32()),
+            ("original_words", pa.list_(pa.string())),
+            ("processed_words", pa.list_(pa.string())),
+            ("langs", pa.list_(pa.string())),
+            ("original_target_start", pa.int64()),
+            ("original_target_end", pa.int64()),
+            ("processed_target_start", pa.int64()),
+            ("processed_target_end", pa.int64())
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def __enter__(self) -> ParquetRecordWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+
+        if len(self._buffer) > 0:
+            self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=self._schema))
+            self._buffer = []
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        for record in records:
+            self._buffer.append(record)
+            if len(self._buffer) >= self._row_group_size:
+                self._flush()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+
+RECORD_WRITERS = {
+    "jsonl": JsonlRecordWriter,
+    "parquet": ParquetRecordWriter
+}
+
+
+def record_writer(path: str, record_format: Optional[str] = None) -> Any:
+    # The format defaults to the extension of the path
+    record_format = os.path.splitext(path)[1].lstrip(".").lower() if record_format is None else record_format
+    if record_format not in RECORD_WRITERS:
+        raise KeyError(f"record format {record_format} is unknown, options: {list(RECORD_WRITERS.keys())}")
+
+    return RECORD_WRITERS[record_format](path)
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from queue import Queue, Empty
+from threading import Thread, Lock
+from time import perf_counter
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import json
+
+from pg_prep.pgp_record import GenizaArticle
+from pg_prep.sliding_window import slice
+from run.e2e_pipe import PipelineManager
+from run.inference_cache import InferenceCache
+from run.model_registry import MODEL_REGISTRY
+
+
+class PendingRequest:
+    _articles: List[GenizaArticle]
+    _future: Future
+    _enqueue_time: float
+
+    def __init__(self, articles: List[GenizaArticle]):
+        self._articles = articles
+        self._future = Future()
+        self._enqueue_time = perf_counter()
+
+    @property
+    def articles(self) -> List[GenizaArticle]:
+        return self._articles
+
+    @property
+    def future(self) -> Future:
+        return self._future
+
+    @property
+    def enqueue_time(self) -> float:
+        return self._enqueue_time
+
+
+class ServiceMetrics:
+    LATENCY_WINDOW = 1000
+
+    _lock: Lock
+    _latencies: Deque[float]
+
+    def __init__(self):
+        self._lock = Lock()
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self._requests = 0
+        self._failed = 0
+        self._batches = 0
+        self._batched_windows = 0
+        self._batch_capacity = 0
+
+    @staticmethod
+    def _percentile(values: List[float], percent: float) -> Optional[float]:
+        if len(values) == 0:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+    def record_batch(self, windows: int, max_batch_windows: int) -> None:
+        with self._lock:
+            self._batches += 1
+            self._batched_windows += windows
+            self._batch_capacity += max_batch_windows
+
+    def record_request(self, latency: float, failed: bool = False) -> None:
+        with self._lock:
+            self._requests += 1
+            self._failed += int(failed)
+            self._latencies.append(latency)
+
+    def snapshot(self, queue_depth: int) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            p50, p99 = self._percentile(latencies, 50), self._percentile(latencies, 99)
+            return {
+                "queue_depth": queue_depth,
+                "requests": self._requests,
+                "failed_requests": self._failed,
+                "batches": self._batches,
+                "batch_fill_ratio": self._batched_windows / self._batch_capacity if self._batch_capacity > 0 else 0.0,
+                "latency_p50_ms": None if p50 is None else round(p50 * 1000, 2),
+                "latency_p99_ms": None if p99 is None else round(p99 * 1000, 2),
+            }
+
+
+class RequestCoalescer:
+    # Merges the requests that arrive within max_wait of each other into one PipelineManager micro-batch
+    MAX_BATCH_WINDOWS = 64
+    MAX_WAIT = 0.02
+
+    _queue: Queue
+    _metrics: ServiceMetrics
+    _worker: Optional[Thread]
+
+    def __init__(self, max_batch_windows: int = MAX_BATCH_WINDOWS, max_wait: float = MAX_WAIT,
+                 batch_size: Optional[int] = None, max_batch_tokens: Optional[int] = None, backend: Optional[str] = None,
+                 cache: Optional[InferenceCache] = None):
+        if max_batch_windows < 1:
+            raise ValueError(f"max_batch_windows must be positive, got {max_batch_windows}")
+
+        self._max_batch_windows = max_batch_windows
+        self._max_wait = max_wait
+        self._nn_options = {"batch_size": batch_size, "max_batch_tokens": max_batch_tokens, "backend": backend,
+                            "cache": cache}
+        self._queue = Queue()
+        self._metrics = ServiceMetrics()
+        self._request_ids = count()
+        self._worker = None
+        self._running = False
+
+    def start(self) -> None:
+        PipelineManager.warm(self._nn_options["backend"])
+        self._running = True
+        self._worker = Thread(target=self._serve, name="request-coalescer", daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._worker is not None:
+            self._worker.join()
+
+    def submit(self, articles: List[GenizaArticle]) -> Future:
+        request = PendingRequest(articles)
+        self._queue.put(request)
+        return request.future
+
+    def metrics(self) -> Dict[str, Any]:
+        metrics = self._metrics.snapshot(self._queue.qsize())
+        if self._nn_options["cache"] is not None:
+            metrics["cache"] = self._nn_options["cache"].stats().as_dict()
+        return metrics
+
+    def _collect(self) -> List[PendingRequest]:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except Empty:
+            return []
+
+        windows = len(batch[0].articles)
+        deadline = batch[0].enqueue_time + self._max_wait
+        while windows < self._max_batch_windows:
+            timeout = deadline - perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except Empty:
+                break
+            batch.append(request)
+            windows += len(request.articles)
+
+        return batch
+
+    def _run_batch(self, batch: List[PendingRequest]) -> None:
+        # Every request gets its own key, so windows of different requests are never stitched together
+        keyed_requests: Dict[int, PendingRequest] = {}
+        articles = []
+        for request in batch:
+            request_key = next(self._request_ids)
+            keyed_requests[request_key] = request
+            for article in request.articles:
+                article._pgpid = request_key
+                articles.append(article)
+
+        self._metrics.record_batch(len(articles), self._max_batch_windows)
+        # Not stitched back: by_list_str gives a row per window, a stitched document would keep only its first one
+        results = PipelineManager.stream(articles, output_format="by_list_str", stich_back=False,
+                                         micro_batch_size=max(1, len(articles)), **self._nn_options)
+        for request_key, output in results:
+            request = keyed_requests.pop(request_key)
+            request.future.set_result(output)
+            self._metrics.record_request(perf_counter() - request.enqueue_time)
+
+        for request in keyed_requests.values():
+            # Requests without any window (e.g. empty text)
+            request.future.set_result([])
+            self._metrics.record_request(perf_counter() - request.enqueue_time)
+
+    def _serve(self) -> None:
+        while self._running:
+            batch = self._collect()
+            if len(batch) == 0:
+                continue
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    if request.future.done() is False:
+                        request.future.set_exception(e)
+                        self._metrics.record_request(perf_counter() - request.enqueue_time, failed=True)
+
+
+def articles_from_request(body: Dict[str, Any], target_window: int = 300, ctxt_window: int = 100) -> Tuple[int, List[GenizaArticle]]:
+    pgpid = int(body.get("pgpid", -1))
+    if isinstance(body.get("sentence"), str):
+        return pgpid, [GenizaArticle(original_text=body["sentence"], pgpid=pgpid, ctxt_win_size=ctxt_window, target_win_size=target_window)]
+    if isinstance(body.get("pgp_text"), str):
+        return pgpid, slice(pgpids=[pgpid], contents=[body["pgp_text"]], target_window=target_window, ctxt_window=ctxt_window)
+
+    raise ValueError("Expected to receive either a 'sentence' or a 'pgp_text' string")
+
+
+class TransliterationHandler(BaseHTTPRequestHandler):
+    coalescer: RequestCoalescer
+    REQUEST_TIMEOUT = 300
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send_json(200, self.coalescer.metrics())
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/transliterate":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length).decode("utf-8"))
+            pgpid, articles = articles_from_request(body)
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            output = self.coalescer.submit(articles).result(timeout=self.REQUEST_TIMEOUT)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+
+        self._send_json(200, {"pgpid": pgpid, "result": [list(sentence) for sentence in output]})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str, port: int, coalescer: RequestCoalescer) -> ThreadingHTTPServer:
+    handler = type("BoundTransliterationHandler", (TransliterationHandler,), {"coalescer": coalescer})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = ArgumentParser(description="Local transliteration service, keeping the models warm")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--max-batch-windows", type=int, default=RequestCoalescer.MAX_BATCH_WINDOWS)
+    parser.add_argument("--max-wait-ms", type=float, default=RequestCoalescer.MAX_WAIT * 1000)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--max-batch-tokens", type=int, default=None)
+    parser.add_argument("--backend", default=None, choices=MODEL_REGISTRY.BACKENDS)
+    parser.add_argument("--cache", default=None, help="path of the inference cache (SQLite), no cache by default")
+    parser.add_argument("--cache-max-mb", type=float, default=None, help="evict the least recently used lines past this size")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache is not None:
+        cache = InferenceCache(args.cache, max_bytes=None if args.cache_max_mb is None else int(args.cache_max_mb * 2 ** 20))
+
+    coalescer = RequestCoalescer(max_batch_windows=args.max_batch_windows, max_wait=args.max_wait_ms / 1000,
+                                 batch_size=args.batch_size, max_batch_tokens=args.max_batch_tokens, backend=args.backend,
+                                 cache=cache)
+    coalescer.start()
+
+    server = make_server(args.host, args.port, coalescer)
+    print(f"Serving transliterations on http://{args.host}:{args.port}/transliterate (metrics on /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        coalescer.stop()
+
+
+if __name__ == "__main__":
+    main()
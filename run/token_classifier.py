@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from run.letter_encoder import EncodedBatch, LetterEncoder
+
+
+class DirectTokenClassifier:
+    # Same interface and per-token output as the HF token-classification pipeline, with the model called directly
+    IGNORE_LABELS = ["O"]
+
+    CONTINUATION_PREFIX = "##"
+
+    _id2label: Dict[int, str]
+    _encoder: Optional[LetterEncoder]
+    # Lookup tables (by token id / label id) of the logits decoding
+    _is_continuation: np.ndarray
+    _token_text_lens: np.ndarray
+    _labels: np.ndarray
+    _is_ignored_label: np.ndarray
+
+    def __init__(self, tokenizer: Any, id2label: Dict[int, str], use_letter_encoder: bool = True):
+        self.tokenizer = tokenizer
+        self._id2label = {int(label_id): label for label_id, label in id2label.items()}
+        self._encoder = LetterEncoder.from_tokenizer(tokenizer) if use_letter_encoder else None
+
+        vocab_size = max(len(tokenizer), max(tokenizer.get_vocab().values()) + 1)
+        tokens = tokenizer.convert_ids_to_tokens(list(range(vocab_size)))
+        self._is_continuation = np.array([self._is_continuation_token(token) for token in tokens], dtype=bool)
+        self._token_text_lens = np.array([len(self._token_text(token)) for token in tokens], dtype=np.int64)
+        self._labels = np.array([self._id2label[i] for i in range(len(self._id2label))], dtype=object)
+        self._is_ignored_label = np.array([label in self.IGNORE_LABELS for label in self._labels], dtype=bool)
+
+    @classmethod
+    def _is_continuation_token(cls, token: Optional[str]) -> bool:
+        return token is not None and len(token) > len(cls.CONTINUATION_PREFIX) and token.startswith(cls.CONTINUATION_PREFIX)
+
+    @classmethod
+    def _token_text(cls, token: Optional[str]) -> str:
+        if token is None:
+            return ""
+        return token[len(cls.CONTINUATION_PREFIX):] if cls._is_continuation_token(token) else token
+
+    @property
+    def letter_encoder(self) -> Optional[LetterEncoder]:
+        return self._encoder
+
+    def token_lengths(self, lines: List[str]) -> List[int]:
+        if self._encoder is not None:
+            return self._encoder.token_lengths(lines)
+        return [len(ids) for ids in self.tokenizer(lines, add_special_tokens=True)["input_ids"]]
+
+    def _encode(self, lines: List[str]) -> EncodedBatch:
+        if self._encoder is not None:
+            try:
+                return self._encoder.encode(lines)
+            except ValueError:
+                # Not a cleaned input, the generic tokenizer handles it
+                pass
+
+        encoded = self.tokenizer(lines, padding=True, return_tensors="np",
+                                 return_special_tokens_mask=True, return_offsets_mapping=True)
+        is_special = encoded["special_tokens_mask"] == 1
+        return EncodedBatch(input_ids=encoded["input_ids"].astype(np.int64),
+                            attention_mask=encoded["attention_mask"].astype(np.int64),
+                            special_tokens_mask=encoded["special_tokens_mask"].astype(np.int64),
+                            starts=np.where(is_special, -1, encoded["offset_mapping"][:, :, 0]).astype(np.int64),
+                            ends=np.where(is_special, -1, encoded["offset_mapping"][:, :, 1]).astype(np.int64))
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _to_dicts(self, lines: List[str], encoded: EncodedBatch, logits: np.ndarray) -> List[List[Dict]]:
+        # Softmax over the labels, as the HF pipeline reports it
+        exp_logits = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        scores = exp_logits / exp_logits.sum(axis=-1, keepdims=True)
+        label_ids = scores.argmax(axis=-1)
+
+        results = []
+        for i_line in range(len(lines)):
+            tokens = self.tokenizer.convert_ids_to_tokens(encoded.input_ids[i_line])
+            line_result = []
+            for i_token, token in enumerate(tokens):
+                if encoded.attention_mask[i_line][i_token] == 0 or encoded.special_tokens_mask[i_line][i_token] == 1:
+                    continue
+                entity = self._id2label[int(label_ids[i_line][i_token])]
+                if entity in self.IGNORE_LABELS:
+                    continue
+                line_result.append({
+                    "entity": entity,
+                    "score": scores[i_line][i_token][label_ids[i_line][i_token]],
+                    "index": i_token,
+                    "word": token,
+                    "start": int(encoded.starts[i_line][i_token]),
+                    "end": int(encoded.ends[i_line][i_token])
+                })
+            results.append(line_result)
+
+        return results
+
+    def _classify(self, lines: List[str]) -> List[List[Dict]]:
+        encoded = self._encode(lines)
+        logits = self._forward(encoded.input_ids, encoded.attention_mask)
+        return self._to_dicts(lines, encoded, logits)
+
+    def _decode(self, lines: List[str]) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        # Per line: the label ids of its tokens, the number of tokens of every word and the token ids
+        encoded = self._encode(lines)
+        label_ids = self._forward(encoded.input_ids, encoded.attention_mask).argmax(axis=-1)
+        is_token = (encoded.attention_mask == 1) & (encoded.special_tokens_mask == 0) & ~self._is_ignored_label[label_ids]
+        is_word_start = ~self._is_continuation[encoded.input_ids]
+
+        decoded = []
+        for i_line in range(len(lines)):
+            line_tokens = encoded.input_ids[i_line][is_token[i_line]]
+            word_starts = np.flatnonzero(is_word_start[i_line][is_token[i_line]])
+            # A leading continuation token joins the first word, as in the per-token merging
+            if len(line_tokens) > 0 and (len(word_starts) == 0 or word_starts[0] != 0):
+                word_starts = np.concatenate(([0], word_starts))
+            word_token_counts = np.diff(np.append(word_starts, len(line_tokens)))
+            decoded.append((label_ids[i_line][is_token[i_line]], word_token_counts, line_tokens))
+
+        return decoded
+
+    @staticmethod
+    def _split(text: str, lens: np.ndarray) -> List[str]:
+        bounds = np.concatenate(([0], np.cumsum(lens))).tolist()
+        return [text[bounds[i]: bounds[i + 1]] for i in range(len(lens))]
+
+    def _words(self, line_tokens: np.ndarray, word_token_counts: np.ndarray) -> List[str]:
+        text = ''.join(self._token_text(token) for token in self.tokenizer.convert_ids_to_tokens(line_tokens.tolist()))
+        token_lens = self._token_text_lens[line_tokens]
+        word_lens = np.add.reduceat(token_lens, np.cumsum(word_token_counts) - word_token_counts) if len(token_lens) > 0 else token_lens
+        return self._split(text, word_lens)
+
+    def _word_labels(self, lines: List[str]) -> List[Tuple[List[str], List[str]]]:
+        results = []
+        for label_ids, word_token_counts, line_tokens in self._decode(lines):
+            first_tokens = np.cumsum(word_token_counts) - word_token_counts
+            results.append((self._words(line_tokens, word_token_counts), self._labels[label_ids[first_tokens]].tolist()))
+        return results
+
+    def _word_label_strings(self, lines: List[str], label_index: int) -> List[Tuple[List[str], List[str]]]:
+        label_chars = np.array([label[label_index] if len(label) > label_index else "" for label in self._labels], dtype=object)
+        results = []
+        for label_ids, word_token_counts, line_tokens in self._decode(lines):
+            token_chars = label_chars[label_ids].tolist()
+            char_lens = np.fromiter((len(char) for char in token_chars), dtype=np.int64, count=len(token_chars))
+            word_lens = np.add.reduceat(char_lens, np.cumsum(word_token_counts) - word_token_counts) if len(char_lens) > 0 else char_lens
+            results.append((self._words(line_tokens, word_token_counts), self._split(''.join(token_chars), word_lens)))
+        return results
+
+    @staticmethod
+    def _batched(func: Callable[[List[str]], List], lines: List[str], batch_size: Optional[int]) -> List:
+        batch_size = len(lines) if batch_size is None else batch_size
+        results = []
+        for start in range(0, len(lines), max(1, batch_size)):
+            results.extend(func(lines[start: start + batch_size]))
+
+        return results
+
+    def word_labels(self, lines: List[str], batch_size: Optional[int] = None) -> List[Tuple[List[str], List[str]]]:
+        # Per line: its words and the label of the first token of every word
+        return self._batched(self._word_labels, lines, batch_size)
+
+    def word_label_strings(self, lines: List[str], batch_size: Optional[int] = None,
+                           label_index: int = 2) -> List[Tuple[List[str], List[str]]]:
+        # Per line: its words and, for every word, the label_index character of the labels of its tokens
+        return self._batched(lambda batch: self._word_label_strings(batch, label_index), lines, batch_size)
+
+    def __call__(self, lines: List[str], batch_size: Optional[int] = None) -> List[List[Dict]]:
+        return self._batched(self._classify, lines, batch_size)
+
+
+class TorchTokenClassifier(DirectTokenClassifier):
+    _model: Any
+
+    def __init__(self, model: Any, tokenizer: Any, use_letter_encoder: bool = True):
+        super().__init__(tokenizer, model.config.id2label, use_letter_encoder=use_letter_encoder)
+        self._model = model.eval()
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        import torch
+
+        with torch.no_grad():
+            output = self._model(input_ids=torch.from_numpy(input_ids), attention_mask=torch.from_numpy(attention_mask))
+        return output.logits.numpy()
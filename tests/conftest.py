@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from pg_prep.sliding_window import HE_LETTERS, slice
+from run.e2e_pipe import ClearText, CodeSwitch, Transliterate, WrapText
+from run.model_registry import MODEL_REGISTRY
+from tests.helpers import random_document
+
+AR_LETTERS = "ابتثجحخدذرزسشصضطظعغفقكلمنهويءةؤئى"
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+
+def tiny_model(model_dir, labels, seed):
+    # A randomly initialized BERT with the letter vocabulary of the real models, small enough to run in the tests
+    import torch
+    from transformers import BertConfig, BertForTokenClassification, BertTokenizerFast
+
+    model_dir.mkdir()
+    vocab = SPECIAL_TOKENS + list(HE_LETTERS) + ["##" + letter for letter in HE_LETTERS]
+    (model_dir / "vocab.txt").write_text("\n".join(vocab), encoding="utf-8")
+    tokenizer = BertTokenizerFast(str(model_dir / "vocab.txt"), do_lower_case=False, strip_accents=False,
+                                  tokenize_chinese_chars=False)
+
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=512, num_labels=len(labels),
+                        id2label=dict(enumerate(labels)), label2id={label: i for i, label in enumerate(labels)})
+    BertForTokenClassification(config).save_pretrained(str(model_dir))
+    tokenizer.save_pretrained(str(model_dir))
+    return str(model_dir)
+
+
+@pytest.fixture(scope="session")
+def tiny_models(tmp_path_factory):
+    root = tmp_path_factory.mktemp("models")
+    models = {
+        CodeSwitch: tiny_model(root / "ja_classification", ["B-JA", "B-NJA"], seed=0),
+        Transliterate: tiny_model(root / "transliterate", [f"B-{letter}" for letter in AR_LETTERS], seed=1)
+    }
+    yield models
+    for model_dir in models.values():
+        MODEL_REGISTRY.unload(model_dir)
+
+
+@pytest.fixture
+def pipeline_models(tiny_models, monkeypatch):
+    # The pipeline stages load the tiny models instead of the hub ones
+    for task, model_dir in tiny_models.items():
+        monkeypatch.setattr(task, "MODEL_NAME", model_dir)
+    return tiny_models
+
+
+@pytest.fixture(scope="session")
+def documents():
+    # (pgpid, text): short documents and long ones split into several windows
+    rng = random.Random(1)
+    return [(pgpid, random_document(rng, rng.choice([5, 40, 150, 300]))) for pgpid in range(1, 9)]
+
+
+@pytest.fixture
+def make_windows(documents):
+    # A run marks its windows (errors, processed words), every run gets new ones
+    return lambda: slice(pgpids=[pgpid for pgpid, _ in documents], contents=[text for _, text in documents],
+                         target_window=300, ctxt_window=100)
+
+
+@pytest.fixture
+def wrapped_lines(make_windows):
+    # The windows as the NN stages receive them
+    return WrapText(ClearText([window._original_text for window in make_windows()]).output()).output()
+
@@ -0,0 +1,10 @@
+from pg_prep.sliding_window import HE_LETTERS
+
+
+def random_document(rng, n_words):
+    return " ".join("".join(rng.choice(HE_LETTERS) for _ in range(rng.randint(1, 8))) for _ in range(n_words))
+
+
+def as_tuples(lines):
+    # The words of the NN stages outputs, comparable across runs
+    return [[(word.original_word, word.processed_word, word.lang) for word in line] for line in lines]
@@ -0,0 +1,71 @@
+import csv
+import os
+
+import pytest
+
+import pg_prep.prep_pg_data as prep
+from pg_prep.sliding_window import slice
+from run.e2e_pipe import CodeSwitch, PipelineManager, Transliterate
+
+
+@pytest.fixture
+def articles_csv(documents, tmp_path):
+    # idd_ja_articles.csv, with a document of two articles (two footnotes) listed apart
+    rows = [[pgpid, text] for pgpid, text in documents] + [[documents[0][0], documents[1][1]]]
+    csv_path = str(tmp_path / "idd_ja_articles.csv")
+    with open(csv_path, "w") as f:
+        write = csv.writer(f)
+        write.writerow(["pgpid", "content"])
+        write.writerows(rows)
+    yield csv_path, rows
+    prep.close_store(str(tmp_path / "idd_ja_articles.sqlite"))
+
+
+def filtered_csv(csv_path, pgpids):
+    # The former content_by_pgps, filtering the whole CSV
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [[int(pgpid), content] for pgpid, content in reader if int(pgpid) in set(pgpids)]
+
+
+@pytest.mark.parametrize("pgpids", [[], [3], [8, 1, 5], [1, 1, 2], [999], list(range(1, 9))])
+def test_store_gives_the_csv_rows(articles_csv, tmp_path, pgpids, monkeypatch):
+    csv_path, _ = articles_csv
+    monkeypatch.setattr(prep, "STORE_QUERY_CHUNK", 2)
+
+    assert prep.content_by_pgps(pgpids, str(tmp_path / "idd_ja_articles.sqlite"), csv_path) == filtered_csv(csv_path, pgpids)
+
+
+def test_stale_store_is_rebuilt(articles_csv, tmp_path):
+    csv_path, rows = articles_csv
+    store_path = str(tmp_path / "idd_ja_articles.sqlite")
+    assert prep.content_by_pgps([1], store_path, csv_path) == filtered_csv(csv_path, [1])
+
+    # A newer CSV replaces the store, its open connection included
+    with open(csv_path, "w") as f:
+        write = csv.writer(f)
+        write.writerow(["pgpid", "content"])
+        write.writerows([[1, "אלכתאב"]] + rows[1:])
+    os.utime(csv_path, (os.path.getmtime(store_path) + 1,) * 2)
+    assert prep.content_by_pgps([1], store_path, csv_path) == filtered_csv(csv_path, [1])
+
+    with pytest.raises(FileNotFoundError):
+        prep.content_by_pgps([1], str(tmp_path / "missing.sqlite"), str(tmp_path / "missing.csv"))
+
+
+def test_pipeline_runs_on_the_stored_articles(pipeline_models, articles_csv, tmp_path, monkeypatch):
+    # As in run/main.py: the stored articles of the pgpids, sliced into windows and transliterated
+    monkeypatch.setattr(PipelineManager, "IN_PIPELINE_TASKS", [CodeSwitch, Transliterate])
+    csv_path, _ = articles_csv
+    pgpids = [6, 1, 3]
+
+    ids_texts = prep.content_by_pgps(pgpids, str(tmp_path / "idd_ja_articles.sqlite"), csv_path)
+    stored = slice(pgpids=[pgpid for pgpid, _ in ids_texts], contents=[text for _, text in ids_texts],
+                   target_window=300, ctxt_window=100)
+    ids_texts = filtered_csv(csv_path, pgpids)
+    expected = slice(pgpids=[pgpid for pgpid, _ in ids_texts], contents=[text for _, text in ids_texts],
+                     target_window=300, ctxt_window=100)
+
+    assert PipelineManager(stored, output_format="by_list_str").output() == \
+           PipelineManager(expected, output_format="by_list_str").output()
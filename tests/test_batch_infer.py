@@ -0,0 +1,62 @@
+import copy
+import random
+
+import pytest
+
+from run.batch_infer import BatchedInference
+from run.e2e_pipe import CodeSwitch, Transliterate
+from tests.helpers import as_tuples
+
+
+class LengthPipe:
+    # Token lengths are the number of letters, the inference tags each line with its own text
+    def token_lengths(self, lines):
+        return [len(line) + 2 for line in lines]
+
+    def __call__(self, lines, batch_size):
+        assert len(lines) == batch_size
+        return [f"<{line}>" for line in lines]
+
+
+def mixed_lines(rng, n_lines):
+    return ["א" * rng.choice([0, 1, 3, 40, 200]) + str(i) for i in range(n_lines)]
+
+
+@pytest.mark.parametrize("batch_size, max_batch_tokens", [(1, None), (3, None), (16, None), (4, 250), (100, 50), (100, 1)])
+def test_outputs_follow_the_input_order_across_buckets(batch_size, max_batch_tokens):
+    rng = random.Random(batch_size)
+    lines = mixed_lines(rng, 60)
+    batched = BatchedInference(LengthPipe(), batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+
+    assert batched.run(lines) == [f"<{line}>" for line in lines]
+    stats = batched.stats()
+    assert stats.lines == len(lines)
+    assert stats.batches > 1
+
+
+@pytest.mark.parametrize("stage", [CodeSwitch, Transliterate])
+def test_small_buckets_give_the_single_batch_output(pipeline_models, wrapped_lines, stage):
+    single = stage(copy.deepcopy(wrapped_lines), batch_size=len(wrapped_lines))
+    bucketed = stage(copy.deepcopy(wrapped_lines), batch_size=2, max_batch_tokens=64)
+
+    assert bucketed.get_batch_stats().batches > single.get_batch_stats().batches
+    assert as_tuples(bucketed.output()) == as_tuples(single.output())
+
+
+def test_batches_keep_to_the_size_and_token_budget():
+    lengths = [len(line) + 2 for line in mixed_lines(random.Random(0), 60)]
+    batches = BatchedInference(LengthPipe(), batch_size=4, max_batch_tokens=250)._make_batches(lengths)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 4
+        # A single line longer than the budget still gets its own batch
+        assert len(batch) == 1 or max(lengths[i] for i in batch) * len(batch) <= 250
+
+
+def test_empty_lines_and_invalid_sizes():
+    assert BatchedInference(LengthPipe()).run([]) == []
+    with pytest.raises(ValueError):
+        BatchedInference(LengthPipe(), batch_size=0)
+    with pytest.raises(ValueError):
+        BatchedInference(LengthPipe(), max_batch_tokens=0)
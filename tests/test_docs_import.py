@@ -0,0 +1,46 @@
+import pytest
+
+from run.docs_import import DocsFetcher
+from run.e2e_pipe import Import
+from tests.docs_server import LocalDocsServer
+
+DOCUMENT_URL = "https://docs.google.com/document/d/{document_id}/edit?usp=sharing"
+
+
+@pytest.fixture
+def docs_server(documents):
+    texts = {f"doc{pgpid}": text for pgpid, text in documents}
+    with LocalDocsServer(texts, fail_every=3) as server:
+        yield server, texts
+
+
+@pytest.fixture
+def fetcher(docs_server, tmp_path, monkeypatch):
+    server, _ = docs_server
+    docs_fetcher = DocsFetcher(server.export_url, cache_dir=str(tmp_path), workers=4, backoff_seconds=0.001)
+    monkeypatch.setattr(Import, "DOCS_FETCHER", docs_fetcher)
+    yield docs_fetcher
+    docs_fetcher.close()
+
+
+def test_fetch_many_keeps_the_order_and_caches(docs_server, fetcher):
+    server, texts = docs_server
+    document_ids = list(texts)
+
+    assert [lines for _, lines in fetcher.fetch_many(document_ids)] == \
+           [("\ufeff" + texts[document_id]).splitlines() for document_id in document_ids]
+    assert [lines for _, lines in fetcher.fetch_many(document_ids)] == \
+           [("\ufeff" + texts[document_id]).splitlines() for document_id in document_ids]
+    assert server.not_modified == len(document_ids)
+
+
+def test_pgpids_dont_depend_on_the_order_of_the_urls(docs_server, fetcher):
+    _, texts = docs_server
+    urls = [DOCUMENT_URL.format(document_id=document_id) for document_id in texts]
+
+    def windows_by_key(document_urls):
+        return {(article._pgpid, article._original_text) for article in Import.articles_by_docx_paths(document_urls)}
+
+    pgpids = [Import.document_pgpid(url) for url in urls]
+    assert len(set(pgpids)) == len(urls) and all(pgpid < -1 for pgpid in pgpids)
+    assert windows_by_key(urls) == windows_by_key(urls[::-1])
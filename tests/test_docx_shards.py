@@ -0,0 +1,77 @@
+import json
+import os
+from datetime import datetime
+from itertools import groupby
+
+import pytest
+
+from run.e2e_pipe import ClearText, Export, PipelineManager, WrapText
+
+
+@pytest.fixture
+def export(make_windows):
+    # Stitched windows as Export gets them, the Arabic copies the Judaeo-Arabic
+    windows = make_windows()
+    processed_words = WrapText(ClearText([window._original_text for window in windows]).output()).output()
+    for line in processed_words:
+        for word in line:
+            word.processed_word = word.original_word
+    export = Export.__new__(Export)
+    export._in = [article for document in PipelineManager._stitch(zip(windows, processed_words), False) for article in document]
+    export._global_start_time = datetime.now()
+    return export
+
+
+def documents_of(articles):
+    return [[article._pgpid for article in document] for _, document in groupby(articles, key=lambda article: article._pgpid)]
+
+
+@pytest.mark.parametrize("max_rows", [None, 1, 2, 3, 5, 1000])
+@pytest.mark.parametrize("pgpid_range", [None, 1, 3])
+def test_shards_keep_whole_documents_within_the_limits(export, max_rows, pgpid_range, monkeypatch):
+    monkeypatch.setattr(Export, "SHARD_MAX_ROWS", max_rows)
+    monkeypatch.setattr(Export, "SHARD_PGPID_RANGE", pgpid_range)
+    articles = list(export._exported_articles())
+    assert len(documents_of(articles)) < len(articles)
+
+    shards = export._shards()
+
+    assert [article for shard in shards for article in shard] == articles
+    assert [document for shard in shards for document in documents_of(shard)] == documents_of(articles)
+    for shard, next_shard in zip(shards, shards[1:] + [None]):
+        # Over the limit only with a single long document
+        assert max_rows is None or len(shard) <= max_rows or len(documents_of(shard)) == 1
+        if pgpid_range is not None:
+            assert len({article._pgpid // pgpid_range for article in shard}) == 1
+        # A shard is closed only when the next document doesn't fit into it
+        if next_shard is not None:
+            next_document = documents_of(next_shard)[0]
+            assert (max_rows is not None and len(shard) + len(next_document) > max_rows) or \
+                   (pgpid_range is not None and shard[-1]._pgpid // pgpid_range != next_shard[0]._pgpid // pgpid_range)
+
+
+@pytest.mark.parametrize("setting", ["SHARD_MAX_ROWS", "SHARD_PGPID_RANGE"])
+def test_invalid_shard_limits(export, setting, monkeypatch):
+    monkeypatch.setattr(Export, setting, 0)
+    with pytest.raises(ValueError):
+        export._shards()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_index_lists_the_rendered_shards(export, workers, tmp_path, monkeypatch):
+    # The shards are written to ../run/transliterations
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    monkeypatch.setattr(Export, "SHARD_MAX_ROWS", 3)
+    monkeypatch.setattr(Export, "SHARD_WORKERS", workers)
+    monkeypatch.setattr(PipelineManager, "MP_CONTEXT", "fork")
+
+    index_path = export._create_docx_shards()
+
+    with open(index_path) as f:
+        index = json.load(f)
+    shards = export._shards()
+    assert index["rows"] == len(list(export._exported_articles()))
+    assert [(shard["rows"], shard["pgpids"]) for shard in index["shards"]] == \
+           [(len(shard), list(dict.fromkeys(article._pgpid for article in shard))) for shard in shards]
+    assert all(os.path.getsize(os.path.join(os.path.dirname(index_path), shard["file"])) > 0 for shard in index["shards"])
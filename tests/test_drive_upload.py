@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+from run.drive_upload import DriveUploader, GoogleDriveClient, LocalDriveClient
+
+
+@pytest.fixture
+def docx_path(tmp_path):
+    path = tmp_path / "export.docx"
+    path.write_bytes(os.urandom(3000))
+    return str(path)
+
+
+@pytest.mark.parametrize("fail_every", [2, 3, 4, 5])
+def test_lost_responses_create_a_single_document_and_permission(tmp_path, docx_path, fail_every):
+    client = LocalDriveClient(str(tmp_path / "drive"), fail_every=fail_every, lost_responses=True)
+    uploader = DriveUploader(lambda: client, max_retries=8, backoff_seconds=0.001, chunk_size=1000)
+
+    url = uploader.upload(docx_path, "export")
+
+    documents = client.documents()
+    assert len(documents) == 1
+    assert url == client.document_url(documents[0])
+    assert client.permissions == {documents[0]: [{'role': 'writer', 'type': 'anyone', 'allowFileDiscovery': False}]}
+
+
+def test_google_client_retries_http_errors_without_duplicates(docx_path):
+    http_module = pytest.importorskip("googleapiclient.http")
+    http = http_module.HttpMockSequence([
+        ({'status': '200', 'location': 'https://upload.example/session'}, ''),
+        ({'status': '503'}, ''),
+        # The status query of the resumable upload after the failed chunk
+        ({'status': '308', 'range': 'bytes=0-2999'}, ''),
+        ({'status': '200'}, json.dumps({'id': 'file1'})),
+        # The copy is applied but its response is lost, it's found by its upload id
+        ({'status': '503'}, ''),
+        ({'status': '200'}, json.dumps({'files': [{'id': 'doc1'}]})),
+        # The permission isn't applied, it's created again
+        ({'status': '500'}, ''),
+        ({'status': '200'}, json.dumps({'permissions': []})),
+        ({'status': '200'}, json.dumps({'id': 'permission1'})),
+    ])
+    uploader = DriveUploader(lambda: GoogleDriveClient(None, http=http), backoff_seconds=0.001)
+
+    assert uploader.upload(docx_path, "export") == GoogleDriveClient.document_url("doc1")
+    posts = [uri.split("?")[0] for uri, method, _, _ in http.request_sequence if method == "POST"]
+    # A single copy, the permission is posted again only after checking it doesn't exist
+    assert posts.count("https://www.googleapis.com/drive/v3/files/file1/copy") == 1
+    assert posts.count("https://www.googleapis.com/drive/v3/files/doc1/permissions") == 2
+    assert len(http._iterable) == 0
+
+
+def test_google_client_doesnt_retry_client_errors(docx_path):
+    http_module = pytest.importorskip("googleapiclient.http")
+    errors = pytest.importorskip("googleapiclient.errors")
+    http = http_module.HttpMockSequence([({'status': '403'}, '')])
+    uploader = DriveUploader(lambda: GoogleDriveClient(None, http=http), backoff_seconds=0.001)
+
+    with pytest.raises(errors.HttpError):
+        uploader.upload(docx_path, "export")
@@ -0,0 +1,59 @@
+import copy
+
+import run.e2e_pipe as e2e_pipe
+from run.e2e_pipe import CodeSwitch, PipelineManager, Transliterate
+from run.inference_cache import InferenceCache
+from run.model_registry import ModelRegistry
+from tests.helpers import as_tuples
+
+
+def test_cached_run_matches_the_uncached_one(pipeline_models, make_windows, wrapped_lines, monkeypatch, tmp_path):
+    # The frequency corpora of BorrowDetector aren't part of the repository
+    monkeypatch.setattr(PipelineManager, "IN_PIPELINE_TASKS", [CodeSwitch, Transliterate])
+    cache = InferenceCache(str(tmp_path / "inference.sqlite"))
+
+    uncached = PipelineManager(make_windows(), output_format="by_list_str").output()
+    cold = PipelineManager(make_windows(), output_format="by_list_str", cache=cache)
+    warm = PipelineManager(make_windows(), output_format="by_list_str", cache=cache)
+
+    assert cold.output() == warm.output() == uncached
+    for stage in ["CodeSwitch", "Transliterate"]:
+        assert cold.get_batch_stats()[stage].cache_misses == len(wrapped_lines)
+        assert warm.get_batch_stats()[stage].cache_hits == len(wrapped_lines)
+        assert warm.get_batch_stats()[stage].cache_misses == 0
+        assert warm.get_batch_stats()[stage].batches == 0
+    cache.close()
+
+
+def test_repeated_lines_are_inferred_once(pipeline_models, wrapped_lines, tmp_path):
+    cache = InferenceCache(str(tmp_path / "inference.sqlite"))
+    lines = wrapped_lines[:3] * 2
+
+    cached = CodeSwitch(copy.deepcopy(lines), cache=cache)
+
+    assert as_tuples(cached.output()) == as_tuples(CodeSwitch(copy.deepcopy(lines)).output())
+    assert cached.get_batch_stats().cache_misses == 3
+    assert cached.get_batch_stats().cache_hits == 3
+    # Every line gets its own words, later stages modify them in place
+    assert all(word_1 is not word_2 for line_1, line_2 in zip(cached.output()[:3], cached.output()[3:])
+               for word_1, word_2 in zip(line_1, line_2))
+    cache.close()
+
+
+def test_new_model_commit_misses_the_cache(pipeline_models, wrapped_lines, monkeypatch, tmp_path):
+    # The registry resolves the model to a hub commit, which changes when the weights are updated
+    registry, commit = ModelRegistry(), {"hash": "a" * 40}
+    load = registry._load
+    monkeypatch.setattr(registry, "_load", lambda *key: load(*key)._replace(commit_hash=commit["hash"]))
+    monkeypatch.setattr(e2e_pipe, "MODEL_REGISTRY", registry)
+    cache = InferenceCache(str(tmp_path / "inference.sqlite"))
+
+    def cache_misses():
+        return CodeSwitch(copy.deepcopy(wrapped_lines), cache=cache).get_batch_stats().cache_misses
+
+    assert cache_misses() == len(wrapped_lines)
+    assert cache_misses() == 0
+    commit["hash"] = "b" * 40
+    registry.clear()
+    assert cache_misses() == len(wrapped_lines)
+    cache.close()
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from pg_prep.sliding_window import HE_LETTERS
+from run.e2e_pipe import CodeSwitch
+from run.letter_encoder import LetterEncoder
+from run.model_registry import MODEL_REGISTRY
+
+
+@pytest.fixture
+def tokenizer(tiny_models):
+    return MODEL_REGISTRY.get(tiny_models[CodeSwitch]).tokenizer
+
+
+@pytest.fixture
+def lines(wrapped_lines):
+    return [' '.join(word.original_word for word in line) for line in wrapped_lines] + ["", HE_LETTERS]
+
+
+def test_encoder_gives_the_tokenizer_ids_and_offsets(tokenizer, lines):
+    encoder = LetterEncoder.from_tokenizer(tokenizer)
+    assert encoder is not None
+
+    encoded = encoder.encode(lines)
+    expected = tokenizer(lines, padding=True, return_tensors="np", return_special_tokens_mask=True, return_offsets_mapping=True)
+    assert np.array_equal(encoded.input_ids, expected["input_ids"])
+    assert np.array_equal(encoded.attention_mask, expected["attention_mask"])
+
+    # Padding aside, the same special tokens and character spans
+    is_token = expected["attention_mask"] == 1
+    assert np.array_equal(encoded.special_tokens_mask[is_token], expected["special_tokens_mask"][is_token])
+    is_letter = is_token & (expected["special_tokens_mask"] == 0)
+    assert np.array_equal(encoded.starts[is_letter], expected["offset_mapping"][:, :, 0][is_letter])
+    assert np.array_equal(encoded.ends[is_letter], expected["offset_mapping"][:, :, 1][is_letter])
+    assert encoder.token_lengths(lines) == [len(ids) for ids in tokenizer(lines)["input_ids"]]
+
+
+def test_encoder_rejects_uncleaned_lines(tokenizer):
+    encoder = LetterEncoder.from_tokenizer(tokenizer)
+
+    with pytest.raises(ValueError):
+        encoder.encode(["אלכתאב 12"])
+    with pytest.raises(ValueError):
+        encoder.encode(["אלכתאב\nפי"])
+    assert encoder.matches(tokenizer, ["אלכתאב."]) is False
+
+
+def letters_tokenizer(tmp_path, tokens):
+    from transformers import BertTokenizerFast
+
+    vocab_path = tmp_path / "vocab.txt"
+    vocab_path.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + tokens), encoding="utf-8")
+    return BertTokenizerFast(str(vocab_path), do_lower_case=False, strip_accents=False, tokenize_chinese_chars=False)
+
+
+def test_vocabulary_without_continuation_letters_is_unsupported(tmp_path):
+    assert LetterEncoder.from_tokenizer(letters_tokenizer(tmp_path, list(HE_LETTERS))) is None
+
+
+@pytest.mark.parametrize("pieces", [["##ות"], ["##תי"], ["מש"], ["##ות", "##תי", "מש"]])
+def test_vocabulary_with_letters_pieces_is_unsupported(tmp_path, pieces, monkeypatch):
+    tokenizer = letters_tokenizer(tmp_path, list(HE_LETTERS) + ["##" + letter for letter in HE_LETTERS] + pieces)
+    assert LetterEncoder.from_tokenizer(tokenizer) is None
+
+    # The probe lines alone accept the table, which gives other ids than the tokenizer
+    monkeypatch.setattr(LetterEncoder, "_is_letters_piece", staticmethod(lambda token, letters: False))
+    encoder = LetterEncoder.from_tokenizer(tokenizer)
+    assert encoder is not None
+    assert encoder.matches(tokenizer, ["משכנות אלתי"]) is False
@@ -0,0 +1,27 @@
+import copy
+
+import pytest
+
+from run.e2e_pipe import CodeSwitch, Transliterate
+from tests.helpers import as_tuples
+
+
+@pytest.fixture
+def code_switched(pipeline_models, wrapped_lines):
+    # Transliterate gets the same input whatever the decoding
+    return CodeSwitch(copy.deepcopy(wrapped_lines), decoding="dicts").output()
+
+
+@pytest.mark.parametrize("backend", ["torch", "torch-pipeline"])
+def test_logits_decoding_matches_the_dicts(pipeline_models, wrapped_lines, code_switched, backend):
+    for task, lines in [(CodeSwitch, wrapped_lines), (Transliterate, code_switched)]:
+        dicts = task(copy.deepcopy(lines), backend=backend, decoding="dicts").output()
+        logits = task(copy.deepcopy(lines), decoding="logits").output()
+
+        assert as_tuples(logits) == as_tuples(dicts)
+        assert [len(line) for line in logits] == [len(line) for line in lines]
+
+
+def test_unknown_decoding_is_rejected(wrapped_lines):
+    with pytest.raises(ValueError):
+        CodeSwitch(wrapped_lines, decoding="beam")
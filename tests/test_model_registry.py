@@ -0,0 +1,52 @@
+import copy
+
+import pytest
+
+import run.e2e_pipe as e2e_pipe
+from run.e2e_pipe import CodeSwitch
+from run.model_registry import ModelRegistry
+from tests.helpers import as_tuples
+
+
+@pytest.fixture
+def counted_registry(monkeypatch):
+    # A fresh registry for the pipeline, recording every model it loads
+    registry, loads = ModelRegistry(), []
+    load = registry._load
+
+    def counted_load(model_name, revision, backend):
+        loads.append((model_name, revision, backend))
+        return load(model_name, revision, backend)
+
+    monkeypatch.setattr(registry, "_load", counted_load)
+    monkeypatch.setattr(e2e_pipe, "MODEL_REGISTRY", registry)
+    return registry, loads
+
+
+def test_tasks_share_one_load_per_model(pipeline_models, wrapped_lines, counted_registry):
+    _, loads = counted_registry
+
+    first = CodeSwitch(copy.deepcopy(wrapped_lines)).output()
+    second = CodeSwitch(copy.deepcopy(wrapped_lines)).output()
+
+    assert loads == [(pipeline_models[CodeSwitch], None, "torch")]
+    assert as_tuples(first) == as_tuples(second)
+
+
+def test_least_recently_used_model_is_evicted(tiny_models, counted_registry):
+    registry, loads = counted_registry
+    code_switch, transliterate = tiny_models.values()
+    registry.set_capacity(1)
+
+    loaded = registry.get(code_switch)
+    assert registry.get(code_switch) is loaded
+    registry.get(transliterate)
+    assert registry.loaded() == [(transliterate, None, "torch")]
+    registry.get(code_switch)
+
+    assert [model_name for model_name, _, _ in loads] == [code_switch, transliterate, code_switch]
+
+
+def test_unknown_backend_is_rejected(tiny_models):
+    with pytest.raises(KeyError):
+        ModelRegistry().get(tiny_models[CodeSwitch], backend="tensorrt")
@@ -0,0 +1,54 @@
+import copy
+
+import pytest
+
+pytest.importorskip("onnxruntime")
+
+import run.onnx_backend as onnx_backend
+from run.e2e_pipe import CodeSwitch, Transliterate
+from run.model_registry import MODEL_REGISTRY
+from tests.helpers import as_tuples
+
+
+@pytest.fixture(scope="module")
+def onnx_root(tiny_models, tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("onnx"))
+    for model_dir in tiny_models.values():
+        onnx_backend.export_onnx(model_dir, root=root)
+    yield root
+    for model_dir in tiny_models.values():
+        MODEL_REGISTRY.unload(model_dir, backend="onnx")
+
+
+@pytest.fixture
+def exported_models(pipeline_models, onnx_root, monkeypatch):
+    # The registry finds the exports of the tiny models under onnx_root
+    model_dir = onnx_backend.onnx_model_dir
+    monkeypatch.setattr(onnx_backend, "onnx_model_dir", lambda model_name, revision=None: model_dir(model_name, revision, onnx_root))
+    return pipeline_models
+
+
+def test_onnx_classifier_matches_torch(exported_models, wrapped_lines):
+    lines = [' '.join(word.original_word for word in line) for line in wrapped_lines]
+    for model_dir in exported_models.values():
+        torch_classifier = MODEL_REGISTRY.get(model_dir).pipe
+        onnx_classifier = MODEL_REGISTRY.get(model_dir, backend="onnx").pipe
+
+        assert onnx_classifier.word_labels(lines, batch_size=4) == torch_classifier.word_labels(lines, batch_size=4)
+        assert [[(token["entity"], token["index"], token["start"], token["end"]) for token in line]
+                for line in onnx_classifier(lines, batch_size=4)] == \
+               [[(token["entity"], token["index"], token["start"], token["end"]) for token in line]
+                for line in torch_classifier(lines, batch_size=4)]
+
+
+def test_onnx_stages_match_torch(exported_models, wrapped_lines):
+    # Transliterate gets the same (PyTorch) code-switching input for both backends
+    code_switch = CodeSwitch(copy.deepcopy(wrapped_lines)).output()
+    assert as_tuples(CodeSwitch(copy.deepcopy(wrapped_lines), backend="onnx").output()) == as_tuples(code_switch)
+    assert as_tuples(Transliterate(copy.deepcopy(code_switch), backend="onnx").output()) == \
+           as_tuples(Transliterate(copy.deepcopy(code_switch)).output())
+
+
+def test_missing_export_is_reported(tiny_models, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        onnx_backend.OnnxTokenClassifier.from_dir(onnx_backend.onnx_model_dir(tiny_models[CodeSwitch], root=str(tmp_path)))
@@ -0,0 +1,48 @@
+from itertools import groupby
+
+import pytest
+
+from run.e2e_pipe import CodeSwitch, PipelineManager, Transliterate
+
+
+@pytest.fixture
+def stream_pipeline(pipeline_models, monkeypatch):
+    # The frequency corpora of BorrowDetector aren't part of the repository
+    monkeypatch.setattr(PipelineManager, "IN_PIPELINE_TASKS", [CodeSwitch, Transliterate])
+
+
+@pytest.mark.parametrize("stich_back", [True, False])
+@pytest.mark.parametrize("micro_batch_size", [1, 3, 64])
+def test_stream_gives_the_pipeline_output_a_document_at_a_time(stream_pipeline, make_windows, micro_batch_size, stich_back):
+    windows = make_windows()
+    output = PipelineManager(make_windows(), output_format="by_list_str", stich_back=stich_back).output()
+
+    streamed = list(PipelineManager.stream(make_windows(), stich_back=stich_back, micro_batch_size=micro_batch_size))
+
+    assert [pgpid for pgpid, _ in streamed] == [pgpid for pgpid, _ in groupby(window._pgpid for window in windows)]
+    assert [row for _, rows in streamed for row in rows] == output
+
+
+def test_stream_reads_the_articles_lazily(stream_pipeline, make_windows):
+    windows, read = make_windows(), []
+
+    def articles():
+        for window in windows:
+            read.append(window)
+            yield window
+
+    stream = PipelineManager.stream(articles(), micro_batch_size=2)
+    assert read == []
+    pgpid, _ = next(stream)
+    # The first document is out before the last micro batch has been read
+    assert pgpid == windows[0]._pgpid
+    assert len(read) < len(windows)
+    assert len(list(stream)) + 1 == len({window._pgpid for window in windows})
+    assert read == windows
+
+
+def test_stream_rejects_other_formats_and_sizes(make_windows):
+    with pytest.raises(KeyError):
+        PipelineManager.stream(make_windows(), output_format="by_docx_path")
+    with pytest.raises(ValueError):
+        PipelineManager.stream(make_windows(), micro_batch_size=0)
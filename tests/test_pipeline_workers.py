@@ -0,0 +1,40 @@
+from itertools import groupby
+
+import pytest
+
+from run.e2e_pipe import CodeSwitch, PipelineManager, Transliterate
+
+
+@pytest.fixture
+def sharded_pipeline(pipeline_models, monkeypatch):
+    # The frequency corpora of BorrowDetector aren't part of the repository. The forked workers inherit the tiny models.
+    monkeypatch.setattr(PipelineManager, "IN_PIPELINE_TASKS", [CodeSwitch, Transliterate])
+    monkeypatch.setattr(PipelineManager, "MP_CONTEXT", "fork")
+    yield
+    PipelineManager.unload()
+
+
+@pytest.mark.parametrize("shards_count", [1, 2, 3, 5, 100])
+def test_shards_keep_whole_documents_in_order(make_windows, shards_count):
+    windows = make_windows()
+    shards = PipelineManager._make_shards(windows, shards_count)
+
+    assert [window for shard in shards for window in shard] == windows
+    assert len(shards) <= shards_count
+    # A document's windows all go to one shard, so to one worker
+    shards_of_documents = {}
+    for i_shard, shard in enumerate(shards):
+        for pgpid, _ in groupby(shard, key=lambda window: window._pgpid):
+            shards_of_documents.setdefault(pgpid, []).append(i_shard)
+    assert all(len(shards_of_document) == 1 for shards_of_document in shards_of_documents.values())
+
+
+@pytest.mark.parametrize("stich_back", [True, False])
+def test_workers_give_the_single_process_output(sharded_pipeline, make_windows, stich_back):
+    single = PipelineManager(make_windows(), output_format="by_list_str", stich_back=stich_back).output()
+
+    assert PipelineManager(make_windows(), output_format="by_list_str", stich_back=stich_back, workers=2).output() == single
+    # The second call reuses the workers and their models
+    pool = PipelineManager._pool
+    assert PipelineManager(make_windows(), output_format="by_list_str", stich_back=stich_back, workers=2).output() == single
+    assert PipelineManager._pool is pool
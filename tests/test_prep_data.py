@@ -0,0 +1,133 @@
+import csv
+import filecmp
+import random
+
+import pytest
+
+import pg_prep.prep_pg_data as prep
+from tests.helpers import random_document
+
+TODAY = "2024-06-01T00:00:00+00:00"
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    return rows[0], rows[1:]
+
+
+def write_csv(path, header, rows):
+    with open(path, "w") as f:
+        write = csv.writer(f)
+        write.writerow(header)
+        write.writerows(rows)
+
+
+def write_inputs(data_dir, n_footnotes, n_pgpids, seed):
+    # A footnotes.csv export with n_footnotes rows (random texts, some of them empty or too short) and the pgpids of
+    # interest
+    rng = random.Random(seed)
+    texts = [random_document(rng, 400) for _ in range(20)]
+    n_documents = max(n_pgpids * 3, n_footnotes // 2)
+
+    def content():
+        length = rng.choice([0, rng.randint(1, prep.MIN_CONTENT_LEN)] + [rng.randint(1, 2000)] * 8)
+        return rng.choice(texts)[:length]
+
+    write_csv(f"{data_dir}/footnotes.csv", ["id", "document_id", "source", "location", "doc_relation", "notes", "content", "url"],
+              [[footnote_id, rng.randint(1, n_documents), f"source {rng.randint(1, 5000)}", "", "Edition",
+                "x" * rng.randint(0, 200), content(), f"https://example.org/{footnote_id}"]
+               for footnote_id in range(n_footnotes)])
+    write_csv(f"{data_dir}/ja_articles_pgpids.csv", ["pgpid", "url", "last_modified"],
+              [[pgpid, f"https://example.org/documents/{pgpid}/", "2024-01-01T00:00:00+00:00"]
+               for pgpid in rng.sample(range(1, n_documents + 1), n_pgpids)])
+
+
+def refresh_export(data_dir, changed_ratio, rng):
+    # A newer export: some documents edited (content and last_modified), one of them left without any article,
+    # some deleted, some added. Returns the pgpids whose articles changed and the ones whose articles are gone.
+    pgpids_header, pgpids_rows = read_csv(f"{data_dir}/ja_articles_pgpids.csv")
+    footnotes_header, footnotes_rows = read_csv(f"{data_dir}/footnotes.csv")
+    n_changed = max(1, int(len(pgpids_rows) * changed_ratio))
+
+    edited = {row[0] for row in rng.sample(pgpids_rows, n_changed)}
+    deleted = {row[0] for row in rng.sample(pgpids_rows, n_changed) if row[0] not in edited}
+    known = {row[0] for row in pgpids_rows}
+    added = [row[1] for row in footnotes_rows if row[1] not in known][:n_changed]
+
+    pgpids_rows = [[row[0], row[1], TODAY if row[0] in edited else row[2]] for row in pgpids_rows if row[0] not in deleted]
+    pgpids_rows += [[pgpid, f"https://example.org/documents/{pgpid}/", TODAY] for pgpid in added]
+    content = footnotes_header.index("content")
+    emptied = set(sorted(row[1] for row in footnotes_rows if row[1] in edited and len(row[content]) > prep.MIN_CONTENT_LEN)[:1])
+    for row in footnotes_rows:
+        if row[1] in emptied:
+            row[content] = ""
+        elif row[1] in edited and len(row[content]) > 0:
+            row[content] = row[content][::-1]
+
+    write_csv(f"{data_dir}/ja_articles_pgpids.csv", pgpids_header, pgpids_rows)
+    write_csv(f"{data_dir}/footnotes.csv", footnotes_header, footnotes_rows)
+    return (edited | set(added)) - emptied, deleted | emptied
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    # A small footnotes.csv export (with empty and short contents) and the pgpids of interest
+    write_inputs(str(tmp_path), n_footnotes=400, n_pgpids=40, seed=0)
+    return str(tmp_path)
+
+
+def inputs(data_dir):
+    return f"{data_dir}/ja_articles_pgpids.csv", f"{data_dir}/footnotes.csv"
+
+
+@pytest.mark.parametrize("chunk_size", [7, 10000])
+def test_streamed_articles_match_the_merge(data_dir, chunk_size, monkeypatch):
+    monkeypatch.setattr(prep, "DATA_DIR", data_dir)
+    ids_text, merge_skipped = prep.process_ja_articles_merging(*prep.read_ja_articles())
+    with open(f"{data_dir}/merge.csv", "w") as f:
+        write = csv.writer(f)
+        write.writerow(["pgpid", "content"])
+        write.writerows(ids_text)
+
+    store_path = f"{data_dir}/stream.sqlite"
+    n_articles, skipped = prep.stream_prepare_data(chunk_size, *inputs(data_dir), f"{data_dir}/stream.csv", store_path)
+
+    assert (n_articles, skipped) == (len(ids_text), merge_skipped)
+    assert filecmp.cmp(f"{data_dir}/merge.csv", f"{data_dir}/stream.csv", shallow=False)
+    # The store serves the same articles
+    pgpids = [pgpid for pgpid, _ in ids_text]
+    assert prep.content_by_pgps(pgpids[::-1], store_path, f"{data_dir}/stream.csv") == [[int(pgpid), content] for pgpid, content in ids_text]
+    assert list(prep.iter_articles(store_path, f"{data_dir}/stream.csv", chunk_size=3)) == [(int(pgpid), content) for pgpid, content in ids_text]
+    prep.close_store(store_path)
+
+
+def test_unchanged_export_is_left_as_is(data_dir):
+    csv_path, store_path = f"{data_dir}/incremental.csv", f"{data_dir}/incremental.sqlite"
+    prep.stream_prepare_data(10000, *inputs(data_dir), csv_path, store_path)
+    with open(csv_path) as f:
+        prepared = f.read()
+
+    assert prep.update_prepared_data(10000, *inputs(data_dir), csv_path, store_path) == ([], [])
+    with open(csv_path) as f:
+        assert f.read() == prepared
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_incremental_update_matches_a_full_preparation(data_dir, seed):
+    csv_path, store_path = f"{data_dir}/incremental.csv", f"{data_dir}/incremental.sqlite"
+    prep.stream_prepare_data(7, *inputs(data_dir), csv_path, store_path)
+    prep.mark_transliterated(prep.pgpids_to_transliterate(store_path), store_path)
+
+    # Edited (one of them emptied), deleted and added documents
+    changed, deleted = refresh_export(data_dir, 0.1, random.Random(seed))
+    flagged, dropped = prep.update_prepared_data(7, *inputs(data_dir), csv_path, store_path)
+    prep.stream_prepare_data(7, *inputs(data_dir), f"{data_dir}/full.csv", f"{data_dir}/full.sqlite")
+
+    assert filecmp.cmp(f"{data_dir}/full.csv", csv_path, shallow=False)
+    with_articles = {str(pgpid) for pgpid in prep.pgpids_to_transliterate(f"{data_dir}/full.sqlite")}
+    assert {str(pgpid) for pgpid in flagged} == changed & with_articles
+    assert {str(pgpid) for pgpid in dropped} == deleted
+    # Only the flagged documents are left to transliterate again
+    assert prep.pgpids_to_transliterate(store_path) == [pgpid for pgpid in prep.pgpids_to_transliterate(f"{data_dir}/full.sqlite")
+                                                       if pgpid in flagged]
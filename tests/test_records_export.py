@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from run.e2e_pipe import CodeSwitch, PipelineManager, Transliterate
+from run.records_export import JsonlRecordWriter, ParquetRecordWriter, record_writer
+
+RECORDS = [
+    {"pgpid": pgpid, "window": window, "original_words": ["אלשהוד", "נחן"], "processed_words": ["الشهود", "نحن"],
+     "langs": ["AR", "AR"], "original_target_start": 0, "original_target_end": 10,
+     "processed_target_start": 0, "processed_target_end": 9}
+    for pgpid in [1, 2, 3] for window in range(2)
+]
+
+
+def test_jsonl_round_trip(tmp_path):
+    with record_writer(str(tmp_path / "records.jsonl")) as writer:
+        assert isinstance(writer, JsonlRecordWriter)
+        writer.write(RECORDS[:4])
+        writer.write(RECORDS[4:])
+
+    with open(tmp_path / "records.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == RECORDS
+
+
+def test_parquet_round_trip(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    with ParquetRecordWriter(str(tmp_path / "records.parquet"), row_group_size=4) as writer:
+        writer.write(RECORDS[:3])
+        writer.write(RECORDS[3:])
+
+    parquet_file = parquet.ParquetFile(tmp_path / "records.parquet")
+    assert parquet_file.num_row_groups == 2
+    assert parquet_file.read().to_pylist() == RECORDS
+
+
+def test_unknown_record_format(tmp_path):
+    with pytest.raises(KeyError):
+        record_writer(str(tmp_path / "records.csv"))
+
+
+def test_records_are_never_stitched(pipeline_models, make_windows, wrapped_lines, monkeypatch, tmp_path):
+    # The frequency corpora of BorrowDetector aren't part of the repository
+    monkeypatch.setattr(PipelineManager, "IN_PIPELINE_TASKS", [CodeSwitch, Transliterate])
+
+    # stich_back is left to its default
+    records = PipelineManager(make_windows(), output_format="by_records").output()
+    streamed = [record for _, document in PipelineManager.stream(make_windows(), output_format="by_records")
+                for record in document]
+    assert PipelineManager.export_records(make_windows(), str(tmp_path / "records.jsonl")) == len(wrapped_lines)
+    with open(tmp_path / "records.jsonl", encoding="utf-8") as f:
+        exported = [json.loads(line) for line in f]
+
+    assert records == streamed == exported
+    # A record per window with all of its words, long documents have several
+    assert [len(record["original_words"]) for record in records] == [len(line) for line in wrapped_lines]
+    assert max(record["window"] for record in records) > 0
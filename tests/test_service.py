@@ -0,0 +1,54 @@
+import json
+import urllib.request
+from threading import Thread
+
+import pytest
+
+from run.e2e_pipe import CodeSwitch, PipelineManager, Transliterate
+from run.service import RequestCoalescer, make_server
+
+
+@pytest.fixture
+def service(pipeline_models, monkeypatch):
+    # The frequency corpora of BorrowDetector aren't part of the repository
+    monkeypatch.setattr(PipelineManager, "IN_PIPELINE_TASKS", [CodeSwitch, Transliterate])
+    coalescer = RequestCoalescer(max_wait=0.001)
+    coalescer.start()
+    server = make_server("127.0.0.1", 0, coalescer)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    coalescer.stop()
+
+
+def post(url, body):
+    request = urllib.request.Request(f"{url}/transliterate", data=json.dumps(body).encode("utf-8"), method="POST")
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def test_every_window_of_a_pgp_text_comes_back(service, documents, make_windows):
+    pgpid, text = max(documents, key=lambda document: len(document[1]))
+    windows = [window for window in make_windows() if window._pgpid == pgpid]
+    assert len(windows) > 1
+
+    response = post(service, {"pgpid": pgpid, "pgp_text": text})
+
+    assert response["pgpid"] == pgpid
+    rows = response["result"]
+    assert [original for original, _ in rows] == [' '.join(window._original_text.split()) for window in windows]
+    assert [len(processed.split(' ')) for _, processed in rows] == [len(original.split(' ')) for original, _ in rows]
+    returned = [word for original, _ in rows for word in original.split()]
+    assert set(text.split()) <= set(returned)
+    assert returned[:3] == text.split()[:3] and returned[-3:] == text.split()[-3:]
+
+
+def test_sentence_and_bad_request(service):
+    response = post(service, {"sentence": "חצרנא נחן אלשהוד"})
+    assert [original for original, _ in response["result"]] == ["חצרנא נחן אלשהוד"]
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(service, {"text": "חצרנא"})
+    assert error.value.code == 400
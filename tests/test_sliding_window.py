@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from pg_prep.sliding_window import HE_LETTERS, slice_by_tokens, token_window
+from run.e2e_pipe import ClearText, PipelineManager, Word, WrapText
+
+
+def random_words(rng, n_words):
+    # Words of up to 12 letters, some of them with punctuation or without any letter (dropped by ClearText)
+    words = []
+    for _ in range(n_words):
+        word = "".join(rng.choice(HE_LETTERS) for _ in range(rng.randint(1, 12)))
+        words.append(rng.choice([word, word, word, word + ".", "[" + word, "12", "-"]))
+    return words
+
+
+def stitched_target(windows):
+    # The original words kept as their transliteration, stitched back as the pipeline does
+    lines = WrapText(ClearText([window._original_text for window in windows]).output()).output()
+    processed = [(window, [Word(word.original_word, word.original_word, Word.Lang.AR) for word in line])
+                 for window, line in zip(windows, lines)]
+    document, = PipelineManager._stitch(processed)
+    return document[0]._original_target
+
+
+@pytest.mark.parametrize("min_overlap", [0, 1, 8, 32, 64])
+def test_stitched_targets_give_back_the_text(min_overlap):
+    rng = random.Random(min_overlap)
+    for _ in range(50):
+        text = " ".join(random_words(rng, rng.randint(1, 120)))
+        if rng.random() < 0.3:
+            # Few distinct words, repeated across the window boundaries
+            text = " ".join(rng.choice(["אב", "גדה", "ו", "אב."]) for _ in range(rng.randint(1, 300)))
+        windows = slice_by_tokens(pgpids=[1], contents=[text], max_tokens=100, min_overlap=min_overlap)
+        cleaned = ClearText([text]).output()[0].split()
+        if len(cleaned) == 0:
+            continue
+
+        # Neither glued nor duplicated nor dropped words
+        assert stitched_target(windows).strip().split(" ") == cleaned
+
+
+@pytest.mark.parametrize("min_overlap", [0, 8, 64])
+def test_windows_cover_the_words_within_the_budget(min_overlap):
+    rng = random.Random(min_overlap)
+    for _ in range(200):
+        word_tokens = [rng.choice([0, 1, 3, 12, 30]) for _ in range(rng.randint(1, 80))]
+        windows = list(token_window(word_tokens, max_tokens=250, min_overlap=min_overlap))
+
+        # The targets follow each other from the first word to the last
+        assert windows[0][1] == 0 and windows[-1][2] == len(word_tokens)
+        assert all(previous[2] == following[1] for previous, following in zip(windows, windows[1:]))
+        for window_start, target_start, target_end, window_end in windows[:-1]:
+            # Every window but the last keeps a trailing word with letters and stays in the budget
+            assert sum(word_tokens[target_end: window_end]) > 0
+            assert sum(word_tokens[window_start: window_end]) <= 250
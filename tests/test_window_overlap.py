@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from pg_prep.pgp_record import longest_overlap
+from pg_prep.sliding_window import HE_LETTERS
+
+
+def substrings(s):
+    for j in range(0, len(s)):
+        yield s[0:j+1]
+
+
+def intersect(s1, s2, which_to_reverse):
+    # The former GenizaArticle overlap: every prefix of both windows in a set
+    set1 = set([s[::-1] for s in list(substrings(s1))]) if which_to_reverse == 0 else set(substrings(s1))
+    set2 = set([s[::-1] for s in list(substrings(s2))]) if which_to_reverse == 1 else set(substrings(s2))
+    return set1 & set2
+
+
+def window_pair(size, overlap, rng):
+    # A previous target and a current target sharing `overlap` characters, as duplicated by two windows
+    text = ' '.join(''.join(rng.choice(HE_LETTERS) for _ in range(rng.randint(1, 7))) for _ in range(size // 4 + 1))
+    shared = text[size - overlap: size]
+    return text[:size], shared + text[size: 2 * size - overlap]
+
+
+def prefix_sets_overlap(s1, s2):
+    return max(intersect(s1[::-1], s2, 0), key=len, default="")
+
+
+@pytest.mark.parametrize("size, overlap", [(50, 0), (50, 1), (100, 40), (300, 100), (300, 300)])
+def test_kmp_matches_the_prefix_sets(size, overlap):
+    rng = random.Random(size + overlap)
+    for _ in range(20):
+        prev_target, target = window_pair(size, overlap, rng)
+        assert longest_overlap(prev_target, target) == prefix_sets_overlap(prev_target, target)
+        assert longest_overlap(target, prev_target) == prefix_sets_overlap(target, prev_target)
+
+
+@pytest.mark.parametrize("s1, s2", [("", ""), ("אב", ""), ("", "אב"), ("אבא", "אבא"), ("אאאא", "אאא"), ("אבאב", "באבג")])
+def test_kmp_edge_cases(s1, s2):
+    assert longest_overlap(s1, s2) == prefix_sets_overlap(s1, s2)
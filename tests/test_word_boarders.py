@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from pg_prep.pgp_record import GenizaArticle
+from run.e2e_pipe import Word
+
+
+def loop_word_indices(words, which_boarders, leading_boarder, target_boarder, leading_end_word, target_end_word, ctxt_win_size):
+    # The former GenizaArticle.find_word_indices, walking the words on every call
+    word_idx, char_idx = 0, 0
+    for word in words:
+        crt_word = word.original_word if which_boarders == 0 else word.processed_word
+        char_idx = char_idx + len(crt_word) + 1
+        if leading_end_word > -1 and char_idx >= target_boarder:
+            target_end_word = word_idx
+            break
+        elif leading_end_word == -1 and char_idx >= leading_boarder:
+            leading_end_word = word_idx
+        word_idx = word_idx + 1
+    target_end_word = target_end_word if target_end_word > 0 else len(words)
+    target_end_word = target_end_word - 2 if ctxt_win_size > 0 else target_end_word - 1
+    return leading_end_word, target_end_word
+
+
+def loop_text_indices(words, which_text, leading_end_word, target_end_word):
+    # The former GenizaArticle.find_text_indices
+    leading_end_text, target_end_text = -1, -1
+    char_idx, word_idx = 0, 0
+    for word in words:
+        word_len = len(word.processed_word) if which_text else len(word.original_word)
+        char_idx = char_idx + word_len + 1
+        if leading_end_word > -1 and word_idx == target_end_word:
+            target_end_text = char_idx
+            break
+        elif leading_end_word == word_idx:
+            leading_end_text = char_idx - word_len - 1
+        word_idx = word_idx + 1
+    return leading_end_text, target_end_text
+
+
+def random_words(rng, n_words):
+    return [Word(original_word="א" * rng.randint(1, 8), result_word="ا" * rng.randint(0, 9), lang=Word.Lang.AR)
+            for _ in range(n_words)]
+
+
+def article(words, ctxt_win_size, leading_boarder, target_boarder):
+    geniza_article = GenizaArticle(pgpid=1, ctxt_win_size=ctxt_win_size, target_win_size=300, original_text="")
+    geniza_article._processed_words = words
+    geniza_article._original_leading_boarder, geniza_article._original_target_boarder = leading_boarder, target_boarder
+    geniza_article._processed_leading_boarder, geniza_article._processed_target_boarder = leading_boarder, target_boarder
+    return geniza_article
+
+
+@pytest.mark.parametrize("n_words", [0, 1, 2, 5, 60])
+def test_word_indices_match_the_former_loop(n_words):
+    rng = random.Random(n_words)
+    for _ in range(200):
+        words = random_words(rng, n_words)
+        text_len = sum(len(word.original_word) + 1 for word in words)
+        leading_boarder, target_boarder = rng.randint(-1, text_len + 5), rng.randint(-1, text_len + 5)
+        # Unset, or a leading word set by a previous call
+        leading_end_word = rng.choice([-1, -1, rng.randint(0, n_words + 1)])
+        which_boarders, ctxt_win_size = rng.randint(0, 1), rng.choice([0, 100])
+
+        geniza_article = article(words, ctxt_win_size, leading_boarder, target_boarder)
+        geniza_article._leading_end_word = leading_end_word
+        geniza_article.find_word_indices(which_boarders)
+
+        assert (geniza_article._leading_end_word, geniza_article._target_end_word) == \
+               loop_word_indices(words, which_boarders, leading_boarder, target_boarder, leading_end_word, -1, ctxt_win_size)
+
+
+@pytest.mark.parametrize("n_words", [0, 1, 2, 5, 60])
+def test_text_indices_match_the_former_loop(n_words):
+    rng = random.Random(n_words)
+    for _ in range(200):
+        words = random_words(rng, n_words)
+        # Unset and out-of-range words included
+        leading_end_word, target_end_word = rng.randint(-1, n_words + 1), rng.randint(-3, n_words + 1)
+        which_text = rng.choice([False, True])
+
+        geniza_article = article(words, 100, -1, -1)
+        geniza_article.find_text_indices(which_text, leading_end_word, target_end_word)
+
+        boarders = (geniza_article._processed_leading_boarder, geniza_article._processed_target_boarder) if which_text \
+            else (geniza_article._original_leading_boarder, geniza_article._original_target_boarder)
+        assert boarders == loop_text_indices(words, which_text, leading_end_word, target_end_word)